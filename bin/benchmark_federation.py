@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.latency import LatencyRegistry
+from libcloudlet.http_cache import ConditionalCache
+from libcloudlet.federation import DirectoryFederation
+from libcloudlet.singleflight import SingleFlight
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-q n_queries] [-c n_clients] [-p slow_probability]'
+    DESCRIPTION = 'Query local stand-in directory servers with injected slow '\
+        'replicas and compare a single directory with federations'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-q', '--queries', action='store', type='int', dest='n_queries',
+            default=200, help="Number of directory queries of each setup")
+    parser.add_option(
+            '-c', '--clients', action='store', type='int', dest='n_clients',
+            default=1, help="Number of clients querying at once. Their "\
+            "identical queries in flight are shared.")
+    parser.add_option(
+            '-p', '--slow-probability', action='store', type='float', dest='slow_prob',
+            default=0.2, help="Probability that a primary replica is slow")
+    parser.add_option(
+            '-d', '--slow-delay-ms', action='store', type='float', dest='slow_delay_ms',
+            default=300.0, help="Delay of a slow response in ms")
+    parser.add_option(
+            '-e', '--hedge-delay-ms', action='store', type='float', dest='hedge_delay_ms',
+            default=20.0, help="Hedge delay of the federation in ms")
+    parser.add_option(
+            '-s', '--seed', action='store', type='int', dest='seed',
+            default=0, help="Random seed")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+BASE_DELAY = 0.002
+
+
+class DirectoryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ directory server returning the cloudlets of its shard
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            slow = server.rand.random() < server.slow_prob
+        time.sleep(server.slow_delay if slow else BASE_DELAY)
+        body = json.dumps({"cloudlet": [
+            {LANDiscoveryConst.KEY_IP_ADDRESS: "10.0.0.%d" % index,
+             LANDiscoveryConst.KEY_REST_API_PORT: 8021,
+             LANDiscoveryConst.KEY_REST_API_URL: "/api/v1/resource/"}
+            for index in server.cloudlets]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DirectoryServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # hedged and timed out queries close their connection early
+        pass
+
+
+def start_directory(cloudlets, slow_prob, slow_delay, seed):
+    server = DirectoryServer(("127.0.0.1", 0), DirectoryHandler)
+    server.cloudlets = cloudlets
+    server.slow_prob = slow_prob
+    server.slow_delay = slow_delay
+    server.rand = random.Random(seed)
+    server.lock = threading.Lock()
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server, "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def unused_endpoint():
+    """ endpoint of a directory server that is down
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return "http://127.0.0.1:%d" % port
+
+
+def run_queries(directory_server, n_queries, n_clients):
+    """ send identical queries from *n_clients* clients sharing their
+    queries in flight, as the clients of a process do
+
+    :return: sorted latencies, number of candidates, number of failures,\
+        and number of shared queries
+    """
+    discovery = ElijahCloudletDiscovery(directory_server,
+                                        latency_registry=LatencyRegistry(),
+                                        response_cache=ConditionalCache(),
+                                        single_flight=SingleFlight())
+    app_info = Application(**{AppInfoConst.APP_ID: "moped",
+                              "client_ip": "10.0.0.1"})
+    latencies = list()
+    n_candidates = list()
+    n_failures = list()
+    def run_client(n_client_queries):
+        for _ in range(n_client_queries):
+            time_start = time.time()
+            try:
+                n_candidates.append(len(discovery._query_directory(app_info)))
+            except CloudletException:
+                n_failures.append(1)
+            latencies.append(time.time() - time_start)
+    thread_list = [threading.Thread(target=run_client,
+                                    args=(n_queries // n_clients,))
+                   for _ in range(n_clients)]
+    for th in thread_list:
+        th.start()
+    for th in thread_list:
+        th.join()
+    latencies.sort()
+    return latencies, max(n_candidates or [0]), len(n_failures), \
+        discovery.single_flight.n_shared
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.ERROR)
+    slow_delay = settings.slow_delay_ms / 1000.0
+    hedge_delay = settings.hedge_delay_ms / 1000.0
+    shard_a = range(0, 3)
+    shard_b = range(2, 5)      # overlaps with shard A at the boundary
+
+    servers = list()
+    def directory(cloudlets, slow_prob):
+        server, endpoint = start_directory(cloudlets, slow_prob, slow_delay,
+                                           settings.seed + len(servers))
+        servers.append(server)
+        return endpoint
+    whole_primary = directory(shard_a + shard_b[1:], settings.slow_prob)
+    whole_replica = directory(shard_a + shard_b[1:], 0.0)
+    a_primary = directory(shard_a, settings.slow_prob)
+    a_replica = directory(shard_a, 0.0)
+    b_primary = directory(shard_b, settings.slow_prob)
+    b_replica = directory(shard_b, 0.0)
+
+    setups = (
+        ("single", whole_primary),
+        ("replicated", DirectoryFederation(
+            [[whole_primary, whole_replica]], hedge_delay=hedge_delay)),
+        ("sharded", DirectoryFederation(
+            [[a_primary], [b_primary]], hedge_delay=hedge_delay)),
+        ("sharded+replicas", DirectoryFederation(
+            [[a_primary, a_replica], [b_primary, b_replica]], hedge_delay=hedge_delay)),
+        ("primary down", DirectoryFederation(
+            [[unused_endpoint(), whole_replica]], hedge_delay=hedge_delay)),
+    )
+    sys.stdout.write("%d queries from %d clients, %.0f%% of primary responses "\
+                     "delayed %.0f ms, hedge after %.0f ms\n" % (settings.n_queries,
+                     settings.n_clients, settings.slow_prob * 100,
+                     settings.slow_delay_ms, settings.hedge_delay_ms))
+    sys.stdout.write("%-18s %10s %10s %10s %10s %10s %10s\n" % \
+                     ("setup", "p50 (ms)", "p95 (ms)", "p99 (ms)", "cloudlets",
+                      "failures", "shared"))
+    for name, directory_server in setups:
+        latencies, n_candidates, n_failures, n_shared = \
+            run_queries(directory_server, settings.n_queries, settings.n_clients)
+        percentile = lambda p: latencies[min(len(latencies) - 1,
+                                             int(len(latencies) * p))] * 1000
+        sys.stdout.write("%-18s %10.1f %10.1f %10.1f %10d %10d %10d\n" % \
+                         (name, percentile(0.5), percentile(0.95),
+                          percentile(0.99), n_candidates, n_failures, n_shared))
+    for server in servers:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import timeit
+import subprocess
+from optparse import OptionParser
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-r n_runs] [-c n_calls]'
+    DESCRIPTION = 'Measure the import time of libcloudlet in fresh '\
+        'interpreters and the per-call overhead of debug logging'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-r', '--runs', action='store', type='int', dest='n_runs',
+            default=20, help="Number of interpreters for each import")
+    parser.add_option(
+            '-c', '--calls', action='store', type='int', dest='n_calls',
+            default=10000, help="Number of calls for the per-call overhead")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+IMPORT_SCRIPT = """
+import sys, time, json
+time_start = time.time()
+import %s
+elapsed = time.time() - time_start
+sys.stdout.write(json.dumps([elapsed, len(sys.modules)]))
+"""
+
+
+def measure_import(statement, n_runs, path):
+    """
+    :return: median seconds and number of loaded modules
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = path + os.pathsep + env.get("PYTHONPATH", "")
+    results = list()
+    for _ in range(n_runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", IMPORT_SCRIPT % statement], env=env)
+        results.append(json.loads(output))
+    results.sort()
+    return results[len(results) / 2]
+
+
+def measure_logging(n_calls):
+    """
+    :return: microseconds per call of eager and lazy debug logging
+    """
+    setup = """
+import json, pprint, logging
+from libcloudlet.base import _LOG, Application
+from libcloudlet.const import AppInfoConst
+_LOG.setLevel(logging.INFO)
+app_info = Application(**{AppInfoConst.APP_ID: "moped",
+                          AppInfoConst.REQUIRED_CACHE_FILES: ["f%d" % i for i in range(50)]})
+params = json.dumps({'application': app_info.__dict__})
+"""
+    eager = '_LOG.debug("Query parameter:\\n%s" % str(pprint.pformat(json.loads(params))))'
+    lazy = """
+if _LOG.isEnabledFor(logging.DEBUG):
+    _LOG.debug("Query parameter:\\n%s", pprint.pformat(json.loads(params)))
+"""
+    result = list()
+    for statement in (eager, lazy):
+        elapsed = timeit.timeit(statement, setup, number=n_calls)
+        result.append(elapsed / n_calls * 1e6)
+    return result
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    sys.path.insert(0, path)
+
+    sys.stdout.write("%-25s %12s %12s\n" % ("import", "median (ms)", "modules"))
+    for module in ("libcloudlet", "libcloudlet.const",
+                   "libcloudlet.base", "libcloudlet.selection"):
+        elapsed, n_modules = measure_import(module, settings.n_runs, path)
+        sys.stdout.write("%-25s %12.2f %12d\n" % (module, elapsed * 1000, n_modules))
+
+    eager, lazy = measure_logging(settings.n_calls)
+    sys.stdout.write("\ndebug logging of query parameter below DEBUG level\n")
+    sys.stdout.write("%-25s %12.2f us\n" % ("eager formatting", eager))
+    sys.stdout.write("%-25s %12.2f us\n" % ("lazy with level guard", lazy))
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
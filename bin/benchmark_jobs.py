@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import httplib
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.transfer import MerkleTree, CHUNK_SIZE
+from libcloudlet.overlay_cache import OverlayCache
+from libcloudlet.jobs import batch
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-n n_VMs] [-c max_concurrency]'
+    DESCRIPTION = 'Bring up VMs at a local stand-in cloudlet with serial '\
+        'steps, with steps pipelined at the cloudlet, and in batches'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-n', '--vms', action='store', type='int', dest='n_VMs',
+            default=16, help="Number of VMs to bring up")
+    parser.add_option(
+            '-c', '--concurrency', action='store', type='int', dest='max_concurrency',
+            default=8, help="Maximum number of VMs brought up at once in a batch")
+    parser.add_option(
+            '-r', '--rtt-ms', action='store', type='float', dest='rtt_ms',
+            default=50.0, help="Round trip time to the cloudlet in ms")
+    parser.add_option(
+            '--resume-ms', action='store', type='float', dest='resume_ms',
+            default=100.0, help="Time for the cloudlet to resume a VM in ms")
+    parser.add_option(
+            '--assign-ip-ms', action='store', type='float', dest='assign_ip_ms',
+            default=20.0, help="Time for the cloudlet to assign an IP in ms")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ overlay server and a cloudlet accepting overlay uploads at
+    /cloudlet/, and resume and IP requests at /vm/<uuid>/<step>
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, headers=None):
+        self.send_response(200)
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self):
+        server = self.server
+        with server.lock:
+            server.n_requests += 1
+        time.sleep(server.rtt)
+
+    def do_GET(self):
+        self._count()
+        server = self.server
+        if self.path.endswith(OverlayConst.MANIFEST_SUFFIX):
+            etag = '"%s"' % server.manifest[OverlayConst.KEY_ROOT]
+            if self.headers.getheader(HTTPConst.HEADER_IF_NONE_MATCH) == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._send(json.dumps(server.manifest), {HTTPConst.HEADER_ETAG: etag})
+        else:
+            self._send(server.overlay)
+
+    def do_POST(self):
+        self._count()
+        server = self.server
+        length = int(self.headers.getheader("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path.startswith("/vm/"):
+            step = self.path.rsplit("/", 1)[1]
+            time.sleep(server.resume_time if step == "resume" else server.assign_ip_time)
+            self._send(json.dumps({OverlayConst.KEY_VM_STATE: OverlayConst.VM_STATE_RUNNING}))
+            return
+        with server.lock:
+            server.n_VMs += 1
+            vm_info = {OverlayConst.KEY_VM_UUID: "vm-%d" % server.n_VMs}
+        if self.headers.getheader(OverlayConst.HEADER_START_VM):
+            time.sleep(server.resume_time)
+            vm_info[OverlayConst.KEY_VM_STATE] = OverlayConst.VM_STATE_RUNNING
+        if self.headers.getheader(OverlayConst.HEADER_ASSIGN_IP):
+            time.sleep(server.assign_ip_time)
+            vm_info[OverlayConst.KEY_IP_ADDRESS] = "10.1.0.%d" % (server.n_VMs % 250)
+        self._send(json.dumps(vm_info))
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(settings):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server.rtt = settings.rtt_ms / 1000.0
+    server.resume_time = settings.resume_ms / 1000.0
+    server.assign_ip_time = settings.assign_ip_ms / 1000.0
+    server.lock = threading.Lock()
+    server.n_requests = 0
+    server.n_VMs = 0
+    server.overlay = os.urandom(4 * CHUNK_SIZE)
+    leaves = [MerkleTree.leaf_hash(server.overlay[offset:offset+CHUNK_SIZE])
+              for offset in range(0, len(server.overlay), CHUNK_SIZE)]
+    server.manifest = MerkleTree(leaves).to_manifest(CHUNK_SIZE, len(server.overlay))
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def vm_step(cloudlet, vm, step):
+    """ a step requested by the client in its own round trip
+    """
+    end_point = urlparse(cloudlet.REST_endpoint)
+    conn = httplib.HTTPConnection(end_point.hostname, end_point.port)
+    conn.request("POST", "/vm/%s/%s" % (vm.UUID, step))
+    conn.getresponse().read()
+    conn.close()
+
+
+def bring_up_serial_steps(job, cloudlet, overlay_URL, overlay_cache):
+    vm = cloudlet.provision(overlay_URL, start_VM=False, assign_IP=False,
+                            overlay_cache=overlay_cache)
+    vm_step(cloudlet, vm, "resume")
+    vm_step(cloudlet, vm, "assign-ip")
+    return vm
+
+
+def bring_up_pipelined(job, cloudlet, overlay_URL, overlay_cache):
+    vm = cloudlet.provision(overlay_URL, start_VM=True, assign_IP=True,
+                            overlay_cache=overlay_cache,
+                            progress=job.set_progress if job else None)
+    assert vm.state == OverlayConst.VM_STATE_RUNNING and vm.ip_address
+    return vm
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    server = start_server(settings)
+    base_URL = "http://127.0.0.1:%d" % server.server_address[1]
+    overlay_URL = base_URL + "/overlay/moped.zip"
+    cloudlet = Cloudlet(base_URL + "/cloudlet/")
+    work_dir = tempfile.mkdtemp(prefix="jobs-")
+    overlay_cache = OverlayCache(work_dir)
+    overlay_cache.fetch(overlay_URL)
+
+    sys.stdout.write("%d VMs, RTT %.0f ms, resume %.0f ms, assign IP %.0f ms\n" % \
+                     (settings.n_VMs, settings.rtt_ms, settings.resume_ms,
+                      settings.assign_ip_ms))
+    sys.stdout.write("%-28s %10s %14s %14s\n" % \
+                     ("method", "time (s)", "requests/VM", "per VM (ms)"))
+    def measure(name, func):
+        server.n_requests = 0
+        time_start = time.time()
+        func()
+        elapsed = time.time() - time_start
+        sys.stdout.write("%-28s %10.2f %14.1f %14.0f\n" % \
+                         (name, elapsed,
+                          float(server.n_requests) / settings.n_VMs,
+                          elapsed * 1000 / settings.n_VMs))
+    measure("serial, client steps", lambda: [
+        bring_up_serial_steps(None, cloudlet, overlay_URL, overlay_cache)
+        for _ in range(settings.n_VMs)])
+    measure("serial, pipelined", lambda: [
+        bring_up_pipelined(None, cloudlet, overlay_URL, overlay_cache)
+        for _ in range(settings.n_VMs)])
+    measure("batch of %d, client steps" % settings.max_concurrency, lambda: batch(
+        lambda job, _: bring_up_serial_steps(job, cloudlet, overlay_URL, overlay_cache),
+        range(settings.n_VMs), settings.max_concurrency).result())
+    measure("batch of %d, pipelined" % settings.max_concurrency, lambda: batch(
+        lambda job, _: bring_up_pipelined(job, cloudlet, overlay_URL, overlay_cache),
+        range(settings.n_VMs), settings.max_concurrency).result())
+
+    job = cloudlet.provision_async(overlay_URL, start_VM=True,
+                                   overlay_cache=overlay_cache)
+    vm = job.result()
+    sys.stdout.write("provision_async: %s at %s, %s (%s)\n" % \
+                     (vm.UUID, vm.ip_address, vm.state, job))
+    shutil.rmtree(work_dir)
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
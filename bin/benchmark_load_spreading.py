@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import random
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.selection import LoadSpreadingSelection
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-n n_clients] [-c n_cloudlets]'
+    DESCRIPTION = 'Simulate a burst of discoveries from one area and compare '\
+        'the maximum cloudlet load of each selection algorithm'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-n', '--clients', action='store', type='int', dest='n_clients',
+            default=200, help="Number of clients in the burst")
+    parser.add_option(
+            '-c', '--cloudlets', action='store', type='int', dest='n_cloudlets',
+            default=20, help="Number of candidate cloudlets")
+    parser.add_option(
+            '-g', '--gateways', action='store', type='int', dest='n_gateways',
+            default=10, help="Number of discovery processes sharing the burst")
+    parser.add_option(
+            '-r', '--report-interval', action='store', type='int', dest='report_interval',
+            default=50, help="Cloudlets report load once per this many discoveries")
+    parser.add_option(
+            '-t', '--trials', action='store', type='int', dest='n_trials',
+            default=20, help="Number of bursts with different seeds to average")
+    parser.add_option(
+            '-s', '--seed', action='store', type='int', dest='seed',
+            default=0, help="Random seed")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+APP_ID = "moped"
+CPU_NUM = 16
+
+
+def create_cloudlets(n_cloudlets, rand):
+    cloudlet_list = list()
+    for index in range(n_cloudlets):
+        cloudlet = Cloudlet("http://10.0.0.%d:8021/api/v1/resource/" % index)
+        cloudlet.meta_info[ResourceInfoConst.TOTAL_CPU_NUMBER] = CPU_NUM
+        setattr(cloudlet, APP_ID, {
+            ResourceInfoConst.CLOCK_SPEED: 3000,
+            ResourceInfoConst.APP_CACHE_TOTAL_SCORE: rand.random(),
+        })
+        cloudlet_list.append(cloudlet)
+    return cloudlet_list
+
+
+def simulate(settings, selector_factory, seed):
+    rand = random.Random(seed)
+    cloudlet_list = create_cloudlets(settings.n_cloudlets, rand)
+    true_load = dict([(c, rand.uniform(0.1, 0.4)) for c in cloudlet_list])
+    selectors = [selector_factory(random.Random(seed + index))
+                 for index in range(settings.n_gateways)]
+    app_info = Application(**{AppInfoConst.APP_ID: APP_ID,
+                              AppInfoConst.REQUIRED_MIN_CPU_CLOCK: 1600})
+    for index in range(settings.n_clients):
+        if index % settings.report_interval == 0:
+            for cloudlet in cloudlet_list:
+                cloudlet.meta_info[ResourceInfoConst.TOTAL_CPU_PERCENT] = \
+                    true_load[cloudlet] * 100
+        selector = selectors[index % len(selectors)]
+        cloudlet = selector(cloudlet_list, app_info)
+        true_load[cloudlet] += 1.0 / CPU_NUM
+    loads = sorted(true_load.values())
+    return loads[-1], loads[len(loads) / 2]
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    algorithms = (
+        ("greedy", lambda rand: ElijahCloudletSelection.select_cloudlet),
+        ("d=2 no record", lambda rand: LoadSpreadingSelection(
+            d=2, assignment_ttl=0, rand=rand).select_cloudlet),
+        ("d=2", lambda rand: LoadSpreadingSelection(
+            d=2, rand=rand).select_cloudlet),
+        ("d=3", lambda rand: LoadSpreadingSelection(
+            d=3, rand=rand).select_cloudlet),
+    )
+    sys.stdout.write("%d clients, %d cloudlets, %d gateways, average of %d bursts\n" % \
+                     (settings.n_clients, settings.n_cloudlets, settings.n_gateways,
+                      settings.n_trials))
+    sys.stdout.write("%-15s %15s %15s\n" % ("method", "max load", "median load"))
+    for name, selector_factory in algorithms:
+        results = [simulate(settings, selector_factory, settings.seed + trial * 1000)
+                   for trial in range(settings.n_trials)]
+        max_load = sum([result[0] for result in results]) / len(results)
+        median_load = sum([result[1] for result in results]) / len(results)
+        sys.stdout.write("%-15s %15.2f %15.2f\n" % (name, max_load, median_load))
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
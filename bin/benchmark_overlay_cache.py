@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.transfer import MerkleTree, CHUNK_SIZE
+from libcloudlet.overlay_cache import OverlayCache
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-s overlay_size_mb] [-r n_repeats]'
+    DESCRIPTION = 'Provision VM overlays from a local stand-in overlay server '\
+        'with a limited bandwidth, with and without the overlay cache'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-s', '--size-mb', action='store', type='int', dest='size_mb',
+            default=64, help="Size of the VM overlay in MB")
+    parser.add_option(
+            '-b', '--bandwidth-mbps', action='store', type='float', dest='bandwidth_mbps',
+            default=400.0, help="Bandwidth of the overlay server in Mbit/s")
+    parser.add_option(
+            '-r', '--repeats', action='store', type='int', dest='n_repeats',
+            default=5, help="Number of provisioning of the same overlay")
+    parser.add_option(
+            '-c', '--concurrency', action='store', type='int', dest='concurrency',
+            default=8, help="Number of concurrent provisioning of a new overlay")
+    parser.add_option(
+            '-p', '--changed-percent', action='store', type='float', dest='changed_percent',
+            default=10.0, help="Percent of chunks changed in a new version")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ overlay server with manifests and range requests, and a cloudlet
+    accepting overlay uploads at /cloudlet/
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        server = self.server
+        for offset in range(0, len(body), 64*1024):
+            piece = body[offset:offset+64*1024]
+            time.sleep(len(piece) / server.bandwidth)
+            self.wfile.write(piece)
+            with server.lock:
+                server.bytes_sent += len(piece)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path
+        if path.endswith(OverlayConst.MANIFEST_SUFFIX):
+            overlay = server.overlays.get(path[:-len(OverlayConst.MANIFEST_SUFFIX)])
+            if overlay is None:
+                self.send_error(404)
+                return
+            etag = '"%s"' % overlay["manifest"][OverlayConst.KEY_ROOT]
+            if self.headers.getheader(HTTPConst.HEADER_IF_NONE_MATCH) == etag:
+                self.send_response(304)
+                self.send_header(HTTPConst.HEADER_ETAG, etag)
+                self.end_headers()
+                return
+            self._send(200, json.dumps(overlay["manifest"]),
+                       {HTTPConst.HEADER_ETAG: etag})
+            return
+        overlay = server.overlays.get(path)
+        if overlay is None:
+            self.send_error(404)
+            return
+        data = overlay["data"]
+        byte_range = self.headers.getheader("Range")
+        if byte_range:
+            start, end = byte_range.split("=")[1].split("-")
+            self._send(206, data[int(start):int(end)+1])
+        else:
+            self._send(200, data)
+
+    def do_POST(self):
+        length = int(self.headers.getheader("Content-Length"))
+        while length > 0:
+            length -= len(self.rfile.read(min(length, 1024*1024)))
+        body = json.dumps({OverlayConst.KEY_VM_UUID: "vm-%d" % random.randint(0, 10**9)})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(bandwidth):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server.bandwidth = bandwidth
+    server.lock = threading.Lock()
+    server.bytes_sent = 0
+    server.overlays = dict()
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def publish(server, path, data):
+    leaves = [MerkleTree.leaf_hash(data[offset:offset+CHUNK_SIZE])
+              for offset in range(0, len(data), CHUNK_SIZE)]
+    manifest = MerkleTree(leaves).to_manifest(CHUNK_SIZE, len(data))
+    server.overlays[path] = {"data": data, "manifest": manifest}
+    return "http://127.0.0.1:%d%s" % (server.server_address[1], path)
+
+
+def provision_all(cloudlet, overlay_URL, n_clients, **kwargs):
+    """ provision the same overlay from concurrent clients
+    :return: number of failures
+    """
+    failures = list()
+    def run_client():
+        try:
+            cloudlet.provision(overlay_URL, assign_IP=False, **kwargs)
+        except ProvisioningException as e:
+            failures.append(e)
+    thread_list = [threading.Thread(target=run_client) for _ in range(n_clients)]
+    for th in thread_list:
+        th.start()
+    for th in thread_list:
+        th.join()
+    return len(failures)
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    server = start_server(settings.bandwidth_mbps * 1000 * 1000 / 8)
+    rand = random.Random(0)
+    size = settings.size_mb * 1024 * 1024
+    version1 = bytearray(os.urandom(size))
+    version2 = bytearray(version1)
+    n_chunks = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for index in rand.sample(range(n_chunks),
+                             int(n_chunks * settings.changed_percent / 100)):
+        version2[index * CHUNK_SIZE] ^= 0xff
+    URL1 = publish(server, "/overlay/moped-v1.zip", bytes(version1))
+    URL1_mirror = publish(server, "/mirror/moped-v1.zip", bytes(version1))
+    URL2 = publish(server, "/overlay/moped-v2.zip", bytes(version2))
+    cloudlet = Cloudlet("http://127.0.0.1:%d/cloudlet/" % server.server_address[1])
+
+    work_dir = tempfile.mkdtemp(prefix="overlay-cache-")
+    try:
+        overlay_cache = OverlayCache(os.path.join(work_dir, "cache"))
+        overlay_path = os.path.join(work_dir, "overlay")
+        sys.stdout.write("%d MB overlay at %.0f Mbit/s, %d%% of chunks changed in v2\n" % \
+                         (settings.size_mb, settings.bandwidth_mbps,
+                          settings.changed_percent))
+        sys.stdout.write("%-32s %10s %12s %10s\n" % \
+                         ("scenario", "time (s)", "WAN (MB)", "failures"))
+        def measure(name, func):
+            server.bytes_sent = 0
+            time_start = time.time()
+            n_failures = func()
+            sys.stdout.write("%-32s %10.2f %12.1f %10d\n" % \
+                             (name, time.time() - time_start,
+                              server.bytes_sent / 1024.0 / 1024, n_failures))
+
+        measure("%d x v1, no cache" % settings.n_repeats, lambda: sum(
+            provision_all(cloudlet, URL1, 1, overlay_path=overlay_path)
+            for _ in range(settings.n_repeats)))
+        measure("%d x v1, cached" % settings.n_repeats, lambda: sum(
+            provision_all(cloudlet, URL1, 1, overlay_cache=overlay_cache)
+            for _ in range(settings.n_repeats)))
+        measure("v1 at a mirror URL, cached", lambda:
+            provision_all(cloudlet, URL1_mirror, 1, overlay_cache=overlay_cache))
+        measure("v2, cached v1 chunks", lambda:
+            provision_all(cloudlet, URL2, 1, overlay_cache=overlay_cache))
+        overlay_cache = OverlayCache(os.path.join(work_dir, "cache-concurrent"))
+        measure("%d concurrent x v1, cold cache" % settings.concurrency, lambda:
+            provision_all(cloudlet, URL1, settings.concurrency,
+                          overlay_cache=overlay_cache))
+    finally:
+        shutil.rmtree(work_dir)
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import time
+import random
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.placement import PlacementEngine
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-a n_apps] [-c n_cloudlets]'
+    DESCRIPTION = 'Compare joint placement with per-app greedy selection'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-a', '--apps', action='store', type='int', dest='n_apps',
+            default=10000, help="Number of application requests")
+    parser.add_option(
+            '-c', '--cloudlets', action='store', type='int', dest='n_cloudlets',
+            default=1000, help="Number of cloudlets")
+    parser.add_option(
+            '-i', '--app-ids', action='store', type='int', dest='n_app_ids',
+            default=100, help="Number of distinct applications")
+    parser.add_option(
+            '-r', '--seed', action='store', type='int', dest='seed',
+            default=0, help="Random seed")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+def synthetic_fleet(n_apps, n_cloudlets, n_app_ids, rand):
+    app_ids = ["app-%d" % i for i in range(n_app_ids)]
+    cloudlet_list = list()
+    for index in range(n_cloudlets):
+        cloudlet = Cloudlet("http://10.0.%d.%d:8021/api/v1/resource/" % \
+                            (index / 256, index % 256))
+        cloudlet.meta_info.update({
+            ResourceInfoConst.TOTAL_CPU_NUMBER: rand.choice([8, 16, 32]),
+            ResourceInfoConst.TOTAL_CPU_PERCENT: rand.uniform(0, 50),
+            ResourceInfoConst.TOTAL_MEM_FREE_MB: rand.choice([16384, 32768, 65536]),
+        })
+        clock_speed = rand.choice([1600, 2400, 3200])
+        for app_id in app_ids:
+            setattr(cloudlet, app_id, {
+                ResourceInfoConst.CLOCK_SPEED: clock_speed,
+                ResourceInfoConst.APP_CACHE_TOTAL_SCORE: rand.random() ** 4,
+            })
+        cloudlet_list.append(cloudlet)
+
+    app_list = list()
+    for index in range(n_apps):
+        app_list.append(Application(**{
+            AppInfoConst.APP_ID: rand.choice(app_ids),
+            AppInfoConst.REQUIRED_MIN_CPU_CLOCK: rand.choice([1000, 2000]),
+            AppInfoConst.REQUIRED_CPU_NUMBER: rand.choice([1, 1, 1, 2]),
+            AppInfoConst.REQUIRED_MEM_MB: rand.choice([512, 1024, 2048, 4096]),
+        }))
+    return app_list, cloudlet_list
+
+
+def greedy_placement(app_list, cloudlet_list):
+    # select_cloudlet gives the same answer for the same application,
+    # so compute it once for each application
+    decisions = dict()
+    placement = list()
+    for app_info in app_list:
+        key = (app_info.get_appid(),
+               getattr(app_info, AppInfoConst.REQUIRED_MIN_CPU_CLOCK))
+        if key not in decisions:
+            decisions[key] = ElijahCloudletSelection.select_cloudlet(
+                cloudlet_list, app_info)
+        placement.append(decisions[key])
+    return placement
+
+
+def best_fit_placement(engine, app_list, cloudlet_list):
+    # each application in arrival order to its most useful cloudlet
+    # that still has enough capacity
+    remaining = [list(engine.capacity(cloudlet)) for cloudlet in cloudlet_list]
+    placement = list()
+    for app_info in app_list:
+        cpu, mem = engine.demand(app_info)
+        chosen = None
+        for index, cloudlet in enumerate(cloudlet_list):
+            if remaining[index][0] < cpu or remaining[index][1] < mem:
+                continue
+            utility = engine.utility(app_info, cloudlet)
+            if utility is not None and (chosen is None or utility > chosen[0]):
+                chosen = (utility, index)
+        if chosen is None:
+            placement.append(None)
+            continue
+        remaining[chosen[1]][0] -= cpu
+        remaining[chosen[1]][1] -= mem
+        placement.append(cloudlet_list[chosen[1]])
+    return placement
+
+
+def evaluate(engine, app_list, cloudlet_list, placement):
+    used_cpu = dict()
+    used_mem = dict()
+    utility = 0.0
+    n_placed = 0
+    for app_info, cloudlet in zip(app_list, placement):
+        if cloudlet is None:
+            continue
+        n_placed += 1
+        cpu, mem = engine.demand(app_info)
+        used_cpu[cloudlet] = used_cpu.get(cloudlet, 0.0) + cpu
+        used_mem[cloudlet] = used_mem.get(cloudlet, 0.0) + mem
+        utility += engine.utility(app_info, cloudlet) or 0.0
+    n_overloaded = 0
+    max_load = 0.0
+    for cloudlet in used_cpu:
+        cpu, mem = engine.capacity(cloudlet)
+        load = max(used_cpu[cloudlet] / max(cpu, 1e-9),
+                   used_mem[cloudlet] / max(mem, 1e-9))
+        max_load = max(max_load, load)
+        if load > 1.0:
+            n_overloaded += 1
+    return n_placed, utility, n_overloaded, max_load
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    rand = random.Random(settings.seed)
+    app_list, cloudlet_list = synthetic_fleet(settings.n_apps,
+                                              settings.n_cloudlets,
+                                              settings.n_app_ids, rand)
+    engine = PlacementEngine()
+    sys.stdout.write("%d apps x %d cloudlets\n" % (len(app_list), len(cloudlet_list)))
+    sys.stdout.write("%-10s %10s %10s %10s %12s %10s\n" % \
+                     ("method", "time(s)", "placed", "utility",
+                      "overloaded", "max load"))
+    best_fit = lambda app_list, cloudlet_list: \
+        best_fit_placement(engine, app_list, cloudlet_list)
+    for name, place_func in (("greedy", greedy_placement),
+                             ("best-fit", best_fit),
+                             ("joint", engine.place)):
+        time_start = time.time()
+        placement = place_func(app_list, cloudlet_list)
+        elapsed = time.time() - time_start
+        n_placed, utility, n_overloaded, max_load = \
+            evaluate(engine, app_list, cloudlet_list, placement)
+        sys.stdout.write("%-10s %10.3f %10d %10.1f %12d %10.2f\n" % \
+                         (name, elapsed, n_placed, utility,
+                          n_overloaded, max_load))
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
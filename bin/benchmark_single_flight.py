@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.health import HealthRegistry
+from libcloudlet.latency import LatencyRegistry
+from libcloudlet.http_cache import ConditionalCache
+from libcloudlet.singleflight import SingleFlight
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-n n_clients] [-b n_bursts]'
+    DESCRIPTION = 'Send bursts of identical discoveries to a local stand-in '\
+        'directory server with and without request coalescing'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-n', '--clients', action='store', type='int', dest='n_clients',
+            default=100, help="Number of concurrent clients in a burst")
+    parser.add_option(
+            '-b', '--bursts', action='store', type='int', dest='n_bursts',
+            default=5, help="Number of bursts")
+    parser.add_option(
+            '-d', '--delay-ms', action='store', type='float', dest='delay_ms',
+            default=50.0, help="Server delay of each request in ms")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+APP_ID = "moped"
+N_CLOUDLETS = 3
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ directory server, and the cloudlets under /cloudlet/<index>.
+    Cloudlets answer 503 while the server is failing.
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        is_cloudlet = self.path.startswith("/cloudlet/")
+        with server.lock:
+            if is_cloudlet:
+                server.n_cloudlet_requests += 1
+            else:
+                server.n_directory_requests += 1
+        time.sleep(server.delay)
+        if is_cloudlet and server.failing:
+            self.send_error(503)
+            return
+        if is_cloudlet:
+            body = json.dumps({ResourceInfoConst.CLOCK_SPEED: 3000,
+                               ResourceInfoConst.RTT_BETWEEN_CLIENT: 20,
+                               ResourceInfoConst.TOTAL_CPU_PERCENT: 30})
+        else:
+            body = json.dumps({"cloudlet": [
+                {LANDiscoveryConst.KEY_IP_ADDRESS: "127.0.0.1",
+                 LANDiscoveryConst.KEY_REST_API_PORT: server.server_address[1],
+                 LANDiscoveryConst.KEY_REST_API_URL: "/cloudlet/%d" % index}
+                for index in range(N_CLOUDLETS)]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(delay):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.failing = False
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def run_bursts(server, settings, coalesce):
+    """
+    :return: sorted latencies of every discovery and number of failures
+    """
+    discovery = ElijahCloudletDiscovery(
+        "http://127.0.0.1:%d" % server.server_address[1],
+        health_registry=HealthRegistry(failure_threshold=10**6),
+        latency_registry=LatencyRegistry(),
+        response_cache=ConditionalCache(),
+        single_flight=SingleFlight())
+    if not coalesce:
+        discovery.single_flight = None
+    client_info = MobileClient(GPS_latitude=40.44, GPS_longitude=-79.95)
+    app_info = Application(**{AppInfoConst.APP_ID: APP_ID})
+    latencies = list()
+    failures = list()
+    def run_client(start_event):
+        start_event.wait()
+        time_start = time.time()
+        try:
+            discovery.discover(client_info, app_info)
+        except CloudletException as e:
+            failures.append(e)
+        latencies.append(time.time() - time_start)
+
+    for _ in range(settings.n_bursts):
+        start_event = threading.Event()
+        thread_list = [threading.Thread(target=run_client, args=(start_event,))
+                       for _ in range(settings.n_clients)]
+        for th in thread_list:
+            th.start()
+        start_event.set()
+        for th in thread_list:
+            th.join()
+    latencies.sort()
+    return latencies, len(failures)
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.CRITICAL)
+    server = start_server(settings.delay_ms / 1000.0)
+
+    sys.stdout.write("%d bursts of %d identical discoveries, %.0f ms per request\n" % \
+                     (settings.n_bursts, settings.n_clients, settings.delay_ms))
+    sys.stdout.write("%-22s %10s %10s %10s %10s %10s\n" % \
+                     ("setup", "directory", "cloudlet", "p50 (ms)", "p99 (ms)",
+                      "failures"))
+    for failing in (False, True):
+        for coalesce in (False, True):
+            server.failing = failing
+            server.n_directory_requests = 0
+            server.n_cloudlet_requests = 0
+            latencies, n_failures = run_bursts(server, settings, coalesce)
+            percentile = lambda p: latencies[min(len(latencies) - 1,
+                                                 int(len(latencies) * p))] * 1000
+            name = "%s%s" % ("coalesced" if coalesce else "independent",
+                             ", failing" if failing else "")
+            sys.stdout.write("%-22s %10d %10d %10.1f %10.1f %10d\n" % \
+                             (name, server.n_directory_requests,
+                              server.n_cloudlet_requests, percentile(0.5),
+                              percentile(0.99), n_failures))
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
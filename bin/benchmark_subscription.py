@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.latency import LatencyRegistry
+from libcloudlet.http_cache import ConditionalCache
+from urlparse import urlparse, parse_qs
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-n n_clients] [-u n_updates]'
+    DESCRIPTION = 'Move clients around a local stand-in directory server '\
+        'and compare repeated discovery with subscriptions'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-n', '--clients', action='store', type='int', dest='n_clients',
+            default=1000, help="Number of moving clients")
+    parser.add_option(
+            '-u', '--updates', action='store', type='int', dest='n_updates',
+            default=5, help="Number of location updates of a client")
+    parser.add_option(
+            '-d', '--delay-ms', action='store', type='float', dest='delay_ms',
+            default=1.0, help="Server delay of each request in ms")
+    parser.add_option(
+            '-s', '--seed', action='store', type='int', dest='seed',
+            default=0, help="Random seed")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+APP_ID = "moped"
+AREA = 0.1          # degrees
+CLOUDLET_GRID = 0.02
+STEP = 0.002
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ directory server returning the nearest cloudlets, and the cloudlets
+    themselves under /cloudlet/<index>
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.n_requests += 1
+        time.sleep(server.delay)
+        url = urlparse(self.path)
+        if url.path.startswith("/cloudlet/"):
+            body = json.dumps({ResourceInfoConst.CLOCK_SPEED: 3000,
+                               ResourceInfoConst.RTT_BETWEEN_CLIENT: 20,
+                               ResourceInfoConst.TOTAL_CPU_PERCENT: 30})
+        else:
+            query = parse_qs(url.query)
+            latitude = float(query["latitude"][0])
+            longitude = float(query["longitude"][0])
+            n_ret = int(query["n"][0])
+            nearest = sorted(server.cloudlets, key=lambda c: math.hypot(
+                c[1] - latitude, c[2] - longitude))[:n_ret]
+            body = json.dumps({"cloudlet": [
+                {LANDiscoveryConst.KEY_IP_ADDRESS: "127.0.0.1",
+                 LANDiscoveryConst.KEY_REST_API_PORT: server.server_address[1],
+                 LANDiscoveryConst.KEY_REST_API_URL: "/cloudlet/%d" % index}
+                for index, _, _ in nearest]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(delay):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.n_requests = 0
+    n_grid = int(AREA / CLOUDLET_GRID) + 1
+    server.cloudlets = [(i * n_grid + j, i * CLOUDLET_GRID, j * CLOUDLET_GRID)
+                        for i in range(n_grid) for j in range(n_grid)]
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def walks(settings):
+    """ location updates of every client
+    """
+    rand = random.Random(settings.seed)
+    paths = list()
+    for _ in range(settings.n_clients):
+        latitude, longitude = rand.uniform(0, AREA), rand.uniform(0, AREA)
+        path = list()
+        for _ in range(settings.n_updates):
+            latitude += rand.uniform(-STEP, STEP)
+            longitude += rand.uniform(-STEP, STEP)
+            path.append((latitude, longitude))
+        paths.append(path)
+    return paths
+
+
+def new_discovery(server):
+    return ElijahCloudletDiscovery(
+        "http://127.0.0.1:%d" % server.server_address[1],
+        latency_registry=LatencyRegistry(),
+        response_cache=ConditionalCache())
+
+
+def run_discover(server, paths, app_info):
+    discovery = new_discovery(server)
+    for path in paths:
+        for latitude, longitude in path:
+            client_info = MobileClient(GPS_latitude=latitude,
+                                       GPS_longitude=longitude)
+            discovery.discover(client_info, app_info)
+
+
+def run_subscribe(server, paths, app_info):
+    discovery = new_discovery(server)
+    changes = [0]
+    def on_change(subscription, cloudlet):
+        changes[0] += 1
+    for path in paths:
+        latitude, longitude = path[0]
+        subscription = discovery.subscribe(
+            MobileClient(GPS_latitude=latitude, GPS_longitude=longitude),
+            app_info, on_change)
+        for latitude, longitude in path[1:]:
+            subscription.update_location(latitude, longitude)
+    return changes[0]
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    server = start_server(settings.delay_ms / 1000.0)
+    paths = walks(settings)
+    app_info = Application(**{AppInfoConst.APP_ID: APP_ID})
+
+    sys.stdout.write("%d clients, %d location updates each\n" % \
+                     (settings.n_clients, settings.n_updates))
+    sys.stdout.write("%-15s %12s %12s\n" % ("method", "requests", "time (s)"))
+    for name, run in (("discover", run_discover), ("subscribe", run_subscribe)):
+        server.n_requests = 0
+        time_start = time.time()
+        run(server, paths, app_info)
+        sys.stdout.write("%-15s %12d %12.2f\n" % \
+                         (name, server.n_requests, time.time() - time_start))
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
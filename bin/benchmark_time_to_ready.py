@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+# for local debugging
+if os.path.exists("../libcloudlet") is True:
+    sys.path.insert(0, "../")
+from libcloudlet.base import *
+from libcloudlet.const import *
+from libcloudlet.bandwidth import ThroughputRegistry
+from libcloudlet.selection import TimeToReadySelection
+
+
+def process_command_line(argv):
+    USAGE = 'Usage: %prog [-t n_fleets] [-c n_cloudlets]'
+    DESCRIPTION = 'Simulate fleets of stand-in cloudlets and compare the time '\
+        'to ready of the cloudlet chosen by each selection algorithm'
+
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option(
+            '-t', '--fleets', action='store', type='int', dest='n_fleets',
+            default=100, help="Number of simulated fleets")
+    parser.add_option(
+            '-c', '--cloudlets', action='store', type='int', dest='n_cloudlets',
+            default=10, help="Number of candidate cloudlets in a fleet")
+    parser.add_option(
+            '-o', '--overlay-mb', action='store', type='float', dest='overlay_mb',
+            default=200.0, help="Size of the VM overlay in MB")
+    parser.add_option(
+            '-q', '--queries', action='store', type='int', dest='n_queries',
+            default=3, help="Number of past detail queries to each cloudlet")
+    parser.add_option(
+            '-u', '--uploads', action='store', type='int', dest='n_uploads',
+            default=2, help="Number of past overlay uploads to each cloudlet")
+    parser.add_option(
+            '-m', '--min-kb', action='store', type='float', dest='min_kb',
+            default=64.0, help="Smallest transfer sampled by the throughput "\
+            "estimator in KB")
+    parser.add_option(
+            '-s', '--seed', action='store', type='int', dest='seed',
+            default=0, help="Random seed")
+    settings, args = parser.parse_args(argv)
+    return settings, args
+
+
+APP_ID = "moped"
+N_REQUIRED = 20
+LAUNCH_TIME = 2.0
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ cloudlet answering detail queries after its round trip time and
+    the transfer time of the record at its bandwidth
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        length = int(self.headers.getheader("Content-Length") or 0)
+        self.rfile.read(length)
+        body = json.dumps(server.detail)
+        time.sleep(server.rtt + len(body) / server.bandwidth)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def start_server():
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def create_fleet(settings, servers, app_info, required, rand):
+    """ configure the stand-in cloudlets and make the past transfers to them.
+    Detail queries go through the HTTP client recording the throughput and
+    past overlay uploads are recorded as they would be after the upload.
+
+    :return: list of cloudlets and the true time to ready of each
+    """
+    overlay_size = settings.overlay_mb * 1024 * 1024
+    registry = ThroughputRegistry(min_bytes=int(settings.min_kb * 1024))
+    cloudlet_list = list()
+    fleet = list()
+    for server in servers:
+        server.bandwidth = rand.lognormvariate(0, 1.2) * 2e6
+        server.rtt = rand.uniform(0.005, 0.1)
+        cpu_percent = rand.uniform(0, 90)
+        cached = [item for item in required if rand.random() < rand.random()]
+        hit_fraction = len(cached) / float(len(required))
+        server.detail = {
+            ResourceInfoConst.CLOCK_SPEED: 3000,
+            ResourceInfoConst.RTT_BETWEEN_CLIENT: server.rtt * 1000,
+            ResourceInfoConst.TOTAL_CPU_PERCENT: cpu_percent,
+            ResourceInfoConst.APP_CACHE_FILES: cached,
+            ResourceInfoConst.APP_CACHE_TOTAL_SCORE: hit_fraction,
+        }
+        endpoint = "http://127.0.0.1:%d/api/v1/resource/" % server.server_address[1]
+        throughput = registry.get(endpoint)
+        for _ in range(settings.n_uploads):
+            size = rand.choice([256 * 1024, 4 * 1024 * 1024, 32 * 1024 * 1024])
+            throughput.record(size, server.rtt + size / server.bandwidth * \
+                              rand.lognormvariate(0, 0.3))
+        true_ttr = server.rtt + overlay_size * (1 - hit_fraction) / server.bandwidth + \
+            LAUNCH_TIME / max(0.1, 1 - cpu_percent / 100.0)
+        fleet.append((endpoint, true_ttr))
+
+    for _ in range(settings.n_queries):
+        cloudlet_list = [Cloudlet(endpoint) for endpoint, _ in fleet]
+        ElijahCloudletDiscovery._get_cloudlet_details(
+            cloudlet_list, app_info, throughput_registry=registry)
+    for cloudlet in cloudlet_list:
+        if cloudlet.query_error is not None:
+            raise cloudlet.query_error
+    return cloudlet_list, dict([(cloudlet, true_ttr) for cloudlet, (_, true_ttr)
+                                in zip(cloudlet_list, fleet)])
+
+
+def main(argv):
+    settings, args = process_command_line(sys.argv[1:])
+    logging.getLogger("discovery").setLevel(logging.WARNING)
+    rand = random.Random(settings.seed)
+    required = ["/data/file-%d" % index for index in range(N_REQUIRED)]
+    app_info = Application(**{AppInfoConst.APP_ID: APP_ID,
+                              AppInfoConst.REQUIRED_MIN_CPU_CLOCK: 1600,
+                              AppInfoConst.REQUIRED_CACHE_FILES: required,
+                              AppInfoConst.OVERLAY_SIZE: settings.overlay_mb * 1024 * 1024})
+    algorithms = (
+        ("greedy cache", ElijahCloudletSelection.select_cloudlet),
+        ("time to ready", TimeToReadySelection(launch_time=LAUNCH_TIME).select_cloudlet),
+    )
+    results = dict([(name, list()) for name, _ in algorithms])
+    optimal = dict([(name, 0) for name, _ in algorithms])
+    servers = [start_server() for _ in range(settings.n_cloudlets)]
+    try:
+        for _ in range(settings.n_fleets):
+            cloudlet_list, true_ttr = create_fleet(settings, servers, app_info,
+                                                   required, rand)
+            best = min(true_ttr.values())
+            for name, selector in algorithms:
+                ttr = true_ttr[selector(cloudlet_list, app_info)]
+                results[name].append(ttr)
+                if ttr == best:
+                    optimal[name] += 1
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    sys.stdout.write("%d fleets of %d cloudlets, %.0f MB overlay\n" % \
+                     (settings.n_fleets, settings.n_cloudlets, settings.overlay_mb))
+    sys.stdout.write("%-15s %12s %12s %12s\n" % \
+                     ("method", "mean (s)", "p90 (s)", "optimal"))
+    for name, _ in algorithms:
+        ttrs = sorted(results[name])
+        sys.stdout.write("%-15s %12.1f %12.1f %11.0f%%\n" % \
+                         (name, sum(ttrs) / len(ttrs), ttrs[int(len(ttrs) * 0.9)],
+                          100.0 * optimal[name] / settings.n_fleets))
+    return 0
+
+if __name__ == "__main__":
+    status = main(sys.argv)
+    sys.exit(status)
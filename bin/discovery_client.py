@@ -21,6 +21,7 @@
 import os
 import sys
 import pprint
+import logging
 from optparse import OptionParser
 # for local debugging
 if os.path.exists("../libcloudlet") is True:
@@ -53,6 +54,16 @@ def process_command_line(argv):
     parser.add_option(
             '-u', '--overlay-URL', action='store', type='string', dest='overlay_url',
             default=None, help="Specify the VM overlay URL")
+    parser.add_option(
+            '-C', '--overlay-cache', action='store', type='string', dest='overlay_cache',
+            default=os.path.expanduser("~/.cache/libcloudlet/overlays"),
+            help="Directory caching VM overlays downloaded from overlay URLs")
+    parser.add_option(
+            '--overlay-cache-mb', action='store', type='int', dest='overlay_cache_mb',
+            default=10240, help="Maximum size of the VM overlay cache in MB")
+    parser.add_option(
+            '-l', '--lan-discovery', action='store_true', dest='lan_discovery',
+            default=False, help="Race multicast LAN discovery against the directory server")
     settings, args = parser.parse_args(argv)
 
     if not settings.directory_server:
@@ -65,8 +76,19 @@ def process_command_line(argv):
     return settings, args
 
 
+def setup_logging():
+    log = logging.getLogger("discovery")
+    log.setLevel(logging.DEBUG)
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(levelname)-8s %(message)s')
+    ch.setFormatter(formatter)
+    log.addHandler(ch)
+
+
 def main(argv):
     settings, args = process_command_line(sys.argv[1:])
+    setup_logging()
 
     # set application info
     app_info = Application(**{
@@ -98,14 +120,29 @@ def main(argv):
     m_device_info = MobileClient(**properties)
 
     # find the best cloudlet querying to the registration server
-    discovery = ElijahCloudletDiscovery(settings.directory_server)
+    discovery = ElijahCloudletDiscovery(settings.directory_server,
+                                        lan_discovery=settings.lan_discovery)
     cloudlet = discovery.discover(client_info=m_device_info,
                        app_info=app_info)
     sys.stdout.write("Query results:\n")
     sys.stdout.write(pprint.pformat(cloudlet)+"\n")
 
+    # provision the VM overlay at the URL through the local overlay cache
+    if cloudlet and settings.overlay_url:
+        from libcloudlet.overlay_cache import OverlayCache
+        overlay_cache = OverlayCache(settings.overlay_cache,
+                                     max_bytes=settings.overlay_cache_mb*1024*1024)
+        try:
+            vm = cloudlet.provision(settings.overlay_url,
+                                    overlay_cache=overlay_cache)
+            sys.stdout.write("SUCCESS in Provisioning VM %s\n" % vm.UUID)
+        except ProvisioningException as e:
+            sys.stderr.write(str(e) + "\n")
+            return 1
+        return 0
+
     # perform cloudlet provisioning using given VM overlay
-    if cloudlet and (settings.overlay_file or settings.overlay_url):
+    if cloudlet and settings.overlay_file:
         synthesis_client = None
         # provision the back-end server at the Cloudlet
         ip_addr = cloudlet.get("ip_address")
@@ -114,12 +151,8 @@ def main(argv):
         synthesis_option[Protocol.SYNTHESIS_OPTION_DISPLAY_VNC] = False
         synthesis_option[Protocol.SYNTHESIS_OPTION_EARLY_START] = False
 
-        if settings.overlay_file:
-            synthesis_client = SynthesisClient(ip_addr, port, overlay_file=settings.overlay_file,
-                    app_function=None, synthesis_option=synthesis_option)
-        elif settings.overlay_url:
-            synthesis_client = SynthesisClient(ip_addr, port, overlay_url=settings.overlay_url,
-                    app_function=None, synthesis_option=synthesis_option)
+        synthesis_client = SynthesisClient(ip_addr, port, overlay_file=settings.overlay_file,
+                app_function=None, synthesis_option=synthesis_option)
 
         try:
             synthesis_client.provisioning()
@@ -0,0 +1,63 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""Submodules are imported at their first access as attributes of the
+package, e.g. ``libcloudlet.base``, so importing the package is cheap.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import sys
+import types
+import importlib
+
+
+_SUBMODULES = frozenset([
+    "bandwidth", "base", "const", "federation", "health", "history",
+    "http_cache", "imaging", "jobs", "lan_discovery", "latency",
+    "overlay_cache", "placement", "registry", "selection",
+    "selection_cache", "singleflight", "subscription", "transfer", "wire",
+])
+
+
+class _LazyPackage(types.ModuleType):
+    """ package module importing its submodules on attribute access
+    """
+
+    def __getattr__(self, name):
+        if name not in _SUBMODULES:
+            raise AttributeError("module %r has no attribute %r" % \
+                                 (self.__name__, name))
+        module = importlib.import_module("%s.%s" % (self.__name__, name))
+        setattr(self, name, module)
+        return module
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys()) | _SUBMODULES)
+
+
+def _install():
+    package = sys.modules[__name__]
+    lazy_package = _LazyPackage(__name__, __doc__)
+    lazy_package.__dict__.update(package.__dict__)
+    # keep the original module alive, or Python 2 clears its globals
+    lazy_package._original_module = package
+    sys.modules[__name__] = lazy_package
+
+_install()
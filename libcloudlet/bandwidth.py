@@ -0,0 +1,91 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module estimates the throughput to each endpoint passively.
+
+No probe traffic is sent. Every response read from a cloudlet and every
+VM overlay upload gives a sample of bytes over transfer time. A small
+response, e.g. a detail record of a few hundred bytes, measures the round
+trip rather than the link, so samples smaller than *min_bytes* are
+ignored. The estimate is the bytes over the time of the recent transfers
+added together, so a large transfer counts in proportion to its size.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import threading
+
+
+class ThroughputEstimator(object):
+    """ Throughput to an endpoint over its recent transfers
+
+    :param decay: factor applied to the bytes and time of the previous\
+        transfers at every new sample
+    :type decay: float
+    :param min_bytes: size of the smallest transfer measuring the link
+    :type min_bytes: int
+    """
+
+    def __init__(self, endpoint, decay=0.7, min_bytes=64 * 1024):
+        self.endpoint = endpoint
+        self.decay = decay
+        self.min_bytes = min_bytes
+        self.total_bytes = 0.0
+        self.total_seconds = 0.0
+        self.n_samples = 0
+        self.lock = threading.Lock()
+
+    def record(self, n_bytes, seconds):
+        """ add a transfer of *n_bytes* taking *seconds*
+        """
+        if n_bytes < self.min_bytes or seconds <= 0:
+            return
+        with self.lock:
+            self.total_bytes = self.decay * self.total_bytes + n_bytes
+            self.total_seconds = self.decay * self.total_seconds + seconds
+            self.n_samples += 1
+
+    def estimate(self, default=None):
+        """
+        :return: throughput in bytes per second, *default* without any\
+            transfer of *min_bytes*
+        :rtype: float
+        """
+        with self.lock:
+            if self.n_samples == 0:
+                return default
+            return self.total_bytes / self.total_seconds
+
+
+class ThroughputRegistry(object):
+    """ Thread-safe map of endpoint to :class:`ThroughputEstimator`
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self.lock:
+            estimator = self.endpoints.get(endpoint, None)
+            if estimator is None:
+                estimator = ThroughputEstimator(endpoint, **self.kwargs)
+                self.endpoints[endpoint] = estimator
+            return estimator
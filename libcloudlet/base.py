@@ -22,18 +22,22 @@
 
 __docformat__ = 'reStructuredText'
 
-import sys
+import os
 import threading
-import urllib
-import httplib
 import json
 import time
-import socket
+import hashlib
 import logging
-import pprint
 from urlparse import urlparse
 from contextlib import closing
 from . import const
+from .health import HealthRegistry
+from .latency import LatencyRegistry, hedged_call
+from .http_cache import ConditionalCache, CachedResponse, apply_delta
+from . import wire
+from .history import HistoryRegistry
+from .bandwidth import ThroughputRegistry
+from .singleflight import SingleFlight
 
 
 class CloudletException(Exception):
@@ -44,6 +48,19 @@ class CloudletException(Exception):
 
 class DiscoveryException(CloudletException):
     """Handoff exception
+
+    :param failed_cloudlets: cloudlets that failed to answer, each having\
+        its error at query_error attribute
+    :type failed_cloudlets: list of :class:`Cloudlet`
+    """
+
+    def __init__(self, msg, failed_cloudlets=None):
+        super(DiscoveryException, self).__init__(msg)
+        self.failed_cloudlets = failed_cloudlets or list()
+
+
+class CloudletUnavailableException(DiscoveryException):
+    """Cloudlet is skipped because its circuit breaker is open
     """
     pass
 
@@ -71,14 +88,156 @@ class CreateVMOverlayException(CloudletException):
     pass
 
 
-# Logging
+# Logging. Applications configure handlers of the "discovery" logger
 _LOG = logging.getLogger("discovery")
-_LOG.setLevel(logging.DEBUG)
-ch = logging.StreamHandler(sys.stdout)
-ch.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(levelname)-8s %(message)s')
-ch.setFormatter(formatter)
-_LOG.addHandler(ch)
+_LOG.addHandler(logging.NullHandler())
+
+# timeout in seconds when the latency of an endpoint is unknown
+_DEFAULT_TIMEOUT = 10
+# timeout in seconds of an overlay upload, which the cloudlet answers after
+# resuming the VM and assigning its IP address
+_UPLOAD_TIMEOUT = 300
+
+
+def _http_request(end_point, method, body=None, headers=None,
+                  latency_tracker=None, throughput_estimator=None):
+    """ Send HTTP request and read the response.
+
+    Connect and read timeouts come from the latency tracker of the end point
+    and a hedged request is sent when the tracker allows it.
+
+    :param end_point: parsed end point URL
+    :type end_point: urlparse.ParseResult
+    :param latency_tracker: latency distribution of the end point
+    :type latency_tracker: :class:`LatencyTracker`
+    :param throughput_estimator: throughput of the end point measured by\
+        the response
+    :type throughput_estimator: :class:`ThroughputEstimator`
+    :return: HTTP response and its body
+    :rtype: tuple of (httplib.HTTPResponse, str)
+    """
+    import httplib
+    import socket
+    if latency_tracker:
+        connect_timeout, read_timeout = latency_tracker.timeouts()
+        hedge_delay = latency_tracker.hedge_delay()
+    else:
+        connect_timeout = read_timeout = _DEFAULT_TIMEOUT
+        hedge_delay = None
+    path = end_point.path
+    if end_point.query:
+        path = "%s?%s" % (path, end_point.query)
+
+    def send_request():
+        conn = httplib.HTTPConnection(end_point.hostname, end_point.port,
+                                      timeout=connect_timeout)
+        with closing(conn):
+            connected = False
+            try:
+                time_start = time.time()
+                conn.connect()
+                time_connected = time.time()
+                connected = True
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, body, headers or dict())
+                response = conn.getresponse()
+                data = response.read()
+            except socket.timeout:
+                if latency_tracker:
+                    latency_tracker.record_timeout(connect_timeout,
+                                                   read_timeout, connected)
+                raise
+            time_end = time.time()
+            if latency_tracker:
+                latency_tracker.record(time_connected - time_start,
+                                       time_end - time_connected)
+            if throughput_estimator:
+                throughput_estimator.record(len(data), time_end - time_connected)
+            return response, data
+    return hedged_call(send_request, hedge_delay)
+
+
+def _decode_response(response, data):
+    """ Decode the response body using its Content-Type.
+    JSON is used unless the body is in the binary wire format.
+    """
+    content_type = response.getheader("Content-Type", None) or ""
+    if content_type.split(";")[0].strip() == wire.CONTENT_TYPE:
+        return wire.decode(data)
+    return json.loads(data)
+
+
+def _json_request(end_point, method, body=None, headers=None,
+                  latency_tracker=None, response_cache=None, cache_key=None,
+                  throughput_estimator=None, conditional=True):
+    """ Send HTTP request and parse the JSON (or binary wire format) response.
+
+    With a response cache, the request is conditional on the validators of
+    the cached response. A 304 response reuses the cached object and a
+    delta response is applied to it. When neither can be used, the full
+    response is fetched again without the validators.
+
+    :param response_cache: cache of parsed responses
+    :type response_cache: :class:`ConditionalCache`
+    :param cache_key: key of the response at the cache
+    :param conditional: send the validators of the cached response
+    :type conditional: bool
+    :return: parsed response and its digest
+    :rtype: tuple of (dict, str)
+    """
+    import httplib
+    entry = None
+    request_headers = dict(headers or dict())
+    if response_cache is not None and conditional:
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            request_headers.update(entry.validator_headers())
+    response, data = _http_request(end_point, method, body, request_headers,
+                                   latency_tracker, throughput_estimator)
+    delta_base = response.getheader(const.HTTPConst.HEADER_DELTA_BASE, None)
+    if response.status == httplib.NOT_MODIFIED:
+        if entry is not None:
+            return entry.parsed, entry.digest
+        unusable = "Not modified response to %s is not cached" % cache_key
+    elif delta_base is not None and \
+            (entry is None or entry.version != delta_base):
+        unusable = "Delta base %s is not cached" % delta_base
+    else:
+        unusable = None
+    if unusable is not None:
+        if not conditional:
+            raise CloudletException("%s. Full response is not given" % unusable)
+        # cannot use the response. Fetch the full response
+        _LOG.info("%s. Fetch again", unusable)
+        if response_cache is not None:
+            response_cache.remove(cache_key)
+        return _json_request(end_point, method, body, headers,
+                             latency_tracker, response_cache, cache_key,
+                             throughput_estimator, conditional=False)
+
+    if delta_base is not None:
+        parsed = apply_delta(entry.parsed, _decode_response(response, data))
+        digest = hashlib.sha1(json.dumps(parsed, sort_keys=True)).hexdigest()
+    else:
+        parsed = _decode_response(response, data)
+        digest = hashlib.sha1(data).hexdigest()
+
+    if response_cache is not None:
+        etag = response.getheader(const.HTTPConst.HEADER_ETAG, None)
+        version = response.getheader(const.HTTPConst.HEADER_VERSION, None)
+        if etag or version:
+            response_cache.put(cache_key,
+                               CachedResponse(parsed, digest, etag, version))
+    return parsed, digest
+
+
+def _submit_job(func, executor=None):
+    """ run func(job) at *executor*, or at the executor of the process
+    """
+    if executor is None:
+        from .jobs import default_executor
+        executor = default_executor()
+    return executor.submit(func)
 
 
 class DiscoveryService(object):
@@ -87,11 +246,13 @@ class DiscoveryService(object):
 
     def __init__(self, directory_server=None, **kwargs):
         """
-        :param directory_server: IP address or domain name of a cloud directory server
+        :param directory_server: IP address or domain name of a cloud directory\
+            server, or a list of them (see :class:`ElijahCloudletDiscovery`)
         :type directory_server: string
         """
         self.directory_server = directory_server
-        if self.directory_server.endswith('/'):
+        if hasattr(self.directory_server, 'endswith') and \
+                self.directory_server.endswith('/'):
             self.directory_server = self.directory_server[:-1]
 
     def discover(self, **kwargs):
@@ -103,24 +264,14 @@ class DiscoveryService(object):
 class ElijahCloudletSelection(object):
 
     @staticmethod
-    def select_cloudlet(cloudlet_list, app_info):
-        """ Select one cloudlet using application information
+    def filter_cloudlets(cloudlet_list, app_info):
+        """ Filter out cloudlets not meeting the application requirements
 
         :param cloudlet_list : list of promising cloudlet
         :type cloudlet_list: list of :class:`Cloudlet` object
-        :return: selected cloudlet
-        :rtype: :class:`Cloudlet` object
+        :return: cloudlets meeting the requirements
+        :rtype: list of :class:`Cloudlet` object
         """
-        # check pre-conditions
-        item_len = len(cloudlet_list)
-        if item_len == 0:
-            msg = "No available cloudlet at the list\n"
-            raise DiscoveryException(msg)
-        if item_len == 1:
-            _LOG.info("Only one cloudlet is available")
-            return cloudlet_list[0]
-
-        # filter out using required conditions
         filtered_cloudlet = []
         for cloudlet in cloudlet_list:
             # get application specific cloudlet info
@@ -130,15 +281,36 @@ class ElijahCloudletSelection(object):
             # check CPU min
             required_clock_speed = getattr(app_info, const.AppInfoConst.REQUIRED_MIN_CPU_CLOCK, 0.0)
             cloudlet_cpu_speed = cloudlet_info.get(const.ResourceInfoConst.CLOCK_SPEED, 0.0)
-            if required_clock_speed:
-                if cloudlet_cpu_speed >= required_clock_speed:
-                    filtered_cloudlet.append(cloudlet)
+            if not required_clock_speed or cloudlet_cpu_speed >= required_clock_speed:
+                filtered_cloudlet.append(cloudlet)
             # check rtt
             #required_rtt = getattr(app_info, const.AppInfoConst.REQUIRED_RTT, 0)
             #cloudlet_rtt = cloudlet_info.get(const.ResourceInfoConst.RTT_BETWEEN_CLIENT, 0)
             #if required_rtt:
             #    if cloudlet_rtt < required_rtt:
             #        filtered_cloudlet.append(cloudlet)
+        return filtered_cloudlet
+
+    @staticmethod
+    def select_cloudlet(cloudlet_list, app_info):
+        """ Select one cloudlet using application information
+
+        :param cloudlet_list : list of promising cloudlet
+        :type cloudlet_list: list of :class:`Cloudlet` object
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        """
+        # check pre-conditions
+        item_len = len(cloudlet_list)
+        if item_len == 0:
+            msg = "No available cloudlet at the list\n"
+            raise DiscoveryException(msg)
+        if item_len == 1:
+            _LOG.info("Only one cloudlet is available")
+            return cloudlet_list[0]
+
+        # filter out using required conditions
+        filtered_cloudlet = ElijahCloudletSelection.filter_cloudlets(cloudlet_list, app_info)
         if len(filtered_cloudlet) == 0:
             _LOG.warning("No available cloudlet meeting condition")
             return None
@@ -166,13 +338,96 @@ class ElijahCloudletSelection(object):
 
 class ElijahCloudletDiscovery(DiscoveryService):
     _REST_API_URL        =   "/api/v1/Cloudlet/search/"
-
-    def __init__(self, directory_server=None, **kwargs):
+    _HEALTH_REGISTRY     =   HealthRegistry()
+    _LATENCY_REGISTRY    =   LatencyRegistry()
+    _RESPONSE_CACHE      =   ConditionalCache()
+    _HISTORY_REGISTRY    =   HistoryRegistry()
+    _THROUGHPUT_REGISTRY =   ThroughputRegistry()
+    _SINGLE_FLIGHT       =   SingleFlight()
+
+    def __init__(self, directory_server=None, lan_discovery=None,
+                 health_registry=None, latency_registry=None,
+                 selection_cache=None, response_cache=None,
+                 snapshot_path=None, snapshot_interval=60.0,
+                 history_registry=None, throughput_registry=None,
+                 single_flight=None, flight_timeout=None, **kwargs):
         """
-        :param directory_server: IP address or domain name of a cloud directory server
-        :type directory_server: string
+        :param directory_server: IP address or domain name of a cloud directory\
+            server. A list of servers is queried as replicas, and a list of\
+            lists as shards of replicas that are queried concurrently.
+        :type directory_server: string, list, or :class:`DirectoryFederation`
+        :param lan_discovery: client for multicast discovery at the LAN.\
+            True to use the default client. LAN discovery races against\
+            the directory server query.
+        :type lan_discovery: :class:`LANDiscoveryClient` or bool
+        :param health_registry: health state of cloudlets. Shared by every\
+            discovery object of the process if not given.
+        :type health_registry: :class:`HealthRegistry`
+        :param latency_registry: latency of endpoints deciding timeouts and\
+            hedged requests. Shared by every discovery object of the process\
+            if not given.
+        :type latency_registry: :class:`LatencyRegistry`
+        :param selection_cache: memoize decisions of the default selection
+        :type selection_cache: :class:`SelectionCache`
+        :param response_cache: parsed responses for conditional requests.\
+            Shared by every discovery object of the process if not given.
+        :type response_cache: :class:`ConditionalCache`
+        :param snapshot_path: file saving responses and latencies learned by\
+            this process. A restarted process serves lookups from it.
+        :type snapshot_path: str
+        :param snapshot_interval: minimum seconds between snapshot writes
+        :type snapshot_interval: float
+        :param history_registry: recent resource samples of cloudlets.\
+            Shared by every discovery object of the process if not given.
+        :type history_registry: :class:`HistoryRegistry`
+        :param throughput_registry: throughput to cloudlets measured by\
+            queries and provisioning. Shared by every discovery object of\
+            the process if not given.
+        :type throughput_registry: :class:`ThroughputRegistry`
+        :param single_flight: directory queries and cloudlet queries in\
+            flight, shared by concurrent identical queries. Shared by every\
+            discovery object of the process if not given.
+        :type single_flight: :class:`SingleFlight`
+        :param flight_timeout: seconds that a query waits for an identical\
+            query in flight. The query fails with :class:`CallTimeout`\
+            when it expires. None to wait until the query in flight ends.
+        :type flight_timeout: float
         """
         super(ElijahCloudletDiscovery, self).__init__(directory_server, **kwargs)
+        if lan_discovery is True:
+            from .lan_discovery import LANDiscoveryClient
+            lan_discovery = LANDiscoveryClient()
+        self.lan_discovery = lan_discovery or None
+        self.health_registry = health_registry or self._HEALTH_REGISTRY
+        self.latency_registry = latency_registry or self._LATENCY_REGISTRY
+        self.selection_cache = selection_cache
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_time = time.time()
+        if snapshot_path:
+            self.snapshot = self._load_snapshot(snapshot_path)
+            if response_cache is None:
+                response_cache = ConditionalCache(snapshot=self.snapshot)
+            if latency_registry is None:
+                self.latency_registry = LatencyRegistry(snapshot=self.snapshot)
+            for registry in (response_cache, self.latency_registry):
+                if registry.snapshot is None:
+                    registry.snapshot = self.snapshot
+        self.response_cache = response_cache or self._RESPONSE_CACHE
+        self.history_registry = history_registry or self._HISTORY_REGISTRY
+        self.throughput_registry = throughput_registry or self._THROUGHPUT_REGISTRY
+        self.single_flight = single_flight or self._SINGLE_FLIGHT
+        self.flight_timeout = flight_timeout
+        self.subscription_manager = None
+        self.federation = None
+        if self.directory_server and not hasattr(self.directory_server, 'endswith'):
+            from .federation import DirectoryFederation
+            self.federation = DirectoryFederation.from_servers(self.directory_server)
+        if not self.directory_server and not self.lan_discovery:
+            msg = "Need either directory server or LAN discovery"
+            raise DiscoveryException(msg)
 
     def discover(self, client_info=None, app_info=None,
                  selection_algorithm=None, **kwargs):
@@ -187,71 +442,305 @@ class ElijahCloudletDiscovery(DiscoveryService):
             selection_algorithm(list of :class:`Cloudlet`, app_info)
 
         :return: a cloudlet object selected using client and application\
-            infomation
+            infomation. Its failed_cloudlets attribute has the candidates\
+            that failed to answer.
         :rtype: :class:`Cloudlet` object
+        :raises: :class:`DiscoveryException` having the failed cloudlets\
+            when every candidate fails to answer
         """
 
         # first level search to get cloudlet list from central directory server
         time_cloud_conn = time.time()
-        cloudlet_list = self._list_cloudlets(self.directory_server, app_info)
+        cloudlet_list = self._find_candidates(app_info, client_info)
         if not cloudlet_list:
-            msg = "Cannot find any cloudlet from directory server at %s" % str(end_point)
+            msg = "Cannot find any cloudlet from directory server at %s" % \
+                str(self.directory_server)
             raise CloudletException(msg)
 
         # second level search to each cloudlet
         time_cloudlet_conn = time.time()
-        self._get_cloudlet_details(cloudlet_list, app_info)
+        self._get_cloudlet_details(cloudlet_list, app_info,
+                                   self.health_registry,
+                                   self.latency_registry,
+                                   self.response_cache,
+                                   self.history_registry,
+                                   self.throughput_registry,
+                                   self.single_flight,
+                                   self.flight_timeout,
+                                   self.selection_cache)
         time_cloudlet_ret = time.time()
+        failed_cloudlets = [c for c in cloudlet_list if c.query_error]
+        cloudlet_list = [c for c in cloudlet_list if not c.query_error]
+        for failed in failed_cloudlets:
+            _LOG.warning("Skip cloudlet at %s: %s", failed.REST_endpoint,
+                         failed.query_error)
+        if not cloudlet_list:
+            msg = "Failed to query every cloudlet:\n"
+            msg += "\n".join(["%s: %s" % (c.REST_endpoint, str(c.query_error))
+                              for c in failed_cloudlets])
+            raise DiscoveryException(msg, failed_cloudlets)
 
         # select the best one
-        if not selection_algorithm:
-            selection_algorithm = ElijahCloudletSelection.select_cloudlet
-        cloudlet = selection_algorithm(cloudlet_list, app_info)
+        if selection_algorithm:
+            cloudlet = selection_algorithm(cloudlet_list, app_info)
+        elif self.selection_cache:
+            cloudlet = self.selection_cache.select(
+                cloudlet_list, app_info,
+                ElijahCloudletSelection.select_cloudlet, client_info)
+        else:
+            cloudlet = ElijahCloudletSelection.select_cloudlet(cloudlet_list, app_info)
+        if cloudlet is not None:
+            cloudlet.failed_cloudlets = failed_cloudlets
         time_query_end = time.time()
 
+        self._save_snapshot_periodically()
+
         # print time measurement
-        if True:
-            _LOG.debug("Time from get cloudlet list from cloud:\t%f" % \
-                       (time_cloudlet_conn-time_cloud_conn))
-            _LOG.debug("Time from get detail cloudlet info:\t%f" % \
-                       (time_cloudlet_ret-time_cloudlet_conn))
-            _LOG.debug("Time to make a decision:\t\t%f" % \
-                       (time_query_end-time_cloudlet_ret))
-            _LOG.debug("Total time:\t\t\t\t%f" %\
-                       (time_query_end-time_cloudlet_ret))
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug("Time from get cloudlet list from cloud:\t%f",
+                       time_cloudlet_conn-time_cloud_conn)
+            _LOG.debug("Time from get detail cloudlet info:\t%f",
+                       time_cloudlet_ret-time_cloudlet_conn)
+            _LOG.debug("Time to make a decision:\t\t%f",
+                       time_query_end-time_cloudlet_ret)
+            _LOG.debug("Total time:\t\t\t\t%f",
+                       time_query_end-time_cloudlet_ret)
         return cloudlet
 
+    def subscribe(self, client_info, app_info, callback, **kwargs):
+        """Keep a cloudlet selected for a moving client.
+
+        The candidates are queried again only when the client crosses a
+        location cell boundary or the candidates of its cell expire, and are
+        shared with the other subscriptions in the cell. Keyword arguments
+        of :class:`SubscriptionManager` are taken at the first subscription.
+
+        :param client_info: data structure saving mobile client information
+        :type client_info: :class:`MobileClient`
+        :param app_info: data structure saving application information
+        :type app_info: :class:`Application`
+        :param callback: callback(subscription, cloudlet) called when the\
+            selected cloudlet changes
+        :return: subscription taking location updates
+        :rtype: :class:`Subscription`
+        """
+        if self.subscription_manager is None:
+            from .subscription import SubscriptionManager
+            self.subscription_manager = SubscriptionManager(self, **kwargs)
+        return self.subscription_manager.subscribe(client_info, app_info, callback)
+
     @staticmethod
-    def _list_cloudlets(directory_server, app_info, n_ret_cloudlet=3):
+    def _load_snapshot(snapshot_path):
+        from .registry import RegistrySnapshot, SnapshotError
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            snapshot = RegistrySnapshot(snapshot_path)
+        except SnapshotError as e:
+            _LOG.warning("Ignore registry snapshot: %s", e)
+            return None
+        _LOG.info("Loaded registry snapshot of %d responses (%.1f s old)",
+                  snapshot.n_responses, snapshot.age())
+        return snapshot
+
+    def save_snapshot(self):
+        """ Write the registry snapshot to *snapshot_path* atomically
+        """
+        from .registry import write_snapshot
+        if not self.snapshot_path:
+            return
+        with self.snapshot_lock:
+            write_snapshot(self.snapshot_path, self.response_cache,
+                           self.latency_registry, self.snapshot)
+            self.snapshot_time = time.time()
+
+            # look up the new snapshot from now on. The previous one is not
+            # closed since other threads may be reading it.
+            previous, self.snapshot = self.snapshot, \
+                self._load_snapshot(self.snapshot_path)
+            if self.response_cache.snapshot is previous:
+                self.response_cache.set_snapshot(self.snapshot)
+            if self.latency_registry.snapshot is previous:
+                self.latency_registry.snapshot = self.snapshot
+
+    def _save_snapshot_periodically(self):
+        if not self.snapshot_path or \
+                time.time() - self.snapshot_time < self.snapshot_interval:
+            return
+        def save():
+            try:
+                self.save_snapshot()
+            except (IOError, OSError) as e:
+                _LOG.warning("Failed to save registry snapshot: %s", e)
+        self.snapshot_time = time.time()
+        save_thread = threading.Thread(target=save)
+        save_thread.daemon = True
+        save_thread.start()
+
+    def _find_candidates(self, app_info, client_info=None):
+        """ Get promising cloudlets either from the directory server or from
+        the LAN, whichever returns usable candidates first.
+
+        :param app_info: data structure saving application information
+        :type app_info: :class:`Application`
+        :param client_info: mobile client information having its location
+        :type client_info: :class:`MobileClient`
+        :return: cloudlet list
+        :rtype: list of :class:`Cloudlet` object
+        """
+        if not self.lan_discovery:
+            return self._query_directory(app_info, client_info)
+        if not self.directory_server:
+            return self._list_lan_cloudlets(self.lan_discovery, app_info)
+
+        import Queue
+        result_queue = Queue.Queue()
+        def run_query(source, query_func, app_info):
+            # always answer, otherwise the loop below waits forever
+            try:
+                result_queue.put((source, query_func(app_info), None))
+            except Exception as e:
+                result_queue.put((source, None, e))
+        sources = [
+            ("directory", lambda app: self._query_directory(app, client_info)),
+            ("LAN", lambda app: self._list_lan_cloudlets(self.lan_discovery, app)),
+        ]
+        for source, query_func in sources:
+            query_thread = threading.Thread(target=run_query,
+                                            args=(source, query_func, app_info))
+            query_thread.daemon = True
+            query_thread.start()
+
+        last_error = None
+        for _ in sources:
+            source, cloudlet_list, error = result_queue.get()
+            if cloudlet_list:
+                _LOG.info("Use cloudlet candidates from %s", source)
+                return cloudlet_list
+            if error is not None:
+                _LOG.info("Failed to get cloudlets from %s: %s", source, error)
+                last_error = error
+        if last_error is not None:
+            raise last_error
+        return list()
+
+    def _query_directory(self, app_info, client_info=None):
+        if not self.federation:
+            return self._list_cloudlets(self.directory_server, app_info,
+                                        latency_registry=self.latency_registry,
+                                        response_cache=self.response_cache,
+                                        client_info=client_info,
+                                        single_flight=self.single_flight,
+                                        flight_timeout=self.flight_timeout)
+
+        # The query of each replica is not shared, otherwise a later query
+        # waits for the slow replica that hedging gave up on. Concurrent
+        # identical queries share the whole federated query instead.
+        def list_cloudlets(directory_server):
+            return self._list_cloudlets(directory_server, app_info,
+                                        latency_registry=self.latency_registry,
+                                        response_cache=self.response_cache,
+                                        client_info=client_info)
+        query = lambda: self.federation.query(list_cloudlets, self.latency_registry)
+        if not self.single_flight:
+            return query()
+        key = ("directory", str(self.federation),
+               self._directory_query(app_info, client_info=client_info))
+        cloudlet_list = self.single_flight.do(key, query, self.flight_timeout)
+        # each caller updates its own cloudlet objects
+        return self._build_cloudlet_list([c.meta_info for c in cloudlet_list])
+
+    @staticmethod
+    def _list_lan_cloudlets(lan_discovery, app_info):
+        """ get the list of cloudlets at the LAN using multicast query
+
+        :param lan_discovery: client for multicast discovery
+        :type lan_discovery: :class:`LANDiscoveryClient`
+        :return: cloudlet list
+        :rtype: list of :class:`Cloudlet` object
+        """
+        records = lan_discovery.query(app_info)
+        return ElijahCloudletDiscovery._build_cloudlet_list(records)
+
+    @staticmethod
+    def _list_cloudlets(directory_server, app_info, n_ret_cloudlet=3,
+                        latency_registry=None, response_cache=None,
+                        client_info=None, single_flight=None,
+                        flight_timeout=None):
         """ get the list of promising cloudlets from the directory server
         :param app_info: data structure saving application information
         :type app_info: :class:`Application`
+        :param client_info: mobile client information. Its location is used\
+            before the one at *app_info*.
+        :type client_info: :class:`MobileClient`
+        :param latency_registry: latency of endpoints deciding timeouts
+        :type latency_registry: :class:`LatencyRegistry`
+        :param response_cache: parsed responses for conditional requests
+        :type response_cache: :class:`ConditionalCache`
+        :param single_flight: share the query with concurrent identical ones
+        :type single_flight: :class:`SingleFlight`
+        :param flight_timeout: seconds to wait for an identical query in\
+            flight. None to wait until it ends.
+        :type flight_timeout: float
         :return: cloudlet list
         :rtype: list of :class:`Cloudlet` object
         """
         # set up end point for REST API call
-        latitude = getattr(app_info, 'GPS_latitude', None)
-        longitude = getattr(app_info, 'GPS_longitude', None)
-        client_ip = getattr(app_info, 'client_ip', None)
-        if latitude and longitude: # search by given GPS coordinate
-            end_point = urlparse("%s%s?n=%d&latitude=%s&longitude=%s" % \
-                    (directory_server, ElijahCloudletDiscovery._REST_API_URL, \
-                    n_max, latitude, longitude))
-        elif client_ip: # search by specified IP address
-            end_point = urlparse("%s%s?n=%d&client_ip=%s" % \
-                    (directory_server, ElijahCloudletDiscovery._REST_API_URL, \
-                    n_max, str(client_ip)))
-        else: # search by device's IP address
-            end_point = urlparse("%s%s?n=%d" % \
-                    (directory_server, ElijahCloudletDiscovery._REST_API_URL, \
-                    n_ret_cloudlet))
+        end_point = urlparse("%s%s" % (directory_server,
+            ElijahCloudletDiscovery._directory_query(app_info, n_ret_cloudlet,
+                                                     client_info)))
 
         # send query and organize results
-        ret_data = ElijahCloudletDiscovery._http_get(end_point)
-        cloudlets = json.loads(ret_data).get('cloudlet', list())
+        latency_tracker = None
+        if latency_registry:
+            latency_tracker = latency_registry.get(directory_server)
+        query = lambda: ElijahCloudletDiscovery._http_get(end_point,
+                                                          latency_tracker,
+                                                          response_cache)
+        if single_flight:
+            ret_data = single_flight.do(("directory", end_point.geturl()), query,
+                                        flight_timeout)
+        else:
+            ret_data = query()
+        cloudlets = ret_data.get('cloudlet', list())
         if not cloudlets:
             msg = "No cloudlet is active at %s" % str(end_point)
             raise CloudletException(msg)
+        return ElijahCloudletDiscovery._build_cloudlet_list(cloudlets)
+
+    @staticmethod
+    def _directory_query(app_info, n_ret_cloudlet=3, client_info=None):
+        """ path and query string of the directory query
+
+        :return: path after the address of the directory server
+        :rtype: str
+        """
+        latitude = getattr(client_info, 'GPS_latitude', None) or \
+            getattr(app_info, 'GPS_latitude', None)
+        longitude = getattr(client_info, 'GPS_longitude', None) or \
+            getattr(app_info, 'GPS_longitude', None)
+        client_ip = getattr(client_info, 'client_ip', None) or \
+            getattr(app_info, 'client_ip', None)
+        if latitude and longitude: # search by given GPS coordinate
+            return "%s?n=%d&latitude=%s&longitude=%s" % \
+                    (ElijahCloudletDiscovery._REST_API_URL, n_ret_cloudlet, \
+                    latitude, longitude)
+        elif client_ip: # search by specified IP address
+            return "%s?n=%d&client_ip=%s" % \
+                    (ElijahCloudletDiscovery._REST_API_URL, n_ret_cloudlet, \
+                    str(client_ip))
+        # search by device's IP address
+        return "%s?n=%d" % (ElijahCloudletDiscovery._REST_API_URL, n_ret_cloudlet)
+
+    @staticmethod
+    def _build_cloudlet_list(cloudlets):
+        """ Create :class:`Cloudlet` objects from cloudlet records
+
+        :param cloudlets: records having ip_address, rest_api_port, and rest_api_url
+        :type cloudlets: list of dict
+        :return: cloudlet list
+        :rtype: list of :class:`Cloudlet` object
+        """
         cloudlet_list = []
         for cloudlet in cloudlets:
             ipaddr = cloudlet.get('ip_address', None)
@@ -266,16 +755,47 @@ class ElijahCloudletDiscovery(DiscoveryService):
         return cloudlet_list
 
     @staticmethod
-    def _get_cloudlet_details(cloudlet_list, app_info):
-        """ Get details information of each cloudlet and update :class:`Cloudlet` object
+    def _get_cloudlet_details(cloudlet_list, app_info, health_registry=None,
+                              latency_registry=None, response_cache=None,
+                              history_registry=None, throughput_registry=None,
+                              single_flight=None, flight_timeout=None,
+                              selection_cache=None):
+        """ Get details information of each cloudlet and update :class:`Cloudlet` object.
+        Cloudlets failed to answer have the error at query_error attribute.
 
         :param cloudlet_list : list of promising cloudlet
         :type cloudlet_list: list of :class:`Cloudlet` object
+        :param health_registry: skip known-bad cloudlets and record results
+        :type health_registry: :class:`HealthRegistry`
+        :param latency_registry: latency of cloudlets deciding timeouts
+        :type latency_registry: :class:`LatencyRegistry`
+        :param response_cache: parsed responses for conditional requests
+        :type response_cache: :class:`ConditionalCache`
+        :param history_registry: record resource samples of cloudlets
+        :type history_registry: :class:`HistoryRegistry`
+        :param throughput_registry: record throughput to cloudlets
+        :type throughput_registry: :class:`ThroughputRegistry`
+        :param single_flight: share the query of each cloudlet with\
+            concurrent identical ones
+        :type single_flight: :class:`SingleFlight`
+        :param flight_timeout: seconds to wait for an identical query in\
+            flight. None to wait until it ends.
+        :type flight_timeout: float
+        :param selection_cache: observe the detail record of each cloudlet
+        :type selection_cache: :class:`SelectionCache`
         :return: None
         """
         thread_list = list()
         for cloudlet in cloudlet_list:
-            new_thread = CloudletQueryingThread(cloudlet, app_info)
+            new_thread = CloudletQueryingThread(cloudlet, app_info,
+                                                health_registry,
+                                                latency_registry,
+                                                response_cache,
+                                                history_registry,
+                                                throughput_registry,
+                                                single_flight,
+                                                flight_timeout,
+                                                selection_cache)
             thread_list.append(new_thread)
         for th in thread_list:
             th.start()
@@ -284,23 +804,27 @@ class ElijahCloudletDiscovery(DiscoveryService):
 
 
     @staticmethod
-    def _http_get(end_point):
-        """ Send REST query using HTTP GET method
+    def _http_get(end_point, latency_tracker=None, response_cache=None):
+        """ Send REST query using conditional HTTP GET method
         :param end_point: end point URL
         :type end_point: string
-        :return: HTTP GET result
-        :rtype: string
+        :param latency_tracker: latency distribution of the end point
+        :type latency_tracker: :class:`LatencyTracker`
+        :param response_cache: parsed responses for conditional requests
+        :type response_cache: :class:`ConditionalCache`
+        :return: parsed HTTP GET result
+        :rtype: dict
         """
-        _LOG.info("Connecting to %s" % (end_point.geturl()))
+        import urllib
+        import socket
+        _LOG.info("Connecting to %s", end_point.geturl())
         params = urllib.urlencode({})
         headers = {"Content-type":"application/json"}
-        end_string = "%s?%s" % (end_point[2], end_point[4])
         try:
-            with closing(httplib.HTTPConnection(end_point[1])) as conn:
-                conn = httplib.HTTPConnection(end_point[1])
-                conn.request("GET", end_string, params, headers)
-                data = conn.getresponse().read()
-                return data
+            parsed, digest = _json_request(end_point, "GET", params, headers,
+                                           latency_tracker, response_cache,
+                                           end_point.geturl())
+            return parsed
         except socket.error as e:
             msg = "Failed to connect to %s" % str(end_point)
             raise CloudletException(msg)
@@ -382,28 +906,52 @@ class Cloudlet(object):
 
     def __init__(self, REST_endpoint, auth_token=None, **kwargs):
         self.REST_endpoint = REST_endpoint
+        self.query_error = None
+        self.failed_cloudlets = list()
+        self.detail_digests = dict()
+        self.history = None
+        self.throughput = None
         meta_info = {}
         for k, v in kwargs.iteritems():
             meta_info[k] = v
         setattr(self, 'meta_info', meta_info)
 
-    def get_info(self, app_info):
+    def get_info(self, app_info, latency_tracker=None, response_cache=None):
         """ Query cloudlet using application information
 
         :param app_info: application information
         :type app_info: object of :class:`Application`
+        :param latency_tracker: latency distribution of the cloudlet
+        :type latency_tracker: :class:`LatencyTracker`
+        :param response_cache: parsed responses for conditional requests
+        :type response_cache: :class:`ConditionalCache`
         return: None
         """
-        _LOG.info("Connecting to cloudlet at %s" % self.REST_endpoint)
+        json_data, digest = self._fetch_info(app_info, latency_tracker,
+                                             response_cache)
+        self._set_info(app_info, json_data, digest)
+
+    def _fetch_info(self, app_info, latency_tracker=None, response_cache=None):
+        """ send the query of :meth:`get_info`
+        :return: parsed detail record and its digest
+        """
+        _LOG.info("Connecting to cloudlet at %s", self.REST_endpoint)
         end_point = urlparse(self.REST_endpoint)
         params = json.dumps({'application': app_info.__dict__})
-        headers = {"Content-type": "application/json"}
-        with closing(httplib.HTTPConnection(end_point.hostname, end_point.port, timeout=10)) as conn:
-            _LOG.debug("Query parameter:\n%s" % str(pprint.pformat(json.loads(params))))
-            conn.request("GET", "%s" % end_point[2], params, headers)
-            data = conn.getresponse().read()
-            json_data = json.loads(data)
-            setattr(self, app_info.get_appid(), json_data)
+        headers = {"Content-type": "application/json",
+                   "Accept": wire.ACCEPT}
+        if _LOG.isEnabledFor(logging.DEBUG):
+            import pprint
+            _LOG.debug("Query parameter:\n%s", pprint.pformat(json.loads(params)))
+        json_data, digest = _json_request(end_point, "GET", params, headers,
+                                          latency_tracker, response_cache,
+                                          (self.REST_endpoint, params),
+                                          self.throughput)
+        return json_data, digest
+
+    def _set_info(self, app_info, json_data, digest):
+        setattr(self, app_info.get_appid(), json_data)
+        self.detail_digests[app_info.get_appid()] = digest
 
     def associate(self):
         """ Connect and associate with a cloudlet
@@ -422,6 +970,51 @@ class Cloudlet(object):
         """
         pass
 
+    def associate_async(self, executor=None):
+        """ Run :meth:`associate` in the background
+
+        :param executor: executor running the job. Default is the one\
+            shared by the process.
+        :type executor: :class:`JobExecutor`
+        :rtype: :class:`Job`
+        """
+        def associate(job):
+            return self.associate()
+        return _submit_job(associate, executor)
+
+    def disassociate_async(self, executor=None):
+        """ Run :meth:`disassociate` in the background
+
+        :rtype: :class:`Job`
+        """
+        def disassociate(job):
+            return self.disassociate()
+        return _submit_job(disassociate, executor)
+
+    def provision_async(self, overlay_URL, overlay_account=None, overlay_key=None,
+                        start_VM=False, assign_IP=True, executor=None, **kwargs):
+        """ Run :meth:`provision` in the background. The job reports the\
+        progress of the download and of each step, and its result is the\
+        provisioned :class:`VM`.
+
+        :param executor: executor running the job. Default is the one\
+            shared by the process.
+        :type executor: :class:`JobExecutor`
+        :param progress: progress(fraction, message) called with the\
+            progress of the job as well
+        :rtype: :class:`Job`
+        """
+        progress = kwargs.pop('progress', None)
+        def provision(job):
+            def report_progress(fraction, message=None):
+                job.set_progress(fraction, message)
+                if progress:
+                    progress(fraction, message)
+            return self.provision(overlay_URL, overlay_account, overlay_key,
+                                  start_VM, assign_IP,
+                                  progress=report_progress, **kwargs)
+        return _submit_job(provision, executor)
+
     def provision(self, overlay_URL, overlay_account=None, overlay_key=None, start_VM=False, assign_IP=True, **kwargs):
         """Provision a VM overlay to Cloudlet
 
@@ -435,35 +1028,294 @@ class Cloudlet(object):
         :type overlay_key: str
         :type start_VM: bool
         :type assign_IP: bool
+        :param overlay_path: path to save the downloaded VM overlay.\
+            Default is a temporary file.
+        :type overlay_path: str
+        :param overlay_root: hex Merkle root of the VM overlay to pin
+        :type overlay_root: str
+        :param overlay_cache: local cache of VM overlays. A cached overlay\
+            is revalidated with its manifest instead of being downloaded.
+        :type overlay_cache: :class:`OverlayCache`
+        :param progress: progress(fraction, message) called as the\
+            provisioning proceeds
+        :param upload_timeout: seconds to wait for the cloudlet during the\
+            upload, which includes starting the VM and assigning its IP\
+            address. Default is 300.
+        :type upload_timeout: float
         :return: a provisioned VM information
         :rtype: :class:`VM`
 
         :raises: :class:`ProvisioningException` when provisioning fails.
+
+        The VM overlay is downloaded with its Merkle tree manifest and each
+        chunk is verified on a worker pool as it arrives; only corrupted
+        chunks are fetched again. The verified overlay is then uploaded to
+        the cloudlet with its Merkle root. The upload asks the cloudlet to
+        start the VM and assign its IP address as well, so these steps take
+        no further round trip when the cloudlet supports them.
         """
-        pass
+        import httplib
+        import socket
+        import tempfile
+        from . import transfer
+        overlay_cache = kwargs.get('overlay_cache', None)
+        if overlay_cache is not None:
+            return self._provision_cached(overlay_URL, overlay_account,
+                                          overlay_key, start_VM, assign_IP,
+                                          **kwargs)
+        overlay_path = kwargs.get('overlay_path', None)
+        if overlay_path is None:
+            fd, overlay_path = tempfile.mkstemp(suffix=".overlay")
+            os.close(fd)
+        progress = kwargs.get('progress', None)
+        overlay_transfer = transfer.OverlayTransfer(
+            overlay_URL, overlay_path, overlay_account, overlay_key,
+            expected_root=kwargs.get('overlay_root', None),
+            n_workers=kwargs.get('n_workers', 4),
+            progress=self._download_progress(progress))
+        try:
+            tree = overlay_transfer.run()
+        except (transfer.TransferError, socket.error, httplib.HTTPException,
+                IOError, OSError) as e:
+            msg = "Cannot download VM overlay %s: %s" % (overlay_URL, str(e))
+            raise ProvisioningException(msg)
+        _LOG.info("Verified VM overlay %s (%d chunks)", overlay_URL, len(tree))
+
+        if progress:
+            progress(self._DOWNLOAD_FRACTION, "uploading")
+        vm = self._upload_overlay(overlay_path, tree.hex_root(),
+                                  start_VM=start_VM, assign_IP=assign_IP,
+                                  timeout=kwargs.get('upload_timeout',
+                                                     _UPLOAD_TIMEOUT))
+        return self._start_provisioned(vm, start_VM, assign_IP, progress)
+
+    # fraction of the provisioning progress taken by the overlay download
+    _DOWNLOAD_FRACTION = 0.8
+
+    @classmethod
+    def _download_progress(cls, progress):
+        """ map the verified bytes of the download to provisioning progress
+        """
+        if progress is None:
+            return None
+        def download_progress(bytes_verified, size):
+            if size:
+                progress(cls._DOWNLOAD_FRACTION * bytes_verified / size,
+                         "downloading")
+        return download_progress
+
+    @staticmethod
+    def _start_provisioned(vm, start_VM, assign_IP, progress=None):
+        """ run the steps that the cloudlet did not run after the upload
+        """
+        if start_VM and vm.state != const.OverlayConst.VM_STATE_RUNNING:
+            if progress:
+                progress(0.9, "resuming")
+            vm.resume()
+        if assign_IP and not vm.ip_address:
+            if progress:
+                progress(0.95, "assigning IP")
+            vm.assign_IP()
+        if progress:
+            progress(1.0, "provisioned")
+        return vm
+
+    def _provision_cached(self, overlay_URL, overlay_account, overlay_key,
+                          start_VM, assign_IP, **kwargs):
+        """ provision a VM overlay through the overlay cache, uploading
+        the cached overlay from its memory map. The overlay is pinned in
+        the cache until it is uploaded.
+        """
+        import httplib
+        import socket
+        from . import transfer
+        overlay_cache = kwargs['overlay_cache']
+        progress = kwargs.get('progress', None)
+        try:
+            overlay_path, overlay_root = overlay_cache.acquire(
+                overlay_URL, overlay_account, overlay_key,
+                expected_root=kwargs.get('overlay_root', None),
+                n_workers=kwargs.get('n_workers', 4),
+                progress=self._download_progress(progress))
+        except (transfer.TransferError, socket.error, httplib.HTTPException,
+                IOError, OSError, KeyError, ValueError) as e:
+            msg = "Cannot get VM overlay %s: %s" % (overlay_URL, str(e))
+            raise ProvisioningException(msg)
+
+        try:
+            try:
+                overlay_data = overlay_cache.open(overlay_root)
+            except (IOError, OSError, ValueError) as e:
+                msg = "Cannot read cached VM overlay %s: %s" % (overlay_URL, str(e))
+                raise ProvisioningException(msg)
+            if progress:
+                progress(self._DOWNLOAD_FRACTION, "uploading")
+            with closing(overlay_data):
+                vm = self._upload_overlay(overlay_path, overlay_root, overlay_data,
+                                          start_VM=start_VM, assign_IP=assign_IP,
+                                          timeout=kwargs.get('upload_timeout',
+                                                             _UPLOAD_TIMEOUT))
+        finally:
+            overlay_cache.release(overlay_root)
+        return self._start_provisioned(vm, start_VM, assign_IP, progress)
+
+    def _upload_overlay(self, overlay_path, overlay_root, overlay_data=None,
+                        start_VM=False, assign_IP=False, timeout=_UPLOAD_TIMEOUT):
+        """ send the verified VM overlay to the cloudlet
+        :param overlay_data: file-like object of the overlay, e.g. a memory\
+            map. Default is to read *overlay_path*.
+        :param start_VM: ask the cloudlet to start the VM after the upload
+        :param assign_IP: ask the cloudlet to assign an IP address to the VM
+        :param timeout: seconds to wait for the cloudlet once connected
+        :return: VM created from the overlay
+        :rtype: :class:`VM`
+        """
+        import httplib
+        import socket
+        end_point = urlparse(self.REST_endpoint)
+        headers = {const.OverlayConst.HEADER_OVERLAY_ROOT: overlay_root}
+        if start_VM:
+            headers[const.OverlayConst.HEADER_START_VM] = "1"
+        if assign_IP:
+            headers[const.OverlayConst.HEADER_ASSIGN_IP] = "1"
+        conn = httplib.HTTPConnection(end_point.hostname, end_point.port,
+                                      timeout=_DEFAULT_TIMEOUT)
+        try:
+            with closing(conn):
+                conn.connect()
+                conn.sock.settimeout(timeout)
+                if overlay_data is None:
+                    with open(overlay_path, "rb") as overlay_file:
+                        response, data, size, elapsed = self._post_overlay(
+                            conn, end_point, overlay_file, headers)
+                else:
+                    response, data, size, elapsed = self._post_overlay(
+                        conn, end_point, overlay_data, headers)
+                if self.throughput:
+                    self.throughput.record(size, elapsed)
+        except (socket.error, httplib.HTTPException, IOError) as e:
+            msg = "Cannot upload VM overlay to %s: %s" % (self.REST_endpoint, str(e))
+            raise ProvisioningException(msg)
+        if response.status != httplib.OK:
+            msg = "Cloudlet %s rejected VM overlay: %d %s" % \
+                (self.REST_endpoint, response.status, response.reason)
+            raise ProvisioningException(msg)
+        try:
+            vm_info = json.loads(data)
+            vm_uuid = vm_info[const.OverlayConst.KEY_VM_UUID]
+        except (ValueError, KeyError, TypeError):
+            msg = "Invalid provisioning response from %s" % self.REST_endpoint
+            raise ProvisioningException(msg)
+        return VM(vm_uuid, cloudlet=self, overlay_path=overlay_path,
+                  state=vm_info.get(const.OverlayConst.KEY_VM_STATE, None),
+                  ip_address=vm_info.get(const.OverlayConst.KEY_IP_ADDRESS, None))
+
+    @staticmethod
+    def _post_overlay(conn, end_point, overlay_data, headers):
+        """ POST the overlay read from a file-like object
+        :return: response, its body, overlay size, and elapsed seconds
+        """
+        overlay_data.seek(0, os.SEEK_END)
+        size = overlay_data.tell()
+        overlay_data.seek(0)
+        headers = dict(headers)
+        headers.update({"Content-type": "application/octet-stream",
+                        "Content-Length": str(size)})
+        time_start = time.time()
+        conn.request("POST", end_point.path or "/", overlay_data, headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response, data, size, time.time() - time_start
 
     def __repr__(self):
         return self.__str__()
 
     def __str__(self):
+        import pprint
         attrs = pprint.pformat(self.__dict__)
         return attrs
 
 
 
 class CloudletQueryingThread(threading.Thread):
-    """ Thread wrapper to connect multiple cloudlets in parallel
+    """ Thread wrapper to connect multiple cloudlets in parallel.
+    Threads querying the same cloudlet with the same application at the
+    same time share one query through *single_flight*.
     """
 
-    def __init__(self, cloudlet, app_info=None):
+    def __init__(self, cloudlet, app_info=None, health_registry=None,
+                 latency_registry=None, response_cache=None,
+                 history_registry=None, throughput_registry=None,
+                 single_flight=None, flight_timeout=None,
+                 selection_cache=None):
         self.cloudlet = cloudlet
         self.app_info = app_info
+        self.health_registry = health_registry
+        self.latency_registry = latency_registry
+        self.response_cache = response_cache
+        self.history_registry = history_registry
+        self.throughput_registry = throughput_registry
+        self.single_flight = single_flight
+        self.flight_timeout = flight_timeout
+        self.selection_cache = selection_cache
         threading.Thread.__init__(self, target=self.run)
 
     def run(self):
         """ thread main method
         """
-        self.cloudlet.get_info(self.app_info)
+        endpoint = self.cloudlet.REST_endpoint
+        self.cloudlet.query_error = None
+        if self.throughput_registry:
+            self.cloudlet.throughput = self.throughput_registry.get(endpoint)
+        try:
+            if self.single_flight:
+                key = ("cloudlet", endpoint,
+                       json.dumps(self.app_info.__dict__, sort_keys=True))
+                json_data, digest, history = self.single_flight.do(
+                    key, self._query, self.flight_timeout)
+            else:
+                json_data, digest, history = self._query()
+        except Exception as e:
+            self.cloudlet.query_error = e
+            return
+        self.cloudlet._set_info(self.app_info, json_data, digest)
+        if history is not None:
+            self.cloudlet.history = history
+        if self.selection_cache:
+            self.selection_cache.observe(self.cloudlet, self.app_info.get_appid())
+
+    def _query(self):
+        """ query the cloudlet and record its health and resource samples
+        once for every thread sharing the query
+        :return: parsed detail record, its digest, and resource history
+        """
+        endpoint = self.cloudlet.REST_endpoint
+        if self.health_registry:
+            health = self.health_registry.get(endpoint)
+            if not health.allow_request():
+                msg = "Circuit breaker is open for %s (retry after %.1f s)" % \
+                    (endpoint, health.retry_after())
+                raise CloudletUnavailableException(msg)
+        latency_tracker = None
+        if self.latency_registry:
+            latency_tracker = self.latency_registry.get(endpoint)
+        try:
+            json_data, digest = self.cloudlet._fetch_info(self.app_info,
+                                                          latency_tracker,
+                                                          self.response_cache)
+        except Exception as e:
+            _LOG.warning("Failed to query cloudlet at %s: %s", endpoint, e)
+            if self.health_registry:
+                self.health_registry.record_failure(endpoint, e)
+            raise
+        if self.health_registry:
+            self.health_registry.record_success(endpoint)
+        history = None
+        if self.history_registry:
+            history = self.history_registry.get(endpoint)
+            if json_data:
+                history.record(json_data)
+        return json_data, digest, history
 
 
 
@@ -472,10 +1324,23 @@ class VM(object):
 
     :param UUID: an UUID of the virtual machine instance assigned by cloudlet
     :type UUID: str
+    :param disk_image: path of the disk image of the VM
+    :type disk_image: str
+    :param cloudlet: cloudlet running the VM
+    :type cloudlet: :class:`Cloudlet`
+    :param state: state of the VM reported by the cloudlet
+    :type state: str
+    :param ip_address: IP address assigned to the VM
+    :type ip_address: str
     """
 
     def __init__(self, UUID, **kwargs):
-        pass
+        self.UUID = UUID
+        self.disk_image = kwargs.get('disk_image', None)
+        self.cloudlet = kwargs.get('cloudlet', None)
+        self.overlay_path = kwargs.get('overlay_path', None)
+        self.state = kwargs.get('state', None)
+        self.ip_address = kwargs.get('ip_address', None)
 
     def handoff (dest_cloudlet, **kwargs):
         """Migrate this VM instance from the current cloudlet to the destination
@@ -491,18 +1356,60 @@ class VM(object):
         """
         pass
 
-    def create_base_VM(base_VM_name, **kwargs):
+    def create_base_VM(self, base_VM_name, **kwargs):
         """Create a base VM image of the VM. The VM will be shutdown
         after this operation.
 
+        The disk image is copied without its holes into a temporary file
+        renamed to the base VM image, and a block hash index of the copy is
+        saved next to it at *<image>.hashindex*.
+
         :param base_VM_name: a new name for the base VM
         :type base_VM_name: str
-        :return: UUID of created base VM image
+        :param base_VM_dir: directory of the base VM image.\
+            Default is the directory of the disk image.
+        :type base_VM_dir: str
+        :return: identifier of created base VM image, the SHA-256 of its\
+            block hash index
         :rtype: str
 
-        :raises: :class:`CreateBaseVMException` when fails.
+        :raises: :class:`CreateBaseVMException` when fails, or when the\
+            base VM image would replace the disk image.
         """
-        pass
+        import tempfile
+        from . import imaging
+        if not self.disk_image or not os.path.exists(self.disk_image):
+            msg = "Disk image of VM %s does not exist: %s" % \
+                (self.UUID, self.disk_image)
+            raise CreateBaseVMException(msg)
+        base_VM_dir = kwargs.get('base_VM_dir', None) or \
+            os.path.dirname(os.path.abspath(self.disk_image))
+        base_disk_path = os.path.join(base_VM_dir, base_VM_name)
+        if os.path.realpath(base_disk_path) == os.path.realpath(self.disk_image) or \
+                (os.path.exists(base_disk_path) and
+                 os.path.samefile(base_disk_path, self.disk_image)):
+            msg = "Base VM %s would replace the disk image %s" % \
+                (base_disk_path, self.disk_image)
+            raise CreateBaseVMException(msg)
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".%s-" % base_VM_name,
+                                             dir=base_VM_dir)
+            os.close(fd)
+            hash_index, stats = imaging.sparse_copy(self.disk_image, temp_path)
+            os.rename(temp_path, base_disk_path)
+            temp_path = None
+            hash_index.save(base_disk_path + ".hashindex")
+        except (OSError, IOError, imaging.ImagingError) as e:
+            msg = "Cannot create base VM %s: %s" % (base_VM_name, str(e))
+            raise CreateBaseVMException(msg)
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.unlink(temp_path)
+        _LOG.info("Created base VM %s (%d/%d bytes of data, %s)",
+                  base_disk_path, stats["data_size"], stats["logical_size"],
+                  stats["method"])
+        return hash_index.hex_digest()
 
     def create_VM_overlay(VM_overlay_name, **kwargs):
         """create VM overlay of the running VM
@@ -532,3 +1439,21 @@ class VM(object):
         """
         pass
 
+    def resume_async(self, executor=None, **kwargs):
+        """ Run :meth:`resume` in the background
+
+        :rtype: :class:`Job`
+        """
+        def resume(job):
+            return self.resume(**kwargs)
+        return _submit_job(resume, executor)
+
+    def assign_IP_async(self, executor=None, **kwargs):
+        """ Run :meth:`assign_IP` in the background
+
+        :rtype: :class:`Job`
+        """
+        def assign_IP(job):
+            return self.assign_IP(**kwargs)
+        return _submit_job(assign_IP, executor)
+
@@ -25,6 +25,9 @@ class AppInfoConst(object):
     REQUIRED_CACHE_FILES     = "required-files"
     REQUIRED_CACHE_URLS      = "required-URLs"
     REQUIRED_MIN_CPU_CLOCK   = "required-cpu-clocks"
+    REQUIRED_CPU_NUMBER      = "required-cpu-num"
+    REQUIRED_MEM_MB          = "required-mem-mb"
+    OVERLAY_SIZE             = "overlay-size-bytes"
 
     WEIGHT_RTT      = "weight-RTT"
     WEIGHT_CACHE    = "weight-cache"
@@ -58,6 +61,59 @@ class ResourceInfoConst(object):
     APP_CACHE_TOTAL_SCORE           =   "app_cache_total_score"
 
 
+class HTTPConst(object):
+    # validators of a response
+    HEADER_ETAG             = "ETag"
+    HEADER_IF_NONE_MATCH    = "If-None-Match"
+    HEADER_VERSION          = "X-Cloudlet-Version"
+    HEADER_IF_VERSION       = "X-Cloudlet-If-Version"
+
+    # version of the cached response that a delta response is based on
+    HEADER_DELTA_BASE       = "X-Cloudlet-Delta-Base"
+    DELTA_ADDED             = "added"
+    DELTA_REMOVED           = "removed"
+
+
+class LANDiscoveryConst(object):
+    MULTICAST_GROUP     = "239.255.80.80"
+    MULTICAST_PORT      = 8022
+    MULTICAST_TTL       = 1
+    MAX_MESSAGE_SIZE    = 8192
+
+    # message format
+    KEY_MESSAGE_TYPE    = "type"
+    KEY_NONCE           = "nonce"
+    KEY_CLOUDLET        = "cloudlet"
+    TYPE_QUERY          = "query"
+    TYPE_RESPONSE       = "response"
+    TYPE_ANNOUNCE       = "announce"
+
+    # cloudlet record, identical to the one returned by the directory server
+    KEY_IP_ADDRESS      = "ip_address"
+    KEY_REST_API_PORT   = "rest_api_port"
+    KEY_REST_API_URL    = "rest_api_url"
+
+
+class OverlayConst(object):
+    # Merkle tree manifest published next to a VM overlay
+    MANIFEST_SUFFIX     = ".merkle"
+    KEY_CHUNK_SIZE      = "chunk_size"
+    KEY_SIZE            = "size"
+    KEY_ROOT            = "root"
+    KEY_HASHES          = "hashes"
+
+    # overlay upload to a cloudlet
+    HEADER_OVERLAY_ROOT = "X-Cloudlet-Overlay-Root"
+    KEY_VM_UUID         = "vm-uuid"
+
+    # steps the cloudlet runs right after the upload, without a round trip
+    HEADER_START_VM     = "X-Cloudlet-Start-VM"
+    HEADER_ASSIGN_IP    = "X-Cloudlet-Assign-IP"
+    KEY_VM_STATE        = "vm-state"
+    KEY_IP_ADDRESS      = "ip-address"
+    VM_STATE_RUNNING    = "running"
+
+
 class Util(object):
     @staticmethod
     def get_ip(iface = 'eth0'):
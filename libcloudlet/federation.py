@@ -0,0 +1,182 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module queries a federation of directory servers.
+
+The directory is split into shards, e.g. by region, and each shard is
+served by one or more replicas. Every shard is queried concurrently. In a
+shard, the primary replica is queried first and the next replica is
+queried as well when the primary fails, or does not answer within the
+hedge delay. The first answer of each shard is taken, and the candidate
+lists of all shards are merged without duplicated cloudlet endpoints.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import logging
+import threading
+import Queue
+
+
+_LOG = logging.getLogger("discovery")
+
+
+class DirectoryFederation(object):
+    """ Sharded and replicated directory servers
+
+    :param shards: replicas of each shard, primary first
+    :type shards: list of list of str
+    :param hedge_delay: seconds to wait for a replica before querying the\
+        next one. Default is the p95 latency of the replica, or\
+        *default_hedge_delay* until enough samples are observed.
+    :type hedge_delay: float
+    """
+
+    def __init__(self, shards, hedge_delay=None, default_hedge_delay=0.1):
+        self.shards = [[self._normalize(server) for server in replicas]
+                       for replicas in shards if replicas]
+        if not self.shards:
+            raise ValueError("Need at least one directory server")
+        self.hedge_delay = hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+
+    @staticmethod
+    def _normalize(server):
+        if server.endswith('/'):
+            return server[:-1]
+        return server
+
+    @classmethod
+    def from_servers(cls, servers, **kwargs):
+        """ Build a federation from a list of replicated servers, or from a
+        list of shards each having a list of replicas
+        """
+        if isinstance(servers, cls):
+            return servers
+        if all(isinstance(server, (list, tuple)) for server in servers):
+            return cls(servers, **kwargs)
+        return cls([servers], **kwargs)
+
+    def __str__(self):
+        return ", ".join(["[%s]" % ", ".join(replicas) for replicas in self.shards])
+
+    def endpoints(self):
+        return [server for replicas in self.shards for server in replicas]
+
+    def _replica_delay(self, server, latency_registry):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if latency_registry is not None:
+            p95 = latency_registry.get(server).p95()
+            if p95 is not None:
+                return p95
+        return self.default_hedge_delay
+
+    def query_shard(self, replicas, list_func, latency_registry=None):
+        """ Query the replicas of a shard with hedging
+
+        :param list_func: list_func(server) returning the candidate list
+        :return: candidate list of the first replica answering
+        :raises: exception of the last replica when every replica fails
+        """
+        result_queue = Queue.Queue()
+        def run_query(server):
+            try:
+                result_queue.put((server, list_func(server), None))
+            except Exception as e:
+                result_queue.put((server, None, e))
+        def start_next(index):
+            query_thread = threading.Thread(target=run_query, args=(replicas[index],))
+            query_thread.daemon = True
+            query_thread.start()
+            return index + 1
+
+        n_started = start_next(0)
+        n_pending = 1
+        last_error = None
+        while n_pending:
+            delay = None
+            if n_started < len(replicas):
+                delay = self._replica_delay(replicas[n_started-1], latency_registry)
+            try:
+                server, cloudlet_list, error = result_queue.get(timeout=delay) \
+                    if delay is not None else result_queue.get()
+            except Queue.Empty:
+                _LOG.info("Hedge directory query to %s", replicas[n_started])
+                n_started = start_next(n_started)
+                n_pending += 1
+                continue
+            n_pending -= 1
+            if error is None:
+                return cloudlet_list
+            _LOG.info("Directory server %s failed: %s", server, error)
+            last_error = error
+            if n_started < len(replicas):
+                n_started = start_next(n_started)
+                n_pending += 1
+        raise last_error
+
+    def query(self, list_func, latency_registry=None):
+        """ Query every shard concurrently and merge the candidates
+
+        :param list_func: list_func(server) returning the candidate list
+        :param latency_registry: latency of directory servers deciding the\
+            hedge delay
+        :type latency_registry: :class:`LatencyRegistry`
+        :return: cloudlet list without duplicated endpoints
+        :rtype: list of :class:`Cloudlet` object
+        :raises: exception of a shard when every shard fails
+        """
+        if len(self.shards) == 1:
+            return self.merge([self.query_shard(self.shards[0], list_func,
+                                                latency_registry)])
+        results = [None] * len(self.shards)
+        errors = [None] * len(self.shards)
+        def run_shard(index):
+            try:
+                results[index] = self.query_shard(self.shards[index], list_func,
+                                                  latency_registry)
+            except Exception as e:
+                errors[index] = e
+        thread_list = [threading.Thread(target=run_shard, args=(index,))
+                       for index in range(len(self.shards))]
+        for th in thread_list:
+            th.start()
+        for th in thread_list:
+            th.join()
+        for replicas, error in zip(self.shards, errors):
+            if error is not None:
+                _LOG.warning("Directory shard %s failed: %s", replicas[0], error)
+        if all(result is None for result in results):
+            raise errors[0]
+        return self.merge([result for result in results if result is not None])
+
+    @staticmethod
+    def merge(cloudlet_lists):
+        """ merge candidate lists keeping the first cloudlet of each endpoint
+        """
+        merged = list()
+        seen = set()
+        for cloudlet_list in cloudlet_lists:
+            for cloudlet in cloudlet_list:
+                if cloudlet.REST_endpoint in seen:
+                    continue
+                seen.add(cloudlet.REST_endpoint)
+                merged.append(cloudlet)
+        return merged
@@ -0,0 +1,152 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module tracks health of cloudlet endpoints using circuit breakers.
+
+A breaker opens after consecutive failures and stays open for an
+exponentially growing backoff period. After the period, a single probe
+request is allowed (half-open). The breaker closes again when the probe
+succeeds and reopens with a longer backoff when it fails.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import time
+import threading
+
+
+class EndpointHealth(object):
+    """ Health state of a single endpoint
+
+    :param endpoint: REST endpoint of the cloudlet
+    :type endpoint: str
+    :param failure_threshold: consecutive failures to open the breaker
+    :type failure_threshold: int
+    :param base_backoff: seconds to keep the breaker open at first
+    :type base_backoff: float
+    :param max_backoff: upper bound of the backoff in seconds
+    :type max_backoff: float
+    """
+
+    STATE_CLOSED    = "closed"
+    STATE_OPEN      = "open"
+    STATE_HALF_OPEN = "half-open"
+
+    def __init__(self, endpoint, failure_threshold=3, base_backoff=1.0,
+                 max_backoff=300.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.STATE_CLOSED
+        self.success_count = 0
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.open_until = 0.0
+        self.last_error = None
+        self.lock = threading.Lock()
+
+    def allow_request(self, now=None):
+        """ Check whether a request to the endpoint can be sent now.
+        Only one probing request is allowed while half-open.
+
+        :return: True if the request can be sent
+        :rtype: bool
+        """
+        now = now or time.time()
+        with self.lock:
+            if self.state == self.STATE_CLOSED:
+                return True
+            if self.state == self.STATE_OPEN and now >= self.open_until:
+                self.state = self.STATE_HALF_OPEN
+                return True
+            return False
+
+    def retry_after(self, now=None):
+        """ seconds until the next request is allowed
+        """
+        now = now or time.time()
+        with self.lock:
+            if self.state != self.STATE_OPEN:
+                return 0.0
+            return max(0.0, self.open_until - now)
+
+    def record_success(self):
+        with self.lock:
+            self.success_count += 1
+            self.consecutive_failures = 0
+            self.open_count = 0
+            self.state = self.STATE_CLOSED
+
+    def record_failure(self, error=None, now=None):
+        now = now or time.time()
+        with self.lock:
+            self.failure_count += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.state == self.STATE_HALF_OPEN or \
+                    self.consecutive_failures >= self.failure_threshold:
+                backoff = min(self.max_backoff,
+                              self.base_backoff * (2 ** self.open_count))
+                self.open_count += 1
+                self.open_until = now + backoff
+                self.state = self.STATE_OPEN
+
+    def __repr__(self):
+        return "<EndpointHealth %s %s success=%d failure=%d>" % \
+            (self.endpoint, self.state, self.success_count, self.failure_count)
+
+
+class HealthRegistry(object):
+    """ Thread-safe map of endpoint to :class:`EndpointHealth`
+
+    Keyword arguments are passed to each :class:`EndpointHealth`.
+    """
+
+    def __init__(self, **kwargs):
+        self.health_kwargs = kwargs
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self.lock:
+            health = self.endpoints.get(endpoint, None)
+            if health is None:
+                health = EndpointHealth(endpoint, **self.health_kwargs)
+                self.endpoints[endpoint] = health
+            return health
+
+    def allow_request(self, endpoint):
+        return self.get(endpoint).allow_request()
+
+    def record_success(self, endpoint):
+        self.get(endpoint).record_success()
+
+    def record_failure(self, endpoint, error=None):
+        self.get(endpoint).record_failure(error)
+
+    def reset(self, endpoint=None):
+        """ forget the health state of the endpoint, or of every endpoint
+        """
+        with self.lock:
+            if endpoint is None:
+                self.endpoints.clear()
+            else:
+                self.endpoints.pop(endpoint, None)
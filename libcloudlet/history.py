@@ -0,0 +1,218 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module keeps recent samples of dynamic cloudlet resources.
+
+Samples are stored in fixed-size ring buffers backed by typed arrays.
+Window statistics use numpy over the arrays without copying when numpy is
+installed, and fall back to pure Python otherwise. numpy is imported at the
+first window statistic rather than with this module.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import time
+import threading
+from array import array
+from .const import ResourceInfoConst
+
+_numpy_module = None
+_numpy_checked = False
+
+
+def _numpy():
+    """ import numpy once, None if it is not installed
+    """
+    global _numpy_module, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = None
+        _numpy_checked = True
+    return _numpy_module
+
+
+class RingBuffer(object):
+    """ Fixed-size buffer of timestamped samples
+
+    :param capacity: maximum number of samples
+    :type capacity: int
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.values = array('d', [0.0]) * capacity
+        self.times = array('d', [0.0]) * capacity
+        self.next_index = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value, timestamp=None):
+        self.values[self.next_index] = value
+        self.times[self.next_index] = timestamp or time.time()
+        self.next_index = (self.next_index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        return self.values[(self.next_index - 1) % self.capacity]
+
+    def window(self, size=None):
+        """
+        :return: values and times of the latest *size* samples, oldest first
+        :rtype: tuple of two sequences
+        """
+        size = min(size or self.count, self.count)
+        numpy = _numpy()
+        start = (self.next_index - size) % self.capacity
+        if numpy is not None:
+            values = numpy.frombuffer(self.values, dtype=numpy.float64)
+            times = numpy.frombuffer(self.times, dtype=numpy.float64)
+            if start + size <= self.capacity:
+                return values[start:start+size], times[start:start+size]
+            indexes = numpy.arange(start, start + size) % self.capacity
+            return values[indexes], times[indexes]
+        if start + size <= self.capacity:
+            return self.values[start:start+size], self.times[start:start+size]
+        return (self.values[start:] + self.values[:start+size-self.capacity],
+                self.times[start:] + self.times[:start+size-self.capacity])
+
+    def ewma(self, alpha=0.3, size=None):
+        """ exponentially weighted moving average, None without any sample
+        """
+        numpy = _numpy()
+        values, _ = self.window(size)
+        if len(values) == 0:
+            return None
+        if numpy is not None:
+            weights = (1 - alpha) ** numpy.arange(len(values) - 1, -1, -1)
+            weights[1:] *= alpha
+            return float(numpy.dot(weights, values))
+        average = values[0]
+        for value in values[1:]:
+            average = alpha * value + (1 - alpha) * average
+        return average
+
+    def trend(self, size=None):
+        """ least-squares slope of the values per second, 0 without enough
+        samples
+        """
+        numpy = _numpy()
+        values, times = self.window(size)
+        n_samples = len(values)
+        if n_samples < 2:
+            return 0.0
+        if numpy is not None:
+            times = times - times.mean()
+            denominator = float(numpy.dot(times, times))
+            if denominator == 0:
+                return 0.0
+            return float(numpy.dot(times, values - values.mean())) / denominator
+        mean_time = sum(times) / n_samples
+        mean_value = sum(values) / n_samples
+        numerator = 0.0
+        denominator = 0.0
+        for t, v in zip(times, values):
+            numerator += (t - mean_time) * (v - mean_value)
+            denominator += (t - mean_time) ** 2
+        if denominator == 0:
+            return 0.0
+        return numerator / denominator
+
+    def percentile(self, percent, size=None):
+        """ percentile of the values with linear interpolation, None without
+        any sample
+        """
+        numpy = _numpy()
+        values, _ = self.window(size)
+        if len(values) == 0:
+            return None
+        if numpy is not None:
+            return float(numpy.percentile(values, percent))
+        values = sorted(values)
+        position = (len(values) - 1) * percent / 100.0
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def predict(self, horizon, alpha=0.3, size=None):
+        """ smoothed value extrapolated by the trend after *horizon* seconds
+        """
+        smoothed = self.ewma(alpha, size)
+        if smoothed is None:
+            return None
+        return smoothed + self.trend(size) * horizon
+
+
+class ResourceHistory(object):
+    """ Recent dynamic resource samples of a cloudlet
+    """
+
+    FIELDS = (ResourceInfoConst.TOTAL_CPU_PERCENT,
+              ResourceInfoConst.TOTAL_MEM_FREE_MB,
+              ResourceInfoConst.RTT_BETWEEN_CLIENT)
+
+    def __init__(self, capacity=64):
+        self.buffers = dict([(field, RingBuffer(capacity))
+                             for field in self.FIELDS])
+        self.lock = threading.Lock()
+
+    def record(self, cloudlet_info, timestamp=None):
+        """ append the dynamic resource values of a cloudlet detail record
+        """
+        timestamp = timestamp or time.time()
+        with self.lock:
+            for field, buf in self.buffers.items():
+                value = cloudlet_info.get(field, None)
+                if value is not None:
+                    buf.append(float(value), timestamp)
+
+    def __getitem__(self, field):
+        return self.buffers[field]
+
+    def smoothed(self, field, alpha=0.3):
+        with self.lock:
+            return self.buffers[field].ewma(alpha)
+
+    def predicted(self, field, horizon, alpha=0.3):
+        with self.lock:
+            return self.buffers[field].predict(horizon, alpha)
+
+
+class HistoryRegistry(object):
+    """ Thread-safe map of endpoint to :class:`ResourceHistory`
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self.lock:
+            history = self.endpoints.get(endpoint, None)
+            if history is None:
+                history = ResourceHistory(self.capacity)
+                self.endpoints[endpoint] = history
+            return history
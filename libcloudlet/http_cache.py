@@ -0,0 +1,154 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module caches parsed responses with their validators for
+conditional requests.
+
+A request carries ``If-None-Match`` with the cached ETag and
+``X-Cloudlet-If-Version`` with the cached version counter. The server
+answers either 304 (Not Modified) to reuse the cached object, a full
+response, or a delta response marked with ``X-Cloudlet-Delta-Base``.
+In a delta, keys are replaced, keys with null value are removed, and the
+per-app cache lists can be given as ``{"added": [...], "removed": [...]}``.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import threading
+from collections import OrderedDict
+from .const import HTTPConst
+from .const import ResourceInfoConst
+
+
+# keys of list values that a delta response can update partially
+DELTA_LIST_KEYS = (ResourceInfoConst.APP_CACHE_FILES,
+                   ResourceInfoConst.APP_CACHE_URLS)
+
+
+class CachedResponse(object):
+    """ A parsed response and its validators
+    """
+
+    def __init__(self, parsed, digest, etag=None, version=None):
+        self.parsed = parsed
+        self.digest = digest
+        self.etag = etag
+        self.version = version
+
+    def validator_headers(self):
+        headers = dict()
+        if self.etag:
+            headers[HTTPConst.HEADER_IF_NONE_MATCH] = self.etag
+        if self.version:
+            headers[HTTPConst.HEADER_IF_VERSION] = self.version
+        return headers
+
+
+class ConditionalCache(object):
+    """ LRU cache of :class:`CachedResponse` keyed by request
+
+    :param max_entries: maximum number of cached responses
+    :type max_entries: int
+    :param snapshot: on-disk snapshot looked up when a key is not in memory
+    :type snapshot: :class:`RegistrySnapshot`
+    """
+
+    def __init__(self, max_entries=1024, snapshot=None):
+        self.max_entries = max_entries
+        self.snapshot = snapshot
+        self.entries = OrderedDict()
+        self.removed = set()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                return entry
+            snapshot = self.snapshot
+            if snapshot is None or key in self.removed:
+                return None
+        entry = snapshot.get_response(key)
+        if entry is not None:
+            with self.lock:
+                if key not in self.entries and key not in self.removed:
+                    self._put(key, entry)
+        return entry
+
+    def _put(self, key, entry):
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        self.removed.discard(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key, entry):
+        with self.lock:
+            self._put(key, entry)
+
+    def remove(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.removed.add(key)
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def removed_keys(self):
+        """ keys removed since the snapshot was written
+        """
+        with self.lock:
+            return list(self.removed)
+
+    def set_snapshot(self, snapshot):
+        """ look up *snapshot* from now on, and forget the removed keys
+        that it does not have
+        """
+        with self.lock:
+            self.snapshot = snapshot
+            for key in list(self.removed):
+                if snapshot is None or snapshot.get_response(key) is None:
+                    self.removed.discard(key)
+
+
+def apply_delta(base, delta):
+    """ Apply a delta response to the cached object without modifying it
+
+    :param base: cached object of the previous version
+    :type base: dict
+    :param delta: delta response
+    :type delta: dict
+    :return: object of the new version
+    :rtype: dict
+    """
+    updated = dict(base)
+    for key, value in delta.items():
+        if value is None:
+            updated.pop(key, None)
+        elif key in DELTA_LIST_KEYS and isinstance(value, dict):
+            removed = set(value.get(HTTPConst.DELTA_REMOVED, list()))
+            items = [item for item in updated.get(key, list())
+                     if item not in removed]
+            items.extend(value.get(HTTPConst.DELTA_ADDED, list()))
+            updated[key] = items
+        else:
+            updated[key] = value
+    return updated
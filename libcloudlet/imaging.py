@@ -0,0 +1,368 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module copies VM disk images without touching their holes.
+
+Allocated regions of the source are found with SEEK_DATA/SEEK_HOLE, so
+copy time depends on the allocated data rather than the logical size.
+The whole image is cloned with a reflink when the filesystem supports it,
+and data regions are copied in the kernel with copy_file_range otherwise.
+A hash index is then built by reading the data regions of the copy. When
+neither is supported, data regions are read once in large aligned buffers
+that are hashed block by block and written from the same buffer, and
+all-zero blocks are not written, which keeps the copy sparse.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import os
+import errno
+import fcntl
+import struct
+import ctypes
+import ctypes.util
+import hashlib
+
+
+# Linux values, missing at the os module before Python 3.3
+SEEK_DATA = getattr(os, "SEEK_DATA", 3)
+SEEK_HOLE = getattr(os, "SEEK_HOLE", 4)
+FICLONE = 0x40049409
+
+BLOCK_SIZE = 4096
+BUFFER_SIZE = 8 * 1024 * 1024
+
+# errors meaning that the filesystem does not support the operation
+_UNSUPPORTED = (errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.EXDEV,
+                errno.ENOSYS, errno.EBADF, errno.EPERM)
+
+
+class ImagingError(Exception):
+    pass
+
+
+def data_extents(fd, size):
+    """ Find allocated regions of a file
+
+    :param fd: file descriptor
+    :param size: size of the file
+    :return: generator of (start, end) offsets of data regions
+    """
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:      # no more data
+                return
+            if e.errno in _UNSUPPORTED:
+                yield offset, size
+                return
+            raise
+        try:
+            end = os.lseek(fd, start, SEEK_HOLE)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            end = size
+        yield start, min(end, size)
+        offset = end
+
+
+class BlockHashIndex(object):
+    """ SHA-1 hash of every non-zero block of a disk image.
+    Blocks not in the index are zero.
+
+    :param block_size: size of a block in bytes
+    :type block_size: int
+    """
+
+    MAGIC = b"CLBH"
+    VERSION = 1
+    _HEADER = struct.Struct(">4sHHIQQ")
+    _ENTRY = struct.Struct(">Q20s")
+
+    def __init__(self, block_size=BLOCK_SIZE, image_size=0):
+        self.block_size = block_size
+        self.image_size = image_size
+        self.hashes = dict()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, block_number, digest):
+        self.hashes[block_number] = digest
+
+    def diff(self, other):
+        """
+        :return: sorted block numbers that differ from the other index
+        :rtype: list of int
+        """
+        if other.block_size != self.block_size:
+            raise ImagingError("Different block size %d != %d" % \
+                               (self.block_size, other.block_size))
+        blocks = set(self.hashes.keys()) | set(other.hashes.keys())
+        return sorted([block for block in blocks
+                       if self.hashes.get(block) != other.hashes.get(block)])
+
+    def _records(self):
+        yield self._HEADER.pack(self.MAGIC, self.VERSION, 0, self.block_size,
+                                self.image_size, len(self.hashes))
+        for block_number in sorted(self.hashes):
+            yield self._ENTRY.pack(block_number, self.hashes[block_number])
+
+    def hex_digest(self):
+        """
+        :return: SHA-256 of the saved index, which identifies the content\
+            of the image
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        for record in self._records():
+            digest.update(record)
+        return digest.hexdigest()
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            for record in self._records():
+                f.write(record)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, _, block_size, image_size, count = \
+            cls._HEADER.unpack_from(data, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ImagingError("Unknown hash index format at %s" % path)
+        index = cls(block_size, image_size)
+        offset = cls._HEADER.size
+        for _ in range(count):
+            block_number, digest = cls._ENTRY.unpack_from(data, offset)
+            index.hashes[block_number] = digest
+            offset += cls._ENTRY.size
+        return index
+
+
+def _reflink(src_fd, dst_fd):
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (IOError, OSError) as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+
+
+_libc = None
+
+
+def _libc_copy_file_range():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    func = getattr(_libc, "copy_file_range", None)
+    if func is not None:
+        func.restype = ctypes.c_ssize_t
+        func.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_int64),
+                         ctypes.c_int, ctypes.POINTER(ctypes.c_int64),
+                         ctypes.c_size_t, ctypes.c_uint]
+    return func
+
+
+def _copy_file_range(src_fd, dst_fd, start, end):
+    """ copy a region in the kernel
+    :return: False if copy_file_range is not supported
+    """
+    os_copy = getattr(os, "copy_file_range", None)
+    libc_copy = None if os_copy else _libc_copy_file_range()
+    if os_copy is None and libc_copy is None:
+        return False
+    offset = start
+    while offset < end:
+        length = min(end - offset, 1 << 30)
+        try:
+            if os_copy:
+                copied = os_copy(src_fd, dst_fd, length, offset, offset)
+            else:
+                off_in = ctypes.c_int64(offset)
+                off_out = ctypes.c_int64(offset)
+                copied = libc_copy(src_fd, ctypes.byref(off_in), dst_fd,
+                                   ctypes.byref(off_out), length, 0)
+                if copied < 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, os.strerror(err))
+        except OSError as e:
+            if offset == start and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if copied == 0:
+            break
+        offset += copied
+    return True
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, "pwrite"):
+        written = 0
+        while written < len(data):
+            written += os.pwrite(fd, data[written:], offset + written)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+
+
+def _buffered_copy(src_fd, dst_fd, start, end, block_size, buffer_size,
+                   hash_index=None):
+    """ copy a region through a buffer, hashing blocks and skipping zero
+    blocks. Only hash the region if *dst_fd* is None.
+    :return: number of bytes written
+    """
+    zero_block = b"\0" * block_size
+    zero_buffer = b"\0" * buffer_size
+    written = 0
+    offset = start
+    os.lseek(src_fd, start, os.SEEK_SET)
+    while offset < end:
+        data = os.read(src_fd, min(buffer_size, end - offset))
+        if not data:
+            break
+        if data == zero_buffer[:len(data)]:
+            offset += len(data)
+            continue
+        view = memoryview(data)
+        run_start = None
+        for position in range(0, len(data), block_size):
+            block = data[position:position+block_size]
+            if block == zero_block[:len(block)]:
+                if run_start is not None and dst_fd is not None:
+                    _pwrite(dst_fd, view[run_start:position], offset + run_start)
+                    written += position - run_start
+                    run_start = None
+                continue
+            if hash_index is not None:
+                hash_index.add((offset + position) // block_size,
+                               hashlib.sha1(block).digest())
+            if run_start is None:
+                run_start = position
+        if run_start is not None and dst_fd is not None:
+            _pwrite(dst_fd, view[run_start:], offset + run_start)
+            written += len(data) - run_start
+        offset += len(data)
+    return written
+
+
+def _aligned_extents(fd, size, block_size):
+    for start, end in data_extents(fd, size):
+        start -= start % block_size
+        end = min(size, end + (-end % block_size))
+        yield start, end
+
+
+def _copy_extents(src_fd, dst_fd, size, block_size, buffer_size, build_index,
+                  stats):
+    """ copy data regions with copy_file_range, or through a buffer hashing
+    blocks when it is not supported
+    :return: hash index built by the buffered copy, None if any region is\
+        copied with copy_file_range
+    """
+    use_copy_range = True
+    hash_index = None
+    for start, end in _aligned_extents(src_fd, size, block_size):
+        stats["data_size"] += end - start
+        if use_copy_range:
+            if _copy_file_range(src_fd, dst_fd, start, end):
+                stats["method"] = "copy_file_range"
+                stats["written_size"] += end - start
+                continue
+            if stats["method"] is not None:
+                # copied regions are hashed by reading the copy
+                build_index = False
+            use_copy_range = False
+        if build_index and hash_index is None:
+            hash_index = BlockHashIndex(block_size, size)
+        stats["method"] = "buffered"
+        stats["written_size"] += _buffered_copy(
+            src_fd, dst_fd, start, end, block_size, buffer_size, hash_index)
+    return hash_index
+
+
+def hash_image(fd, size, block_size=BLOCK_SIZE, buffer_size=BUFFER_SIZE):
+    """ Build the block hash index of an image by reading its data regions
+
+    :param fd: file descriptor opened for reading
+    :param size: size of the image
+    :rtype: :class:`BlockHashIndex`
+    """
+    hash_index = BlockHashIndex(block_size, size)
+    for start, end in _aligned_extents(fd, size, block_size):
+        _buffered_copy(fd, None, start, end, block_size, buffer_size,
+                       hash_index)
+    return hash_index
+
+
+def sparse_copy(src_path, dst_path, build_index=True, block_size=BLOCK_SIZE,
+                buffer_size=BUFFER_SIZE):
+    """ Copy a disk image preserving holes
+
+    :param src_path: path of the source image
+    :type src_path: str
+    :param dst_path: path of the new image
+    :type dst_path: str
+    :param build_index: True to build a block hash index of the copy
+    :type build_index: bool
+    :param buffer_size: size of the buffer, multiple of *block_size*
+    :type buffer_size: int
+    :return: hash index (None if not built) and copy statistics
+    :rtype: tuple of (:class:`BlockHashIndex`, dict)
+    """
+    if buffer_size % block_size:
+        raise ImagingError("Buffer size %d is not aligned to block size %d" % \
+                           (buffer_size, block_size))
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        # the destination is truncated before the source is read
+        raise ImagingError("Cannot copy %s onto itself" % src_path)
+    stats = {"method": None, "logical_size": 0, "data_size": 0,
+             "written_size": 0}
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        size = os.fstat(src_fd).st_size
+        stats["logical_size"] = size
+        dst_fd = os.open(dst_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            hash_index = None
+            if _reflink(src_fd, dst_fd):
+                stats["method"] = "reflink"
+                stats["data_size"] = size
+            else:
+                os.ftruncate(dst_fd, size)
+                hash_index = _copy_extents(src_fd, dst_fd, size, block_size,
+                                           buffer_size, build_index, stats)
+            if build_index and hash_index is None:
+                # the copy shares or has the same extents as the source,
+                # and reading them back hashes what was written
+                hash_index = hash_image(dst_fd, size, block_size, buffer_size)
+            os.fsync(dst_fd)
+            return hash_index, stats
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
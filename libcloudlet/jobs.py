@@ -0,0 +1,351 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module runs VM lifecycle operations as background jobs.
+
+An operation submitted to a :class:`JobExecutor` returns a :class:`Job`
+right away. The job reports its progress, calls its done callbacks, and
+gives its result, or raises its error, from :meth:`Job.result`. A dependent
+step is chained with :meth:`Job.then` and starts as soon as the previous
+one succeeds, without blocking any thread in between. :func:`batch` runs
+an operation over many items with a concurrency limit::
+
+    >>> from libcloudlet.jobs import batch
+    >>> job = batch(lambda job, cloudlet: cloudlet.provision(overlay_URL),
+                    cloudlet_list, max_concurrency=8)
+    >>> vm_list = job.result()
+"""
+
+__docformat__ = 'reStructuredText'
+
+import time
+import logging
+import threading
+from collections import deque
+
+
+_LOG = logging.getLogger("discovery")
+
+
+class JobError(Exception):
+    pass
+
+
+class JobCancelled(JobError):
+    pass
+
+
+class JobTimeout(JobError):
+    pass
+
+
+class BatchError(JobError):
+    """ Some jobs of a batch failed
+
+    :param failures: item and error of each failed job
+    :type failures: list of tuple
+    """
+
+    def __init__(self, msg, failures):
+        super(BatchError, self).__init__(msg)
+        self.failures = failures
+
+
+class Job(object):
+    """ Handle of an operation running in the background
+    """
+
+    STATE_PENDING   = "pending"
+    STATE_RUNNING   = "running"
+    STATE_DONE      = "done"
+    STATE_FAILED    = "failed"
+    STATE_CANCELLED = "cancelled"
+
+    def __init__(self, name=None):
+        self.name = name
+        self.state = self.STATE_PENDING
+        self.progress = 0.0
+        self.message = None
+        self.cancel_requested = False
+        self.time_start = None
+        self.time_end = None
+        self._result = None
+        self._error = None
+        self._callbacks = list()
+        self._done = threading.Event()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Job %s %s %.0f%%>" % (self.name, self.state, self.progress * 100)
+
+    def set_progress(self, fraction, message=None):
+        """ report progress between 0 and 1 from the running operation
+        """
+        with self.lock:
+            self.progress = max(self.progress, min(1.0, fraction))
+            if message is not None:
+                self.message = message
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        :return: True if the job is finished
+        :rtype: bool
+        """
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """ Wait for the job and return its result
+
+        :param timeout: seconds to wait. None to wait until it finishes.
+        :type timeout: float
+        :raises: error of the operation, :class:`JobCancelled` if it is\
+            cancelled, or :class:`JobTimeout` when *timeout* expires
+        """
+        if not self._done.wait(timeout):
+            raise JobTimeout("Job %s is not done in %.1f s" % (self.name, timeout))
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def error(self, timeout=None):
+        """ Wait for the job and return its error, None if it succeeded
+        """
+        if not self._done.wait(timeout):
+            raise JobTimeout("Job %s is not done in %.1f s" % (self.name, timeout))
+        return self._error
+
+    def add_done_callback(self, callback):
+        """ call *callback(job)* when the job finishes, or now if it is
+        already finished
+        """
+        with self.lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def cancel(self):
+        """ Cancel the job if it has not started. A running operation
+        sees *cancel_requested* and can stop at its next step.
+
+        :return: True if the job will not run
+        :rtype: bool
+        """
+        with self.lock:
+            self.cancel_requested = True
+            if self.state != self.STATE_PENDING:
+                return self.state == self.STATE_CANCELLED
+            self.state = self.STATE_CANCELLED
+        self._finish(error=JobCancelled("Job %s is cancelled" % self.name),
+                     state=self.STATE_CANCELLED)
+        return True
+
+    def check_cancelled(self):
+        """ raise :class:`JobCancelled` between steps of a running operation
+        if the job is cancelled
+        """
+        if self.cancel_requested:
+            raise JobCancelled("Job %s is cancelled" % self.name)
+
+    def then(self, func, executor=None, name=None):
+        """ Chain a dependent step that starts when this job succeeds
+
+        :param func: func(job, result) of the dependent step
+        :return: job of the dependent step. It fails with the error of\
+            this job without running *func* if this job fails.
+        :rtype: :class:`Job`
+        """
+        executor = executor or default_executor()
+        next_job = Job(name or getattr(func, "__name__", None))
+        def start_next(job):
+            if job._error is not None:
+                next_job._finish(error=job._error, state=self.STATE_FAILED)
+            else:
+                executor._enqueue(next_job, func, (job._result,), dict())
+        self.add_done_callback(start_next)
+        return next_job
+
+    def _start(self):
+        with self.lock:
+            if self.state != self.STATE_PENDING:
+                return False
+            self.state = self.STATE_RUNNING
+            self.time_start = time.time()
+            return True
+
+    def _finish(self, result=None, error=None, state=None):
+        with self.lock:
+            if self._done.is_set():
+                return
+            self._result = result
+            self._error = error
+            if state is None:
+                state = self.STATE_FAILED if error is not None else self.STATE_DONE
+            self.state = state
+            if state == self.STATE_DONE:
+                self.progress = 1.0
+            self.time_end = time.time()
+            callbacks, self._callbacks = self._callbacks, list()
+            self._done.set()
+        for callback in callbacks:
+            self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            _LOG.warning("Done callback of job %s failed: %s", self.name, e)
+
+
+class JobExecutor(object):
+    """ Pool of worker threads running jobs
+
+    :param max_workers: maximum number of jobs running at once
+    :type max_workers: int
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.pending = deque()
+        self.n_workers = 0
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """ Run *func(job, \\*args, \\*\\*kwargs)* in the background.
+        *func* can report progress with :meth:`Job.set_progress`.
+
+        :return: job of the operation
+        :rtype: :class:`Job`
+        """
+        job = Job(getattr(func, "__name__", None))
+        self._enqueue(job, func, args, kwargs)
+        return job
+
+    def _enqueue(self, job, func, args, kwargs):
+        with self.lock:
+            self.pending.append((job, func, args, kwargs))
+            if self.n_workers >= self.max_workers:
+                return
+            self.n_workers += 1
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+
+    def _work(self):
+        """ run pending jobs, and exit when none is left
+        """
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.n_workers -= 1
+                    return
+                job, func, args, kwargs = self.pending.popleft()
+            if not job._start():
+                continue
+            try:
+                result = func(job, *args, **kwargs)
+            except JobCancelled as e:
+                job._finish(error=e, state=Job.STATE_CANCELLED)
+            except Exception as e:
+                job._finish(error=e)
+            else:
+                job._finish(result=result)
+
+
+_DEFAULT_EXECUTOR = None
+_DEFAULT_EXECUTOR_LOCK = threading.Lock()
+
+
+def default_executor():
+    """ executor shared by the jobs of the process
+    """
+    global _DEFAULT_EXECUTOR
+    with _DEFAULT_EXECUTOR_LOCK:
+        if _DEFAULT_EXECUTOR is None:
+            _DEFAULT_EXECUTOR = JobExecutor()
+        return _DEFAULT_EXECUTOR
+
+
+def submit(func, *args, **kwargs):
+    """ Run *func(job, \\*args, \\*\\*kwargs)* at the default executor
+    """
+    return default_executor().submit(func, *args, **kwargs)
+
+
+class BatchJob(Job):
+    """ Job finishing when the jobs of every item finish.
+    Its progress is the fraction of finished items, and its result is the
+    list of their results in the order of the items.
+    """
+
+    def __init__(self, name, items, jobs):
+        super(BatchJob, self).__init__(name)
+        self.items = items
+        self.jobs = jobs
+        self.n_finished = 0
+        self._start()
+        if not jobs:
+            self._finish(result=list())
+        for job in jobs:
+            job.add_done_callback(self._item_done)
+
+    def _item_done(self, job):
+        with self.lock:
+            self.n_finished += 1
+            finished = self.n_finished
+        self.set_progress(float(finished) / len(self.jobs))
+        if finished < len(self.jobs):
+            return
+        failures = [(item, item_job._error)
+                    for item, item_job in zip(self.items, self.jobs)
+                    if item_job._error is not None]
+        if failures:
+            msg = "%d of %d jobs of %s failed: %s" % \
+                (len(failures), len(self.jobs), self.name, failures[0][1])
+            self._finish(error=BatchError(msg, failures))
+        else:
+            self._finish(result=[item_job._result for item_job in self.jobs])
+
+    def cancel(self):
+        """ Cancel the items that have not started
+
+        :return: True if no item will run
+        :rtype: bool
+        """
+        self.cancel_requested = True
+        cancelled = [job.cancel() for job in self.jobs]
+        return all(cancelled)
+
+
+def batch(func, items, max_concurrency=8, name="batch"):
+    """ Run *func(job, item)* for every item with at most *max_concurrency*
+    of them at once.
+
+    :return: job of the whole batch. Its *jobs* attribute has the job of\
+        each item.
+    :rtype: :class:`BatchJob`
+    :raises: :class:`BatchError` from :meth:`Job.result` if any item fails
+    """
+    items = list(items)
+    executor = JobExecutor(max_concurrency)
+    jobs = [executor.submit(func, item) for item in items]
+    return BatchJob(name, items, jobs)
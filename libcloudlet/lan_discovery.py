@@ -0,0 +1,273 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module discovers cloudlets at the same LAN using UDP multicast.
+
+A client sends a query message to the multicast group and every cloudlet
+running :class:`LANDiscoveryResponder` answers with the same record that the
+directory server returns (``ip_address``, ``rest_api_port`` and
+``rest_api_url``). Cloudlets can also announce themselves periodically.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import json
+import uuid
+import time
+import socket
+import select
+import struct
+import logging
+import threading
+from .const import LANDiscoveryConst as Const
+
+
+_LOG = logging.getLogger("discovery")
+
+
+def _is_valid_record(record):
+    return isinstance(record, dict) and \
+        record.get(Const.KEY_IP_ADDRESS) and \
+        record.get(Const.KEY_REST_API_PORT) and \
+        record.get(Const.KEY_REST_API_URL)
+
+
+def _record_key(record):
+    return (record[Const.KEY_IP_ADDRESS],
+            record[Const.KEY_REST_API_PORT],
+            record[Const.KEY_REST_API_URL])
+
+
+class LANDiscoveryResponder(threading.Thread):
+    """ Cloudlet side of the LAN discovery protocol
+
+    Answers multicast queries with the cloudlet record and optionally
+    announces the record to the group every *announce_interval* seconds.
+
+    :param ip_address: IP address of the cloudlet REST API server
+    :type ip_address: str
+    :param rest_api_port: port of the cloudlet REST API server
+    :type rest_api_port: int
+    :param rest_api_url: URL path of the cloudlet REST API
+    :type rest_api_url: str
+    :param interface: IP address of the interface joining the group
+    :type interface: str
+    :param announce_interval: seconds between announcements, None to disable
+    :type announce_interval: float
+    """
+
+    def __init__(self, ip_address, rest_api_port, rest_api_url,
+                 group=Const.MULTICAST_GROUP, port=Const.MULTICAST_PORT,
+                 interface="0.0.0.0", announce_interval=None, **kwargs):
+        self.record = {
+            Const.KEY_IP_ADDRESS: ip_address,
+            Const.KEY_REST_API_PORT: int(rest_api_port),
+            Const.KEY_REST_API_URL: rest_api_url,
+        }
+        self.record.update(kwargs)
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.announce_interval = announce_interval
+        self.stop_event = threading.Event()
+        self.sock = self._create_socket()
+        threading.Thread.__init__(self, target=self.run)
+        self.daemon = True
+
+    def _create_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        mreq = struct.pack("4s4s", socket.inet_aton(self.group),
+                           socket.inet_aton(self.interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                        Const.MULTICAST_TTL)
+        if self.interface != "0.0.0.0":
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                            socket.inet_aton(self.interface))
+        return sock
+
+    def _message(self, msg_type, nonce=None):
+        message = {Const.KEY_MESSAGE_TYPE: msg_type,
+                   Const.KEY_CLOUDLET: self.record}
+        if nonce is not None:
+            message[Const.KEY_NONCE] = nonce
+        return json.dumps(message).encode("utf-8")
+
+    def announce(self):
+        """ Send the cloudlet record to the multicast group
+        """
+        self.sock.sendto(self._message(Const.TYPE_ANNOUNCE),
+                         (self.group, self.port))
+
+    def run(self):
+        """ thread main method
+        """
+        next_announce = time.time()
+        while not self.stop_event.is_set():
+            if self.announce_interval and time.time() >= next_announce:
+                self.announce()
+                next_announce = time.time() + self.announce_interval
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 0.1)
+            except (select.error, ValueError):
+                break
+            if not readable:
+                continue
+            try:
+                data, addr = self.sock.recvfrom(Const.MAX_MESSAGE_SIZE)
+                message = json.loads(data.decode("utf-8"))
+            except (socket.error, ValueError):
+                continue
+            if not isinstance(message, dict) or \
+                    message.get(Const.KEY_MESSAGE_TYPE) != Const.TYPE_QUERY:
+                continue
+            response = self._message(Const.TYPE_RESPONSE,
+                                     message.get(Const.KEY_NONCE))
+            try:
+                self.sock.sendto(response, addr)
+            except socket.error as e:
+                _LOG.warning("Failed to answer LAN query from %s: %s", addr, e)
+
+    def terminate(self):
+        self.stop_event.set()
+        self.join()
+        self.sock.close()
+
+
+class LANDiscoveryClient(object):
+    """ Client side of the LAN discovery protocol
+
+    :param interface: IP address of the interface sending queries.
+        Use "127.0.0.1" to query responders on the same host.
+    :type interface: str
+    :param timeout: maximum seconds to wait for the first answer
+    :type timeout: float
+    :param settle_time: seconds to keep collecting answers after the first one
+    :type settle_time: float
+    """
+
+    def __init__(self, group=Const.MULTICAST_GROUP, port=Const.MULTICAST_PORT,
+                 interface=None, timeout=0.5, settle_time=0.05):
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.timeout = timeout
+        self.settle_time = settle_time
+
+    def _create_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                        Const.MULTICAST_TTL)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if self.interface:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                            socket.inet_aton(self.interface))
+            sock.bind((self.interface, 0))
+        return sock
+
+    def query(self, app_info=None):
+        """ Query cloudlets at the LAN
+
+        :param app_info: application information sent along with the query
+        :type app_info: :class:`Application`
+        :return: cloudlet records in the format of the directory server
+        :rtype: list of dict
+        """
+        nonce = uuid.uuid4().hex
+        message = {Const.KEY_MESSAGE_TYPE: Const.TYPE_QUERY,
+                   Const.KEY_NONCE: nonce}
+        if app_info is not None:
+            message["application"] = app_info.__dict__
+        records = dict()
+        sock = self._create_socket()
+        try:
+            sock.sendto(json.dumps(message).encode("utf-8"),
+                        (self.group, self.port))
+            deadline = time.time() + self.timeout
+            while True:
+                wait_time = deadline - time.time()
+                if wait_time <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], wait_time)
+                if not readable:
+                    break
+                data, addr = sock.recvfrom(Const.MAX_MESSAGE_SIZE)
+                try:
+                    response = json.loads(data.decode("utf-8"))
+                except ValueError:
+                    continue
+                if not isinstance(response, dict) or \
+                        response.get(Const.KEY_NONCE) != nonce:
+                    continue
+                record = response.get(Const.KEY_CLOUDLET)
+                if not _is_valid_record(record):
+                    continue
+                if not records:
+                    deadline = min(deadline, time.time() + self.settle_time)
+                records[_record_key(record)] = record
+        except socket.error as e:
+            _LOG.warning("LAN discovery failed: %s", e)
+        finally:
+            sock.close()
+        return list(records.values())
+
+    def listen(self, duration):
+        """ Collect cloudlet announcements for *duration* seconds
+
+        :return: cloudlet records in the format of the directory server
+        :rtype: list of dict
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        records = dict()
+        try:
+            sock.bind(("", self.port))
+            mreq = struct.pack("4s4s", socket.inet_aton(self.group),
+                               socket.inet_aton(self.interface or "0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            deadline = time.time() + duration
+            while True:
+                wait_time = deadline - time.time()
+                if wait_time <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], wait_time)
+                if not readable:
+                    break
+                data, addr = sock.recvfrom(Const.MAX_MESSAGE_SIZE)
+                try:
+                    message = json.loads(data.decode("utf-8"))
+                except ValueError:
+                    continue
+                if not isinstance(message, dict) or \
+                        message.get(Const.KEY_MESSAGE_TYPE) != Const.TYPE_ANNOUNCE:
+                    continue
+                record = message.get(Const.KEY_CLOUDLET)
+                if _is_valid_record(record):
+                    records[_record_key(record)] = record
+        except socket.error as e:
+            _LOG.warning("Failed to listen LAN announcement: %s", e)
+        finally:
+            sock.close()
+        return list(records.values())
@@ -0,0 +1,297 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module tracks latency of endpoints to derive adaptive timeouts.
+
+Quantiles are estimated with the P-square algorithm (Jain and Chlamtac,
+1985), which keeps five markers per quantile instead of the samples.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import threading
+
+
+class P2Quantile(object):
+    """ Streaming estimator of a single quantile
+
+    :param quantile: target quantile between 0 and 1
+    :type quantile: float
+    """
+
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self.count = 0
+        self.heights = list()
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2*quantile, 4*quantile, 2+2*quantile, 4]
+        self.increments = [0, quantile/2.0, quantile, (1+quantile)/2.0, 1]
+
+    def add(self, value):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # find the cell of the new value and adjust extreme markers
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell+1]:
+                cell += 1
+        positions = self.positions
+        for index in range(cell+1, 5):
+            positions[index] += 1
+        for index in range(5):
+            self.desired[index] += self.increments[index]
+
+        # adjust heights of the middle markers
+        for index in range(1, 4):
+            delta = self.desired[index] - positions[index]
+            if (delta >= 1 and positions[index+1] - positions[index] > 1) or \
+                    (delta <= -1 and positions[index-1] - positions[index] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(index, step)
+                if not heights[index-1] < height < heights[index+1]:
+                    height = self._linear(index, step)
+                heights[index] = height
+                positions[index] += step
+
+    def get_state(self):
+        """
+        :return: number of samples, marker heights and marker positions
+        :rtype: tuple
+        """
+        return self.count, list(self.heights), list(self.positions)
+
+    def set_state(self, state):
+        count, heights, positions = state
+        self.count = count
+        self.heights = list(heights)
+        if count > 5:
+            self.positions = list(positions)
+            initial = [0, 2*self.quantile, 4*self.quantile, 2+2*self.quantile, 4]
+            self.desired = [start + increment * (count - 5)
+                            for start, increment in zip(initial, self.increments)]
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + float(d) / (n[i+1] - n[i-1]) * \
+            ((n[i] - n[i-1] + d) * (q[i+1] - q[i]) / float(n[i+1] - n[i]) +
+             (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / float(n[i] - n[i-1]))
+
+    def _linear(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d * (q[i+d] - q[i]) / float(n[i+d] - n[i])
+
+    def value(self):
+        """ current estimate, None without any sample
+        """
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            index = int(round(self.quantile * (len(self.heights) - 1)))
+            return self.heights[index]
+        return self.heights[2]
+
+
+class LatencyTracker(object):
+    """ Latency distribution of a single endpoint
+
+    Connect and read timeouts are the p99 latency times *multiplier*,
+    bounded by *floor* and *ceiling*. Until *min_samples* requests are
+    observed, *ceiling* is used, since a p99 estimated from fewer samples
+    misses the tail of the distribution and causes false timeouts.
+
+    :param endpoint: endpoint URL
+    :type endpoint: str
+    :param min_samples: samples needed to use the p99 for timeouts
+    :type min_samples: int
+    :param min_hedge_samples: samples needed to use the p95 for hedging
+    :type min_hedge_samples: int
+    :param hedge: True to allow a hedged request when p95 is exceeded
+    :type hedge: bool
+    """
+
+    def __init__(self, endpoint, multiplier=3.0, floor=0.2, ceiling=10.0,
+                 min_samples=100, min_hedge_samples=20, hedge=False):
+        self.endpoint = endpoint
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.min_hedge_samples = min_hedge_samples
+        self.hedge = hedge
+        self.connect_p99 = P2Quantile(0.99)
+        self.read_p99 = P2Quantile(0.99)
+        self.total_p95 = P2Quantile(0.95)
+        self.lock = threading.Lock()
+
+    def record(self, connect_time, read_time):
+        """ record latency of a request
+
+        :param connect_time: seconds to establish the connection
+        :param read_time: seconds from sending the request to reading the response
+        """
+        with self.lock:
+            self.connect_p99.add(connect_time)
+            self.read_p99.add(read_time)
+            self.total_p95.add(connect_time + read_time)
+
+    def record_timeout(self, connect_timeout, read_timeout, connected):
+        """ record a timed out request using the timeout as a lower bound
+        of its latency, so that timeouts grow when the endpoint slows down.
+        Only the component that timed out is recorded; the other one is
+        not measured.
+        """
+        timeout = read_timeout if connected else connect_timeout
+        with self.lock:
+            if connected:
+                self.read_p99.add(read_timeout)
+            else:
+                self.connect_p99.add(connect_timeout)
+            self.total_p95.add(timeout)
+
+    def get_state(self):
+        with self.lock:
+            return [self.connect_p99.get_state(), self.read_p99.get_state(),
+                    self.total_p95.get_state()]
+
+    def set_state(self, states):
+        with self.lock:
+            for estimator, state in zip((self.connect_p99, self.read_p99,
+                                         self.total_p95), states):
+                estimator.set_state(state)
+
+    def _bound(self, estimator):
+        if estimator.count < self.min_samples:
+            return self.ceiling
+        timeout = estimator.value() * self.multiplier
+        return min(self.ceiling, max(self.floor, timeout))
+
+    def timeouts(self):
+        """
+        :return: connect timeout and read timeout in seconds
+        :rtype: tuple of float
+        """
+        with self.lock:
+            return self._bound(self.connect_p99), self._bound(self.read_p99)
+
+    def hedge_delay(self):
+        """
+        :return: seconds to wait before sending a hedged request,\
+            None if hedging is disabled or not enough samples are observed
+        :rtype: float
+        """
+        if not self.hedge:
+            return None
+        return self.p95()
+
+    def p95(self):
+        """
+        :return: p95 of the total latency in seconds, None if not enough\
+            samples are observed
+        :rtype: float
+        """
+        with self.lock:
+            if self.total_p95.count < self.min_hedge_samples:
+                return None
+            return self.total_p95.value()
+
+
+class LatencyRegistry(object):
+    """ Thread-safe map of endpoint to :class:`LatencyTracker`
+
+    Keyword arguments are passed to each :class:`LatencyTracker`.
+    A new tracker starts from the state saved at the *snapshot*.
+    """
+
+    def __init__(self, snapshot=None, **kwargs):
+        self.tracker_kwargs = kwargs
+        self.snapshot = snapshot
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self.lock:
+            tracker = self.endpoints.get(endpoint, None)
+            if tracker is None:
+                tracker = LatencyTracker(endpoint, **self.tracker_kwargs)
+                if self.snapshot is not None:
+                    states = self.snapshot.get_latency(endpoint)
+                    if states:
+                        tracker.set_state(states)
+                self.endpoints[endpoint] = tracker
+            return tracker
+
+    def items(self):
+        with self.lock:
+            return list(self.endpoints.items())
+
+
+def hedged_call(func, hedge_delay=None):
+    """ Call *func* and call it once more if it does not return within
+    *hedge_delay* seconds. The first successful result is returned.
+
+    :param func: function without argument
+    :param hedge_delay: seconds before the hedged call. None to call once.
+    :return: return value of *func*
+    :raises: exception of the last failed call when every call fails
+    """
+    if hedge_delay is None:
+        return func()
+
+    import Queue
+    result_queue = Queue.Queue()
+    def run_func():
+        try:
+            result_queue.put((True, func()))
+        except Exception as e:
+            result_queue.put((False, e))
+
+    n_calls = 0
+    for delay in (hedge_delay, None):
+        call_thread = threading.Thread(target=run_func)
+        call_thread.daemon = True
+        call_thread.start()
+        n_calls += 1
+        try:
+            success, value = result_queue.get(timeout=delay) \
+                if delay is not None else result_queue.get()
+        except Queue.Empty:
+            continue
+        if success:
+            return value
+        break
+
+    # wait for the remaining calls
+    error = value
+    for _ in range(n_calls - 1):
+        success, value = result_queue.get()
+        if success:
+            return value
+        error = value
+    raise error
@@ -0,0 +1,424 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module keeps downloaded VM overlays in a local disk cache.
+
+Overlays are stored by the Merkle root of their manifest, so the same
+overlay published at different URLs is stored once. An overlay URL maps
+to the root and the ETag of its manifest. A cached URL is revalidated
+with a conditional request for the manifest only, and the overlay is not
+transferred when the manifest is not modified or its root is already
+cached. When a new version of an overlay is published, the chunks whose
+hashes are in a cached overlay are copied from it and only the other
+chunks are downloaded.
+
+The cache is bounded by the total size of the overlays and evicts the
+least recently used ones, except the overlays pinned by
+:meth:`OverlayCache.acquire` until they are released. Concurrent requests
+for the same URL share one download, and cached overlays are read through
+memory maps. The layout
+of the cache directory is::
+
+    index.json              overlay roots with their size and last use,
+                            and URLs with their root and manifest ETag
+    objects/<root>          verified VM overlay
+    objects/<root>.merkle   its manifest
+"""
+
+__docformat__ = 'reStructuredText'
+
+import os
+import io
+import json
+import mmap
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from .const import OverlayConst
+from .singleflight import SingleFlight
+from . import transfer
+
+
+_LOG = logging.getLogger("discovery")
+
+INDEX_FILE = "index.json"
+OBJECT_DIR = "objects"
+
+KEY_OBJECTS = "objects"
+KEY_URLS = "urls"
+KEY_LAST_USED = "last_used"
+KEY_ETAG = "etag"
+
+
+class CachedOverlay(object):
+    """ A verified VM overlay in the cache
+    """
+
+    def __init__(self, root, size, chunk_size, last_used=None):
+        self.root = root
+        self.size = size
+        self.chunk_size = chunk_size
+        self.last_used = last_used or time.time()
+        self.n_pins = 0
+
+
+class _ChunkReader(object):
+    """ reads chunks of cached overlays by their hash for
+    :meth:`OverlayTransfer.run`, keeping each overlay mapped until closed
+    """
+
+    def __init__(self, cache, chunk_index):
+        self.cache = cache
+        self.chunk_index = chunk_index
+        self.maps = dict()
+
+    def __call__(self, leaf):
+        location = self.chunk_index.get(leaf, None)
+        if location is None:
+            return None
+        root, offset, length = location
+        if root not in self.maps:
+            try:
+                self.maps[root] = self.cache.open(root)
+            except (IOError, OSError, ValueError, KeyError):
+                self.maps[root] = None
+        mapped = self.maps[root]
+        if mapped is None:
+            return None
+        return mapped[offset:offset+length]
+
+    def close(self):
+        for mapped in self.maps.values():
+            if mapped is not None:
+                mapped.close()
+        self.maps.clear()
+
+
+class OverlayCache(object):
+    """ Size-bounded LRU disk cache of verified VM overlays
+
+    :param cache_dir: directory of the cache
+    :type cache_dir: str
+    :param max_bytes: maximum total size of cached overlays. The most\
+        recently used overlay is kept even if it is larger.
+    :type max_bytes: int
+    :param single_flight: downloads in flight, shared by concurrent\
+        requests for the same overlay
+    :type single_flight: :class:`SingleFlight`
+    """
+
+    def __init__(self, cache_dir, max_bytes=10*1024*1024*1024,
+                 single_flight=None):
+        self.cache_dir = cache_dir
+        self.object_dir = os.path.join(cache_dir, OBJECT_DIR)
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.max_bytes = max_bytes
+        self.single_flight = single_flight or SingleFlight()
+        self.objects = OrderedDict()    # root -> CachedOverlay in LRU order
+        self.urls = dict()              # URL -> (root, manifest ETag)
+        self.chunk_index = None         # chunk hash -> (root, offset, length)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.n_hits = 0
+        self.n_misses = 0
+        self.bytes_downloaded = 0
+        self.bytes_reused = 0
+        if not os.path.isdir(self.object_dir):
+            os.makedirs(self.object_dir)
+        self._load_index()
+
+    def _object_path(self, root):
+        return os.path.join(self.object_dir, root)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                index = json.loads(f.read())
+            objects = index[KEY_OBJECTS]
+            urls = index[KEY_URLS]
+        except (IOError, OSError):
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            _LOG.warning("Ignore overlay cache index at %s: %s", self.index_path, e)
+            return
+        records = sorted(objects.items(), key=lambda item: item[1][KEY_LAST_USED])
+        for root, record in records:
+            if not os.path.exists(self._object_path(root)):
+                continue
+            entry = CachedOverlay(root, record[OverlayConst.KEY_SIZE],
+                                  record[OverlayConst.KEY_CHUNK_SIZE],
+                                  record[KEY_LAST_USED])
+            self.objects[root] = entry
+            self.total_bytes += entry.size
+        for URL, record in urls.items():
+            if record[OverlayConst.KEY_ROOT] in self.objects:
+                self.urls[URL] = (record[OverlayConst.KEY_ROOT], record[KEY_ETAG])
+
+    def _save_index(self):
+        """ write the index atomically. Called with the lock held.
+        """
+        index = {
+            KEY_OBJECTS: dict((root, {OverlayConst.KEY_SIZE: entry.size,
+                                      OverlayConst.KEY_CHUNK_SIZE: entry.chunk_size,
+                                      KEY_LAST_USED: entry.last_used})
+                              for root, entry in self.objects.items()),
+            KEY_URLS: dict((URL, {OverlayConst.KEY_ROOT: root, KEY_ETAG: etag})
+                           for URL, (root, etag) in self.urls.items()),
+        }
+        fd, temp_path = tempfile.mkstemp(prefix=".index-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(index))
+            os.rename(temp_path, self.index_path)
+        except:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _touch(self, root):
+        """ mark the overlay as the most recently used. Called with the lock held.
+        """
+        entry = self.objects.pop(root)
+        entry.last_used = time.time()
+        self.objects[root] = entry
+        return entry
+
+    def _build_chunk_index(self):
+        """ map the chunk hashes of every cached overlay from their manifests.
+        Called with the lock held.
+        """
+        chunk_index = dict()
+        for root, entry in self.objects.items():
+            self._index_chunks(chunk_index, root, entry)
+        self.chunk_index = chunk_index
+
+    def _index_chunks(self, chunk_index, root, entry, tree=None):
+        if tree is None:
+            try:
+                with open(self._object_path(root) + OverlayConst.MANIFEST_SUFFIX,
+                          "rb") as f:
+                    tree = transfer.MerkleTree.from_manifest(json.loads(f.read()), root)
+            except (IOError, OSError, ValueError, transfer.IntegrityError) as e:
+                _LOG.warning("Cannot index chunks of cached overlay %s: %s", root, e)
+                return
+        for index, leaf in enumerate(tree.leaves):
+            offset = index * entry.chunk_size
+            chunk_index[leaf] = (root, offset, min(entry.chunk_size, entry.size - offset))
+
+    def _evict(self):
+        """ remove the least recently used overlays over the size bound,
+        skipping pinned ones. Called with the lock held.
+        """
+        # the most recently used overlay is kept
+        candidates = [root for root, entry in list(self.objects.items())[:-1]
+                      if entry.n_pins == 0]
+        for root in candidates:
+            if self.total_bytes <= self.max_bytes:
+                break
+            entry = self.objects.pop(root)
+            self.total_bytes -= entry.size
+            for URL in [URL for URL, (url_root, _) in self.urls.items()
+                        if url_root == root]:
+                del self.urls[URL]
+            if self.chunk_index is not None:
+                for leaf in [leaf for leaf, location in self.chunk_index.items()
+                             if location[0] == root]:
+                    del self.chunk_index[leaf]
+            # a mapped or open file stays readable after unlink
+            for path in (self._object_path(root),
+                         self._object_path(root) + OverlayConst.MANIFEST_SUFFIX):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            _LOG.info("Evicted overlay %s (%d bytes) from cache", root, entry.size)
+
+    def _add(self, overlay_URL, overlay_transfer, temp_path):
+        """ move a verified overlay into the cache
+        :return: Merkle root of the overlay
+        """
+        tree = overlay_transfer.tree
+        root = tree.hex_root()
+        path = self._object_path(root)
+        with open(path + OverlayConst.MANIFEST_SUFFIX, "wb") as f:
+            f.write(json.dumps(overlay_transfer.manifest))
+        os.rename(temp_path, path)
+        entry = CachedOverlay(root, overlay_transfer.size,
+                              overlay_transfer.chunk_size)
+        with self.lock:
+            previous = self.objects.pop(root, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+            self.objects[root] = entry
+            self.total_bytes += entry.size
+            if self.chunk_index is not None:
+                self._index_chunks(self.chunk_index, root, entry, tree)
+            self.urls[overlay_URL] = (root, overlay_transfer.manifest_etag)
+            self.bytes_reused += overlay_transfer.bytes_reused
+            self.bytes_downloaded += overlay_transfer.size - overlay_transfer.bytes_reused
+            self._evict()
+            self._save_index()
+        return root
+
+    def lookup(self, overlay_root):
+        """
+        :return: path of the cached overlay of the Merkle root, or None
+        :rtype: str
+        """
+        with self.lock:
+            if overlay_root not in self.objects:
+                return None
+            self._touch(overlay_root)
+            return self._object_path(overlay_root)
+
+    def open(self, overlay_root):
+        """ Map a cached overlay into memory for reading. The map stays
+        readable after the overlay is evicted. The caller closes the
+        returned object.
+
+        :return: memory map of the overlay, or an empty file object for\
+            an overlay of zero bytes, which cannot be mapped
+        :rtype: mmap.mmap
+        :raises: KeyError if the overlay is not cached
+        """
+        with self.lock:
+            entry = self.objects.get(overlay_root, None)
+            if entry is None:
+                raise KeyError(overlay_root)
+            if entry.size == 0:
+                return io.BytesIO()
+            # open with the lock held, before an eviction can unlink it
+            with open(self._object_path(overlay_root), "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def acquire(self, overlay_URL, overlay_account=None, overlay_key=None,
+                expected_root=None, n_workers=4, progress=None, n_attempts=3):
+        """ :meth:`fetch` an overlay and pin it in the cache. A pinned
+        overlay is not evicted until every caller pinning it calls
+        :meth:`release`.
+
+        :param n_attempts: number of fetches when the overlay is evicted\
+            before it is pinned
+        :type n_attempts: int
+        :return: path of the cached overlay and its Merkle root
+        :rtype: tuple of str
+        :raises: KeyError if the overlay is evicted at every attempt, and\
+            the exceptions of :meth:`fetch`
+        """
+        for _ in range(n_attempts):
+            path, root = self.fetch(overlay_URL, overlay_account, overlay_key,
+                                    expected_root, n_workers, progress)
+            with self.lock:
+                entry = self.objects.get(root, None)
+                if entry is not None:
+                    entry.n_pins += 1
+                    return path, root
+            _LOG.info("Overlay %s is evicted before it is pinned. Fetch again", root)
+        raise KeyError(root)
+
+    def release(self, overlay_root):
+        """ Unpin an overlay of :meth:`acquire`, evicting the overlays over
+        the size bound that are no longer pinned
+        """
+        with self.lock:
+            entry = self.objects.get(overlay_root, None)
+            if entry is None or entry.n_pins == 0:
+                return
+            entry.n_pins -= 1
+            if entry.n_pins == 0 and self.total_bytes > self.max_bytes:
+                self._evict()
+                self._save_index()
+
+    def fetch(self, overlay_URL, overlay_account=None, overlay_key=None,
+              expected_root=None, n_workers=4, progress=None):
+        """ Get a verified overlay from the cache, downloading it if needed.
+        Concurrent calls for the same overlay share one download.
+
+        :param overlay_URL: Downloadable URL of the VM overlay
+        :type overlay_URL: str
+        :param expected_root: hex Merkle root pinned by the caller.\
+            A cached overlay of the root is used without any request.
+        :type expected_root: str
+        :param progress: progress(verified bytes, overlay size) of the download
+        :return: path of the cached overlay and its Merkle root
+        :rtype: tuple of str
+        :raises: :class:`TransferError` when the overlay cannot be\
+            downloaded, or :class:`IntegrityError` when it is corrupted
+        """
+        if expected_root:
+            path = self.lookup(expected_root)
+            if path is not None:
+                with self.lock:
+                    self.n_hits += 1
+                return path, expected_root
+        key = ("overlay", overlay_URL, overlay_account, expected_root)
+        return self.single_flight.do(key, lambda: self._fetch(
+            overlay_URL, overlay_account, overlay_key, expected_root, n_workers,
+            progress))
+
+    def _fetch(self, overlay_URL, overlay_account, overlay_key, expected_root,
+               n_workers, progress):
+        overlay_transfer = transfer.OverlayTransfer(
+            overlay_URL, None, overlay_account, overlay_key,
+            expected_root=expected_root, n_workers=n_workers, progress=progress)
+
+        # revalidate the manifest of the URL
+        with self.lock:
+            cached_root, etag = self.urls.get(overlay_URL, (None, None))
+        tree = overlay_transfer.fetch_manifest(etag)
+        if tree is None:
+            path = self.lookup(cached_root)
+            if path is not None and (not expected_root or expected_root == cached_root):
+                with self.lock:
+                    self.n_hits += 1
+                return path, cached_root
+            tree = overlay_transfer.fetch_manifest()
+        root = tree.hex_root()
+        path = self.lookup(root)
+        if path is not None:
+            # same content under another URL, or the URL was republished
+            with self.lock:
+                self.n_hits += 1
+                self.urls[overlay_URL] = (root, overlay_transfer.manifest_etag)
+                self._save_index()
+            return path, root
+
+        # download, copying the chunks of cached overlays
+        with self.lock:
+            self.n_misses += 1
+            if self.chunk_index is None:
+                self._build_chunk_index()
+            chunk_reader = _ChunkReader(self, dict(self.chunk_index))
+        fd, temp_path = tempfile.mkstemp(prefix=".overlay-", dir=self.object_dir)
+        os.close(fd)
+        overlay_transfer.dest_path = temp_path
+        try:
+            with closing(chunk_reader):
+                overlay_transfer.run(chunk_source=chunk_reader)
+            root = self._add(overlay_URL, overlay_transfer, temp_path)
+        except:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        _LOG.info("Cached overlay %s as %s (%d of %d bytes reused)", overlay_URL,
+                  root, overlay_transfer.bytes_reused, overlay_transfer.size)
+        return self._object_path(root), root
@@ -0,0 +1,212 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module places many applications to cloudlets at once.
+
+Each cloudlet has CPU capacity of ``total_cpu_num`` cores scaled by its idle
+ratio (``total_cpu_usage_percent``) and memory capacity of
+``total_free_memory_mb``. The engine assigns applications to cloudlets
+without exceeding the capacities while maximizing the total utility.
+
+The solver is a regret-ordered greedy bin-packing. Applications that can
+run on the least CPU capacity are placed first, then those that lose the
+most when they miss their best cloudlet, larger applications first among
+equals. Each goes to one of its most useful cloudlets with enough
+remaining capacity: among the first few whose utility is close to the
+best, the one whose remaining CPU and memory stay the most balanced, so
+that neither is stranded when the other runs out.
+"""
+
+__docformat__ = 'reStructuredText'
+
+from .const import AppInfoConst
+from .const import ResourceInfoConst
+
+
+def cloudlet_resource(cloudlet, key, default=None):
+    """ Return a cloudlet-wide resource value from meta information or
+    from any application specific detail record of the cloudlet.
+    """
+    value = cloudlet.meta_info.get(key, None)
+    if value is not None:
+        return value
+    for app_id in getattr(cloudlet, 'detail_digests', dict()):
+        cloudlet_info = getattr(cloudlet, app_id, None)
+        if cloudlet_info and cloudlet_info.get(key, None) is not None:
+            return cloudlet_info.get(key)
+    return default
+
+
+class PlacementEngine(object):
+    """ Capacity-constrained placement of multiple applications
+
+    :param default_cpu: CPU cores of an application without\
+        ``required-cpu-num``
+    :type default_cpu: float
+    :param default_mem_mb: memory of an application without\
+        ``required-mem-mb``
+    :type default_mem_mb: float
+    :param utility_tolerance: utility that an application can give up for\
+        a cloudlet with more balanced remaining capacity
+    :type utility_tolerance: float
+    :param max_choices: maximum number of cloudlets compared for an\
+        application. 1 to place each to its most useful cloudlet.
+    :type max_choices: int
+    """
+
+    def __init__(self, default_cpu=1.0, default_mem_mb=1024.0,
+                 utility_tolerance=0.1, max_choices=8):
+        self.default_cpu = default_cpu
+        self.default_mem_mb = default_mem_mb
+        self.utility_tolerance = utility_tolerance
+        self.max_choices = max_choices
+        self.total_utility = 0.0
+
+    def demand(self, app_info):
+        """
+        :return: CPU cores and memory in MB required by the application
+        :rtype: tuple of float
+        """
+        cpu = getattr(app_info, AppInfoConst.REQUIRED_CPU_NUMBER, None)
+        mem = getattr(app_info, AppInfoConst.REQUIRED_MEM_MB, None)
+        return (float(cpu if cpu is not None else self.default_cpu),
+                float(mem if mem is not None else self.default_mem_mb))
+
+    def capacity(self, cloudlet):
+        """
+        :return: available CPU cores and free memory in MB of the cloudlet
+        :rtype: tuple of float
+        """
+        cpu_num = cloudlet_resource(cloudlet, ResourceInfoConst.TOTAL_CPU_NUMBER, 0)
+        cpu_percent = cloudlet_resource(cloudlet, ResourceInfoConst.TOTAL_CPU_PERCENT, 0.0)
+        mem_free = cloudlet_resource(cloudlet, ResourceInfoConst.TOTAL_MEM_FREE_MB, 0)
+        idle_ratio = max(0.0, 1.0 - float(cpu_percent) / 100.0)
+        return float(cpu_num) * idle_ratio, float(mem_free)
+
+    def utility(self, app_info, cloudlet):
+        """ Utility of placing the application at the cloudlet following
+        :meth:`ElijahCloudletSelection.select_cloudlet`: the cloudlet must
+        meet the required CPU clock and a higher cache score is better.
+
+        :return: utility, None if the cloudlet cannot run the application
+        :rtype: float
+        """
+        cloudlet_info = getattr(cloudlet, app_info.get_appid(), None)
+        if not cloudlet_info:
+            return None
+        required_clock_speed = getattr(app_info, AppInfoConst.REQUIRED_MIN_CPU_CLOCK, 0.0)
+        cloudlet_cpu_speed = cloudlet_info.get(ResourceInfoConst.CLOCK_SPEED, 0.0)
+        if required_clock_speed and cloudlet_cpu_speed < required_clock_speed:
+            return None
+        cache_score = cloudlet_info.get(ResourceInfoConst.APP_CACHE_TOTAL_SCORE, None)
+        return 1.0 + float(cache_score or 0.0)
+
+    def _group_key(self, app_info):
+        # applications sharing the key have the same utility at every cloudlet
+        return (app_info.get_appid(),
+                getattr(app_info, AppInfoConst.REQUIRED_MIN_CPU_CLOCK, 0.0))
+
+    def place(self, app_list, cloudlet_list):
+        """ Place applications to cloudlets
+
+        :param app_list: applications to place
+        :type app_list: list of :class:`Application`
+        :param cloudlet_list: candidate cloudlets with detail records
+        :type cloudlet_list: list of :class:`Cloudlet`
+        :return: assigned cloudlet for each application in the same order,\
+            None if no cloudlet has enough capacity
+        :rtype: list of :class:`Cloudlet`
+        """
+        remaining_cpu = list()
+        remaining_mem = list()
+        for cloudlet in cloudlet_list:
+            cpu, mem = self.capacity(cloudlet)
+            remaining_cpu.append(cpu)
+            remaining_mem.append(mem)
+
+        # preference list of cloudlets for each group of applications
+        preferences = dict()
+        eligible_cpu = dict()
+        requests = list()
+        for app_index, app_info in enumerate(app_list):
+            group_key = self._group_key(app_info)
+            if group_key not in preferences:
+                utilities = list()
+                for index, cloudlet in enumerate(cloudlet_list):
+                    utility = self.utility(app_info, cloudlet)
+                    if utility is not None:
+                        utilities.append((-utility, index))
+                utilities.sort()
+                preferences[group_key] = [(-u, index) for u, index in utilities]
+                eligible_cpu[group_key] = sum([remaining_cpu[index]
+                                               for _, index in utilities])
+            preference = preferences[group_key]
+            if not preference:
+                regret = 0.0
+            elif len(preference) == 1:
+                regret = preference[0][0]
+            else:
+                regret = preference[0][0] - preference[1][0]
+            cpu, mem = self.demand(app_info)
+            requests.append((eligible_cpu[group_key], -regret, -cpu, -mem,
+                             app_index, group_key))
+        requests.sort()
+
+        capacity_cpu = [max(cpu, 1e-9) for cpu in remaining_cpu]
+        capacity_mem = [max(mem, 1e-9) for mem in remaining_mem]
+        # cloudlets before the start index are full for the smallest demand
+        min_cpu = min([-r[2] for r in requests]) if requests else 0.0
+        min_mem = min([-r[3] for r in requests]) if requests else 0.0
+        start_index = dict([(key, 0) for key in preferences])
+
+        placement = [None] * len(app_list)
+        self.total_utility = 0.0
+        for _, _, neg_cpu, neg_mem, app_index, group_key in requests:
+            cpu, mem = -neg_cpu, -neg_mem
+            preference = preferences[group_key]
+            position = start_index[group_key]
+            while position < len(preference):
+                index = preference[position][1]
+                if remaining_cpu[index] >= min_cpu and \
+                        remaining_mem[index] >= min_mem:
+                    break
+                position += 1
+            start_index[group_key] = position
+            chosen = None
+            n_choices = 0
+            for utility, index in preference[position:]:
+                if remaining_cpu[index] < cpu or remaining_mem[index] < mem:
+                    continue
+                if chosen is None:
+                    best_utility = utility
+                elif utility < best_utility - self.utility_tolerance or \
+                        n_choices >= self.max_choices:
+                    break
+                n_choices += 1
+                imbalance = abs((remaining_cpu[index] - cpu) / capacity_cpu[index] -
+                                (remaining_mem[index] - mem) / capacity_mem[index])
+                if chosen is None or imbalance < chosen[0]:
+                    chosen = (imbalance, utility, index)
+            if chosen is not None:
+                _, utility, index = chosen
+                remaining_cpu[index] -= cpu
+                remaining_mem[index] -= mem
+                placement[app_index] = cloudlet_list[index]
+                self.total_utility += utility
+        return placement
@@ -0,0 +1,313 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module keeps a snapshot of the cloudlet registry on disk for warm
+restarts.
+
+The snapshot has the cached directory and cloudlet detail responses with
+their validators, and the latency distribution of each endpoint. A new
+process maps the file and looks up records by binary search over sorted
+hash indexes; only the record that is looked up gets decoded. The file is
+replaced atomically, so a reader never sees a partially written snapshot.
+All integers are in network byte order::
+
+    header          4s magic "CLRG", H version, H reserved, d created time,
+                    I n_responses, I n_latencies,
+                    Q response index offset, Q latency index offset
+    records         response and latency records
+    response index  n_responses x (Q key hash, Q offset, I length)
+    latency index   n_latencies x (Q key hash, Q offset, I length)
+
+A response record has key, ETag, version and digest as length-prefixed
+strings, B encoding of the parsed object (JSON or binary wire format), and
+the length-prefixed encoded object. A latency record has the endpoint and
+the state of each quantile estimator of :class:`LatencyTracker`.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+from . import wire
+from .http_cache import CachedResponse
+
+
+MAGIC = b"CLRG"
+VERSION = 1
+
+ENCODING_JSON = 0
+ENCODING_WIRE = 1
+
+_HEADER = struct.Struct(">4sHHdIIQQ")
+_INDEX_ENTRY = struct.Struct(">QQI")
+_STRING_LENGTH = struct.Struct(">I")
+_ENCODING = struct.Struct(">B")
+_QUANTILE_STATE = struct.Struct(">I5d5d")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _key_string(key):
+    """ string form of a response cache key
+    """
+    if isinstance(key, tuple):
+        return u"\n".join([_key_string(item) for item in key])
+    if isinstance(key, bytes):
+        return key.decode("utf-8")
+    return u"%s" % key
+
+
+def _key_hash(key):
+    return struct.unpack(">Q", hashlib.sha1(key.encode("utf-8")).digest()[:8])[0]
+
+
+def _pack_string(value):
+    value = (value or u"").encode("utf-8")
+    return _STRING_LENGTH.pack(len(value)) + value
+
+
+def _unpack_string(data, offset):
+    length, = _STRING_LENGTH.unpack_from(data, offset)
+    offset += _STRING_LENGTH.size
+    return data[offset:offset+length].decode("utf-8"), offset + length
+
+
+def _encode_parsed(parsed):
+    if isinstance(parsed, wire.CloudletInfo):
+        return ENCODING_WIRE, wire.encode(parsed)
+    return ENCODING_JSON, json.dumps(parsed).encode("utf-8")
+
+
+def _pack_response(key, entry):
+    encoding, payload = _encode_parsed(entry.parsed)
+    return b"".join([_pack_string(key), _pack_string(entry.etag),
+                     _pack_string(entry.version), _pack_string(entry.digest),
+                     _ENCODING.pack(encoding),
+                     _STRING_LENGTH.pack(len(payload)), payload])
+
+
+def _pack_latency(endpoint, states):
+    chunks = [_pack_string(endpoint)]
+    for count, heights, positions in states:
+        heights = (list(heights) + [0.0] * 5)[:5]
+        positions = (list(positions) + [0.0] * 5)[:5]
+        chunks.append(_QUANTILE_STATE.pack(count, *(heights + positions)))
+    return b"".join(chunks)
+
+
+class RegistrySnapshot(object):
+    """ Read-only view of a snapshot file mapped in memory
+
+    :param path: path of the snapshot file
+    :type path: str
+    :raises: :class:`SnapshotError` when the file is not a valid snapshot
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error) as e:
+                raise SnapshotError("Cannot map %s: %s" % (path, str(e)))
+        if len(self.data) < _HEADER.size:
+            raise SnapshotError("Too short snapshot at %s" % path)
+        (magic, version, _, self.created_time, self.n_responses,
+         self.n_latencies, self.response_index, self.latency_index) = \
+            _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError("Unknown snapshot format at %s" % path)
+        end = self.latency_index + self.n_latencies * _INDEX_ENTRY.size
+        if end > len(self.data):
+            raise SnapshotError("Truncated snapshot at %s" % path)
+
+    def close(self):
+        self.data.close()
+
+    def age(self):
+        return time.time() - self.created_time
+
+    def _find(self, index_offset, n_entries, key):
+        """ binary search of the key at the index
+        :return: offset and length of the record, None if not found
+        """
+        key_hash = _key_hash(key)
+        low, high = 0, n_entries
+        while low < high:
+            mid = (low + high) // 2
+            entry_hash, offset, length = _INDEX_ENTRY.unpack_from(
+                self.data, index_offset + mid * _INDEX_ENTRY.size)
+            if entry_hash < key_hash:
+                low = mid + 1
+            else:
+                high = mid
+        while low < n_entries:
+            entry_hash, offset, length = _INDEX_ENTRY.unpack_from(
+                self.data, index_offset + low * _INDEX_ENTRY.size)
+            if entry_hash != key_hash:
+                break
+            record_key, _ = _unpack_string(self.data, offset)
+            if record_key == key:
+                return offset, length
+            low += 1
+        return None
+
+    def get_response(self, key):
+        """
+        :param key: key of :class:`ConditionalCache`
+        :return: cached response, None if not found
+        :rtype: :class:`CachedResponse`
+        """
+        found = self._find(self.response_index, self.n_responses,
+                           _key_string(key))
+        if found is None:
+            return None
+        offset = found[0]
+        _, offset = _unpack_string(self.data, offset)
+        etag, offset = _unpack_string(self.data, offset)
+        version, offset = _unpack_string(self.data, offset)
+        digest, offset = _unpack_string(self.data, offset)
+        encoding, = _ENCODING.unpack_from(self.data, offset)
+        offset += _ENCODING.size
+        length, = _STRING_LENGTH.unpack_from(self.data, offset)
+        offset += _STRING_LENGTH.size
+        payload = self.data[offset:offset+length]
+        if encoding == ENCODING_WIRE:
+            parsed = wire.decode(payload)
+        else:
+            parsed = json.loads(payload.decode("utf-8"))
+        return CachedResponse(parsed, digest, etag or None, version or None)
+
+    def get_latency(self, endpoint):
+        """
+        :return: state of each quantile estimator, None if not found
+        :rtype: list of tuple (count, heights, positions)
+        """
+        found = self._find(self.latency_index, self.n_latencies, endpoint)
+        if found is None:
+            return None
+        offset, length = found
+        _, position = _unpack_string(self.data, offset)
+        states = list()
+        while position + _QUANTILE_STATE.size <= offset + length:
+            values = _QUANTILE_STATE.unpack_from(self.data, position)
+            position += _QUANTILE_STATE.size
+            count = values[0]
+            n_markers = min(count, 5)
+            states.append((count, list(values[1:1+n_markers]),
+                           list(values[6:6+n_markers])))
+        return states
+
+    def _raw_records(self, index_offset, n_entries):
+        for index in range(n_entries):
+            _, offset, length = _INDEX_ENTRY.unpack_from(
+                self.data, index_offset + index * _INDEX_ENTRY.size)
+            key, _ = _unpack_string(self.data, offset)
+            yield key, self.data[offset:offset+length]
+
+
+def write_snapshot(path, response_cache=None, latency_registry=None,
+                   previous=None):
+    """ Write a snapshot atomically.
+
+    The new file is written next to *path*, flushed to disk, and renamed
+    over *path*. Records of the previous snapshot that are not in memory
+    are carried over, except the responses removed from *response_cache*.
+
+    :param path: path of the snapshot file
+    :type path: str
+    :param response_cache: cached responses to save
+    :type response_cache: :class:`ConditionalCache`
+    :param latency_registry: latency distributions to save
+    :type latency_registry: :class:`LatencyRegistry`
+    :param previous: snapshot loaded by this process
+    :type previous: :class:`RegistrySnapshot`
+    """
+    responses = dict()
+    latencies = dict()
+    removed = set()
+    if response_cache is not None:
+        removed = set([_key_string(key) for key in response_cache.removed_keys()])
+    if previous is not None:
+        for key, record in previous._raw_records(previous.response_index,
+                                                 previous.n_responses):
+            if key not in removed:
+                responses[key] = record
+        for key, record in previous._raw_records(previous.latency_index,
+                                                 previous.n_latencies):
+            latencies[key] = record
+    if response_cache is not None:
+        for key, entry in response_cache.items():
+            key = _key_string(key)
+            responses[key] = _pack_response(key, entry)
+    if latency_registry is not None:
+        for endpoint, tracker in latency_registry.items():
+            latencies[endpoint] = _pack_latency(endpoint, tracker.get_state())
+
+    chunks = list()
+    offset = _HEADER.size
+    indexes = list()
+    for records in (responses, latencies):
+        index = list()
+        for key, record in records.items():
+            index.append((_key_hash(key), offset, len(record)))
+            chunks.append(record)
+            offset += len(record)
+        index.sort()
+        indexes.append(index)
+    index_offsets = list()
+    for index in indexes:
+        index_offsets.append(offset)
+        for entry in index:
+            chunks.append(_INDEX_ENTRY.pack(*entry))
+            offset += _INDEX_ENTRY.size
+    header = _HEADER.pack(MAGIC, VERSION, 0, time.time(), len(responses),
+                          len(latencies), index_offsets[0], index_offsets[1])
+
+    dir_path = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".registry-", dir=dir_path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    # make the rename durable
+    try:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
@@ -0,0 +1,279 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module has cloudlet selection algorithms other than
+:meth:`ElijahCloudletSelection.select_cloudlet`.
+
+Each algorithm object has ``select_cloudlet(cloudlet_list, app_info)``, so
+its bound method can be passed as *selection_algorithm* to
+:meth:`ElijahCloudletDiscovery.discover`.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import time
+import random
+import threading
+from collections import deque
+from .base import ElijahCloudletSelection, _LOG
+from .const import AppInfoConst
+from .const import ResourceInfoConst
+from .placement import cloudlet_resource
+
+
+class LoadSpreadingSelection(object):
+    """ Spread clients over cloudlets using power-of-d choices
+
+    Sample *d* cloudlets with probability proportional to the cache score
+    and select the least loaded one. The load reported by a cloudlet is
+    stale while many clients select at once, so assignments made by this
+    object during the last *assignment_ttl* seconds are added to it, except
+    those made before the latest load report, which already counts them.
+
+    :param d: number of sampled cloudlets
+    :type d: int
+    :param assignment_ttl: seconds to remember an assignment
+    :type assignment_ttl: float
+    :param score_floor: sampling weight added to every cache score so that\
+        cloudlets without cache can be sampled
+    :type score_floor: float
+    :param load_estimate: LOAD_LATEST to use the last reported CPU usage,\
+        LOAD_SMOOTHED for its moving average, or LOAD_PREDICTED for the\
+        average extrapolated by its trend after *horizon* seconds
+    :type load_estimate: str
+    """
+
+    LOAD_LATEST     = "latest"
+    LOAD_SMOOTHED   = "smoothed"
+    LOAD_PREDICTED  = "predicted"
+
+    def __init__(self, d=2, assignment_ttl=10.0, score_floor=0.1, rand=None,
+                 load_estimate=LOAD_LATEST, horizon=10.0):
+        self.d = d
+        self.assignment_ttl = assignment_ttl
+        self.score_floor = score_floor
+        self.load_estimate = load_estimate
+        self.horizon = horizon
+        self.rand = rand or random.Random()
+        self.assignments = dict()   # endpoint -> deque of (time, CPU load)
+        self.reports = dict()       # endpoint -> (load report, time first seen)
+        self.lock = threading.Lock()
+
+    def _cache_score(self, cloudlet, app_info):
+        cloudlet_info = getattr(cloudlet, app_info.get_appid(), None) or dict()
+        return float(cloudlet_info.get(ResourceInfoConst.APP_CACHE_TOTAL_SCORE, None) or 0.0)
+
+    def _sample(self, cloudlet_list, app_info):
+        """ weighted sampling of d cloudlets without replacement
+        """
+        candidates = [(self._cache_score(c, app_info) + self.score_floor, c)
+                      for c in cloudlet_list]
+        sampled = list()
+        while candidates and len(sampled) < self.d:
+            total = sum([weight for weight, _ in candidates])
+            point = self.rand.uniform(0, total)
+            for index, (weight, cloudlet) in enumerate(candidates):
+                point -= weight
+                if point <= 0:
+                    break
+            sampled.append(candidates.pop(index)[1])
+        return sampled
+
+    def _app_load(self, cloudlet, app_info):
+        # CPU share of the cloudlet that the application will use
+        cpu_num = float(cloudlet_resource(cloudlet, ResourceInfoConst.TOTAL_CPU_NUMBER, 0) or 1)
+        app_cpu = float(getattr(app_info, AppInfoConst.REQUIRED_CPU_NUMBER, None) or 1)
+        return app_cpu / cpu_num
+
+    def reported_load(self, cloudlet):
+        """
+        :return: CPU utilization of the cloudlet between 0 and 1
+        :rtype: float
+        """
+        cpu_percent = None
+        history = getattr(cloudlet, 'history', None)
+        if history is not None:
+            field = ResourceInfoConst.TOTAL_CPU_PERCENT
+            if self.load_estimate == self.LOAD_SMOOTHED:
+                cpu_percent = history.smoothed(field)
+            elif self.load_estimate == self.LOAD_PREDICTED:
+                cpu_percent = history.predicted(field, self.horizon)
+        if cpu_percent is None:
+            cpu_percent = cloudlet_resource(cloudlet, ResourceInfoConst.TOTAL_CPU_PERCENT, 0.0)
+        return max(0.0, float(cpu_percent or 0.0)) / 100.0
+
+    def observe_report(self, cloudlet, app_info=None, now=None):
+        """ remember when a new load report of the cloudlet is first seen
+
+        :return: time of the latest load report
+        :rtype: float
+        """
+        digest = None
+        if app_info is not None:
+            digest = cloudlet.detail_digests.get(app_info.get_appid(), None)
+        report = (digest, self.reported_load(cloudlet))
+        with self.lock:
+            last_report = self.reports.get(cloudlet.REST_endpoint, None)
+            if last_report is not None and last_report[0] == report:
+                return last_report[1]
+            report_time = now or time.time()
+            self.reports[cloudlet.REST_endpoint] = (report, report_time)
+            return report_time
+
+    def recent_load(self, endpoint, now=None):
+        """
+        :return: CPU utilization assigned by this object during the last\
+            *assignment_ttl* seconds and after the latest load report
+        :rtype: float
+        """
+        now = now or time.time()
+        with self.lock:
+            assigned = self.assignments.get(endpoint, None)
+            if not assigned:
+                return 0.0
+            since = now - self.assignment_ttl
+            last_report = self.reports.get(endpoint, None)
+            if last_report is not None:
+                since = max(since, last_report[1])
+            while assigned and assigned[0][0] < since:
+                assigned.popleft()
+            return sum([load for _, load in assigned])
+
+    def load(self, cloudlet, app_info=None):
+        self.observe_report(cloudlet, app_info)
+        return self.reported_load(cloudlet) + self.recent_load(cloudlet.REST_endpoint)
+
+    def record_assignment(self, cloudlet, load):
+        with self.lock:
+            assigned = self.assignments.setdefault(cloudlet.REST_endpoint, deque())
+            assigned.append((time.time(), load))
+
+    def select_cloudlet(self, cloudlet_list, app_info):
+        """ Select one cloudlet using application information
+
+        :param cloudlet_list : list of promising cloudlet
+        :type cloudlet_list: list of :class:`Cloudlet` object
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        """
+        filtered_cloudlet = ElijahCloudletSelection.filter_cloudlets(cloudlet_list, app_info)
+        if len(filtered_cloudlet) == 0:
+            _LOG.warning("No available cloudlet meeting condition")
+            return None
+
+        selected = None
+        min_load = None
+        for cloudlet in self._sample(filtered_cloudlet, app_info):
+            load = self.load(cloudlet, app_info)
+            if min_load is None or load < min_load:
+                min_load, selected = load, cloudlet
+        self.record_assignment(selected, self._app_load(selected, app_info))
+        return selected
+
+
+class TimeToReadySelection(object):
+    """ Select the cloudlet predicted to be ready soonest
+
+    For an application that needs provisioning, the time to ready of a
+    cloudlet is predicted as::
+
+        RTT + overlay size x (1 - cache hit fraction) / throughput
+            + launch time / idle CPU ratio
+
+    The cache hit fraction is the share of ``required-files`` and
+    ``required-URLs`` of the application found at ``app_cache_files`` and
+    ``app_cache_urls`` of the cloudlet. The throughput is estimated
+    passively from queries and provisioning transfers to the cloudlet.
+
+    :param default_bandwidth: throughput in bytes per second to a cloudlet\
+        without any transfer yet
+    :type default_bandwidth: float
+    :param launch_time: seconds to resume a VM at an idle cloudlet
+    :type launch_time: float
+    :param min_idle: lower bound of the idle CPU ratio
+    :type min_idle: float
+    """
+
+    def __init__(self, default_bandwidth=1.25e6, launch_time=2.0,
+                 default_rtt_ms=50.0, min_idle=0.1):
+        self.default_bandwidth = default_bandwidth
+        self.launch_time = launch_time
+        self.default_rtt_ms = default_rtt_ms
+        self.min_idle = min_idle
+
+    @staticmethod
+    def _resource(cloudlet, cloudlet_info, key, default):
+        value = cloudlet_info.get(key, None)
+        if value is None:
+            value = cloudlet_resource(cloudlet, key, default)
+        return value
+
+    def cache_hit_fraction(self, cloudlet_info, app_info):
+        """
+        :return: share of the required files and URLs cached at the cloudlet
+        :rtype: float
+        """
+        required = list(getattr(app_info, AppInfoConst.REQUIRED_CACHE_FILES, None) or list())
+        required += list(getattr(app_info, AppInfoConst.REQUIRED_CACHE_URLS, None) or list())
+        if not required:
+            return 0.0
+        cached = set(cloudlet_info.get(ResourceInfoConst.APP_CACHE_FILES, None) or list())
+        cached.update(cloudlet_info.get(ResourceInfoConst.APP_CACHE_URLS, None) or list())
+        hits = len([item for item in required if item in cached])
+        return hits / float(len(required))
+
+    def bandwidth(self, cloudlet):
+        throughput = getattr(cloudlet, 'throughput', None)
+        if throughput is None:
+            return self.default_bandwidth
+        return throughput.estimate(self.default_bandwidth)
+
+    def time_to_ready(self, cloudlet, app_info):
+        """
+        :return: predicted seconds until the application runs at the cloudlet
+        :rtype: float
+        """
+        cloudlet_info = getattr(cloudlet, app_info.get_appid(), None) or dict()
+        rtt_ms = self._resource(cloudlet, cloudlet_info,
+                                ResourceInfoConst.RTT_BETWEEN_CLIENT,
+                                self.default_rtt_ms)
+        overlay_size = float(getattr(app_info, AppInfoConst.OVERLAY_SIZE, None) or 0)
+        transfer_size = overlay_size * (1 - self.cache_hit_fraction(cloudlet_info, app_info))
+        cpu_percent = self._resource(cloudlet, cloudlet_info,
+                                     ResourceInfoConst.TOTAL_CPU_PERCENT, 0.0)
+        idle = max(self.min_idle, 1 - float(cpu_percent or 0.0) / 100.0)
+        return float(rtt_ms or 0.0) / 1000.0 + \
+            transfer_size / self.bandwidth(cloudlet) + \
+            self.launch_time / idle
+
+    def select_cloudlet(self, cloudlet_list, app_info):
+        """ Select one cloudlet using application information
+
+        :param cloudlet_list : list of promising cloudlet
+        :type cloudlet_list: list of :class:`Cloudlet` object
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        """
+        filtered_cloudlet = ElijahCloudletSelection.filter_cloudlets(cloudlet_list, app_info)
+        if len(filtered_cloudlet) == 0:
+            _LOG.warning("No available cloudlet meeting condition")
+            return None
+        ranked = sorted([(self.time_to_ready(c, app_info), index, c)
+                         for index, c in enumerate(filtered_cloudlet)])
+        return ranked[0][2]
@@ -0,0 +1,215 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module memoizes cloudlet selection decisions.
+
+A decision is keyed by (app fingerprint, candidate set, location cell)
+and depends on the detail record of every candidate. Detail records are
+observed as they arrive, e.g. by the threads querying the cloudlets, and
+when the record of a cloudlet changes, only the decisions that used the
+cloudlet are dropped. A cache hit therefore does not look at the records
+of the candidates.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class SelectionCache(object):
+    """ Cache of selection decisions
+
+    The detail records of the candidates must be observed with
+    :meth:`observe` when they are set, as :class:`ElijahCloudletDiscovery`
+    does; a hit does not check them again. A miss observes every candidate
+    anyway. Decisions are memoized for at least *min_candidates*
+    candidates; a single candidate is selected directly.
+
+    :param cell_size: size of a location cell in degrees of GPS coordinates
+    :type cell_size: float
+    :param max_entries: maximum number of cached decisions, and of tracked\
+        detail records
+    :type max_entries: int
+    :param min_candidates: minimum number of candidates to memoize a decision
+    :type min_candidates: int
+    """
+
+    def __init__(self, cell_size=0.01, max_entries=10000, min_candidates=2):
+        self.cell_size = cell_size
+        self.max_entries = max_entries
+        self.min_candidates = min_candidates
+        self.entries = OrderedDict()    # key -> (selected endpoint, dep keys)
+        self.dependents = dict()        # (endpoint, app ID) -> set of keys
+        self.detail_versions = OrderedDict()    # (endpoint, app ID) -> (digest, version)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def app_fingerprint(app_info):
+        app_data = json.dumps(app_info.__dict__, sort_keys=True)
+        return hashlib.sha1(app_data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _app_key(app_info):
+        """ app fingerprint without serializing the plain attributes
+        """
+        items = tuple(sorted([(k, tuple(v) if isinstance(v, list) else v)
+                              for k, v in app_info.__dict__.items()]))
+        try:
+            hash(items)
+        except TypeError:
+            return SelectionCache.app_fingerprint(app_info)
+        return items
+
+    def location_cell(self, client_info=None, app_info=None):
+        """ quantize the location of the client into a cell
+        """
+        infos = [info.__dict__ for info in (client_info, app_info)
+                 if info is not None]
+        for info in infos:
+            latitude = info.get("GPS_latitude", None)
+            longitude = info.get("GPS_longitude", None)
+            if latitude is not None and longitude is not None:
+                return (int(math.floor(float(latitude) / self.cell_size)),
+                        int(math.floor(float(longitude) / self.cell_size)))
+        for info in infos:
+            ip_address = info.get("ip_address", None) or info.get("client_ip", None)
+            if ip_address:
+                return ip_address
+        return None
+
+    def _drop(self, key):
+        """ drop a decision and its references from the dependents
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for dep_key in entry[1]:
+            keys = self.dependents.get(dep_key, None)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self.dependents[dep_key]
+
+    def _drop_dependents(self, dep_key):
+        for key in list(self.dependents.pop(dep_key, ())):
+            self._drop(key)
+
+    def observe(self, cloudlet, app_id):
+        """ Record the detail record of the cloudlet for the application,
+        dropping the decisions that depend on its previous version
+
+        :type cloudlet: :class:`Cloudlet`
+        :param app_id: application ID of the detail record
+        :type app_id: str
+        """
+        with self.lock:
+            self._observe(cloudlet, app_id)
+
+    def _observe(self, cloudlet, app_id):
+        """ update the version of the cloudlet detail record and drop
+        decisions that depend on the previous version. Called with the
+        lock held.
+        """
+        dep_key = (cloudlet.REST_endpoint, app_id)
+        digest = cloudlet.detail_digests.get(app_id, None)
+        prev_digest, version = self.detail_versions.get(dep_key, (None, 0))
+        if digest == prev_digest and dep_key in self.detail_versions:
+            return version
+        version += 1
+        self._drop_dependents(dep_key)
+        self.detail_versions.pop(dep_key, None)
+        self.detail_versions[dep_key] = (digest, version)
+        while len(self.detail_versions) > self.max_entries:
+            # decisions can not be validated without the record version
+            evicted, _ = self.detail_versions.popitem(last=False)
+            self._drop_dependents(evicted)
+        return version
+
+    def select(self, cloudlet_list, app_info, selection_algorithm,
+               client_info=None):
+        """ Return the cached decision or run *selection_algorithm*.
+        The algorithm must be deterministic.
+
+        :param cloudlet_list: list of cloudlets with detail records, each\
+            observed by :meth:`observe`
+        :type cloudlet_list: list of :class:`Cloudlet` object
+        :param selection_algorithm: selection_algorithm(cloudlet_list, app_info)
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        """
+        if len(cloudlet_list) < self.min_candidates:
+            return selection_algorithm(cloudlet_list, app_info)
+
+        app_id = app_info.get_appid()
+        endpoints = [c.REST_endpoint for c in cloudlet_list]
+        key = (self._app_key(app_info), frozenset(endpoints),
+               self.location_cell(client_info, app_info))
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.hits += 1
+                if entry[0] is None:
+                    return None
+                return cloudlet_list[endpoints.index(entry[0])]
+            self.misses += 1
+            for cloudlet in cloudlet_list:
+                self._observe(cloudlet, app_id)
+
+        cloudlet = selection_algorithm(cloudlet_list, app_info)
+
+        with self.lock:
+            # skip caching if any detail record changed in the meantime
+            for candidate in cloudlet_list:
+                dep_key = (candidate.REST_endpoint, app_id)
+                digest = candidate.detail_digests.get(app_id, None)
+                if self.detail_versions.get(dep_key, (None, 0))[0] != digest:
+                    return cloudlet
+            dep_keys = tuple((endpoint, app_id) for endpoint in key[1])
+            self._drop(key)
+            self.entries[key] = (cloudlet.REST_endpoint if cloudlet else None,
+                                 dep_keys)
+            for dep_key in dep_keys:
+                self.dependents.setdefault(dep_key, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+        return cloudlet
+
+    def invalidate(self, endpoint=None, app_id=None):
+        """ drop decisions depending on the cloudlet, or every decision
+        """
+        with self.lock:
+            if endpoint is None:
+                self.entries.clear()
+                self.dependents.clear()
+                self.detail_versions.clear()
+                return
+            for dep_key in list(self.detail_versions.keys()):
+                if dep_key[0] != endpoint:
+                    continue
+                if app_id is not None and dep_key[1] != app_id:
+                    continue
+                self._drop_dependents(dep_key)
+                del self.detail_versions[dep_key]
@@ -0,0 +1,136 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module coalesces concurrent identical requests.
+
+The first caller of a key runs the request, and the callers arriving
+while it is in flight wait for its outcome instead of sending their own.
+Every caller gets the same return value, or the same exception. The key
+is forgotten as soon as the request completes, so a later caller always
+sends a new request; nothing is cached here.
+
+A waiting caller can give up after its own *timeout* without disturbing
+the others.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import threading
+
+
+class SingleFlightError(Exception):
+    pass
+
+
+class CallCancelled(SingleFlightError):
+    pass
+
+
+class CallTimeout(SingleFlightError):
+    pass
+
+
+class Call(object):
+    """ A request in flight and its outcome
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        if self.done.is_set():
+            return False
+        self.result = result
+        self.error = error
+        self.done.set()
+        return True
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight(object):
+    """ Thread-safe map of key to the :class:`Call` in flight
+    """
+
+    def __init__(self):
+        self.calls = dict()
+        self.lock = threading.Lock()
+        self.n_calls = 0
+        self.n_shared = 0
+
+    def do(self, key, func, timeout=None):
+        """ Run *func* unless a call of *key* is in flight, and return its
+        outcome
+
+        :param key: hashable key of identical requests
+        :param func: function without argument sending the request
+        :param timeout: seconds to wait for a call in flight. None to wait\
+            until it completes.
+        :type timeout: float
+        :return: return value of *func*
+        :raises: exception of *func*, :class:`CallCancelled` when the call\
+            is interrupted, or :class:`CallTimeout` when *timeout* expires
+        """
+        with self.lock:
+            call = self.calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = Call(key)
+                self.calls[key] = call
+                self.n_calls += 1
+            else:
+                self.n_shared += 1
+
+        if leader:
+            result = error = None
+            completed = False
+            try:
+                result = func()
+                completed = True
+            except Exception as e:
+                error = e
+                completed = True
+            finally:
+                # forget the key before releasing waiters so that no caller
+                # joins the call after it completes, and release them even
+                # if func is interrupted
+                self._forget(call)
+                if not completed:
+                    error = CallCancelled("Call of %r is interrupted" % (key,))
+                call.finish(result, error)
+            return call.outcome()
+
+        if not call.done.wait(timeout):
+            raise CallTimeout("Call of %r is not done in %.1f s" % (key, timeout))
+        return call.outcome()
+
+    def _forget(self, call):
+        with self.lock:
+            if self.calls.get(call.key, None) is call:
+                del self.calls[call.key]
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
@@ -0,0 +1,247 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module keeps the cloudlet choice of moving clients up to date.
+
+Subscriptions of the same application in the same location cell share one
+set of candidate cloudlets with their detail records. The directory query
+and the fan-out to the candidates run only when a client enters a cell
+whose candidates are unknown or older than *ttl*, and once for all the
+clients in that cell. The cost of a candidate is computed again only when
+its detail record changes. A client leaves its current cloudlet only for
+one whose cost is lower by more than the *hysteresis* ratio, so the choice
+does not flap between cloudlets of similar cost.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import time
+import threading
+from collections import OrderedDict
+from .base import ElijahCloudletSelection, CloudletException, _LOG
+from .selection import TimeToReadySelection
+from .selection_cache import SelectionCache
+
+
+class CandidateSet(object):
+    """ Candidate cloudlets of an application at a location cell
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.cloudlet_list = None
+        self.fetched_time = None
+        self.generation = 0
+        self.costs = dict()     # endpoint -> (detail digest, cost)
+        self.lock = threading.Lock()
+
+    def expired(self, ttl, now=None):
+        if self.fetched_time is None:
+            return True
+        return (now or time.time()) - self.fetched_time > ttl
+
+
+class Subscription(object):
+    """ Cloudlet choice of a client kept up to date with its location.
+    *callback(subscription, cloudlet)* is called whenever the choice changes.
+    """
+
+    def __init__(self, manager, client_info, app_info, callback):
+        self.manager = manager
+        self.client_info = client_info
+        self.app_info = app_info
+        self.callback = callback
+        self.candidates = None
+        self.generation = None
+        self.selected = None
+        self.active = True
+
+    def update(self, **kwargs):
+        """ Update client information such as GPS_latitude and GPS_longitude
+
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        """
+        for k, v in kwargs.items():
+            setattr(self.client_info, k, v)
+        return self.manager.evaluate(self)
+
+    def update_location(self, latitude, longitude):
+        return self.update(GPS_latitude=latitude, GPS_longitude=longitude)
+
+    def cancel(self):
+        self.active = False
+
+
+class SubscriptionManager(object):
+    """ Shared state of the subscriptions of a discovery object
+
+    :param discovery: discovery object querying the candidates
+    :type discovery: :class:`ElijahCloudletDiscovery`
+    :param ttl: seconds until the candidates of a cell are queried again
+    :type ttl: float
+    :param hysteresis: relative cost improvement needed to leave the\
+        current cloudlet
+    :type hysteresis: float
+    :param cost_function: cost_function(cloudlet, app_info), lower is better.\
+        Default is the time to ready of :class:`TimeToReadySelection`.
+    :param cell_size: size of a location cell in degrees of GPS coordinates.\
+        Default is the one of the selection cache of *discovery*.
+    :type cell_size: float
+    """
+
+    def __init__(self, discovery, ttl=30.0, hysteresis=0.2,
+                 cost_function=None, cell_size=None, max_cells=1024):
+        self.discovery = discovery
+        self.ttl = ttl
+        self.hysteresis = hysteresis
+        self.cost_function = cost_function or TimeToReadySelection().time_to_ready
+        self.cells = SelectionCache(cell_size) if cell_size else \
+            (discovery.selection_cache or SelectionCache())
+        self.max_cells = max_cells
+        self.candidate_sets = OrderedDict()
+        self.lock = threading.Lock()
+        self.n_refreshes = 0
+
+    def subscribe(self, client_info, app_info, callback):
+        subscription = Subscription(self, client_info, app_info, callback)
+        self.evaluate(subscription)
+        return subscription
+
+    def _candidate_set(self, cell, app_info):
+        key = (cell, self.cells.app_fingerprint(app_info))
+        with self.lock:
+            candidate_set = self.candidate_sets.pop(key, None)
+            if candidate_set is None:
+                candidate_set = CandidateSet(key)
+            self.candidate_sets[key] = candidate_set
+            while len(self.candidate_sets) > self.max_cells:
+                self.candidate_sets.popitem(last=False)
+            return candidate_set
+
+    def _refresh(self, candidate_set, client_info, app_info):
+        """ query the candidates of the cell and their details once for
+        every subscription in the cell
+        """
+        with candidate_set.lock:
+            if not candidate_set.expired(self.ttl):
+                return
+            discovery = self.discovery
+            try:
+                cloudlet_list = discovery._find_candidates(app_info, client_info)
+                discovery._get_cloudlet_details(cloudlet_list, app_info,
+                                                discovery.health_registry,
+                                                discovery.latency_registry,
+                                                discovery.response_cache,
+                                                discovery.history_registry,
+                                                discovery.throughput_registry,
+                                                discovery.single_flight,
+                                                discovery.flight_timeout,
+                                                discovery.selection_cache)
+                cloudlet_list = [c for c in cloudlet_list if not c.query_error]
+                cloudlet_list = ElijahCloudletSelection.filter_cloudlets(
+                    cloudlet_list, app_info)
+                costs = self._costs(candidate_set, cloudlet_list, app_info)
+            except Exception as e:
+                # a socket or decoding error is as transient as a failed
+                # query. Do not let it end the updates of the subscriptions
+                expected = isinstance(e, CloudletException)
+                if candidate_set.cloudlet_list is None:
+                    if expected:
+                        raise
+                    _LOG.warning("Failed to query candidates of %s",
+                                 candidate_set.key[0], exc_info=True)
+                    raise CloudletException("Failed to query candidates: %s" % e)
+                # keep serving the previous candidates until the next ttl
+                _LOG.warning("Keep stale candidates of %s: %s",
+                             candidate_set.key[0], e, exc_info=not expected)
+                candidate_set.fetched_time = time.time()
+                return
+            self.n_refreshes += 1
+            candidate_set.cloudlet_list = cloudlet_list
+            candidate_set.costs = costs
+            candidate_set.fetched_time = time.time()
+            candidate_set.generation += 1
+
+    def _costs(self, candidate_set, cloudlet_list, app_info):
+        """ cost of each candidate, computed again only for the candidates
+        whose detail record changed
+        """
+        app_id = app_info.get_appid()
+        costs = dict()
+        for cloudlet in cloudlet_list:
+            digest = cloudlet.detail_digests.get(app_id, None)
+            prev = candidate_set.costs.get(cloudlet.REST_endpoint, None)
+            if prev is not None and digest is not None and prev[0] == digest:
+                costs[cloudlet.REST_endpoint] = prev
+            else:
+                costs[cloudlet.REST_endpoint] = \
+                    (digest, self.cost_function(cloudlet, app_info))
+        return costs
+
+    def _choose(self, subscription, candidate_set):
+        """ the cheapest candidate, unless the current one is close enough
+        """
+        best = None
+        best_cost = None
+        for cloudlet in candidate_set.cloudlet_list:
+            cost = candidate_set.costs[cloudlet.REST_endpoint][1]
+            if best_cost is None or cost < best_cost:
+                best, best_cost = cloudlet, cost
+        current = subscription.selected
+        if current is None or best is None:
+            return best
+        for cloudlet in candidate_set.cloudlet_list:
+            if cloudlet.REST_endpoint == current.REST_endpoint:
+                cost = candidate_set.costs[cloudlet.REST_endpoint][1]
+                if cost <= best_cost * (1 + self.hysteresis):
+                    return cloudlet
+                break
+        return best
+
+    def evaluate(self, subscription):
+        """ Re-evaluate the choice of a subscription after its update
+
+        :return: selected cloudlet
+        :rtype: :class:`Cloudlet` object
+        :raises: :class:`CloudletException` when no candidate is known
+        """
+        if not subscription.active:
+            return subscription.selected
+        cell = self.cells.location_cell(subscription.client_info,
+                                        subscription.app_info)
+        candidate_set = self._candidate_set(cell, subscription.app_info)
+        if candidate_set.expired(self.ttl):
+            self._refresh(candidate_set, subscription.client_info,
+                          subscription.app_info)
+        if candidate_set is subscription.candidates and \
+                candidate_set.generation == subscription.generation:
+            return subscription.selected
+
+        with candidate_set.lock:
+            selected = self._choose(subscription, candidate_set)
+            subscription.candidates = candidate_set
+            subscription.generation = candidate_set.generation
+        previous = subscription.selected
+        subscription.selected = selected
+        previous_endpoint = previous.REST_endpoint if previous else None
+        selected_endpoint = selected.REST_endpoint if selected else None
+        if previous_endpoint != selected_endpoint or previous is None:
+            subscription.callback(subscription, selected)
+        return selected
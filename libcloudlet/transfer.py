@@ -0,0 +1,494 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module transfers VM overlays with Merkle tree verification.
+
+A VM overlay is published with a manifest at *<overlay URL>.merkle*, a JSON
+object with the chunk size, the overlay size, the SHA-256 hash of every
+chunk, and the Merkle root over those hashes. The manifest is trusted only
+when its hashes produce the root, which can also be pinned by the caller.
+
+The overlay is downloaded in a single stream. Each chunk is handed to a
+pool of worker threads that verify it and write it at its offset while
+the next chunks are being received, so no second pass over the data is
+needed. Chunks that are corrupted or not received, e.g. after a
+disconnect, are fetched again with one range request per run of
+consecutive chunks; the run up to the end of the overlay is an open-ended
+range. When the server ignores ranges, the missing chunks are taken from
+one more pass over the whole overlay. Chunks that are available locally,
+e.g. in an overlay cache, are verified and written first, and only the
+rest is fetched.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import os
+import json
+import base64
+import socket
+import hashlib
+import httplib
+import binascii
+import threading
+import Queue
+from urlparse import urlparse
+from contextlib import closing
+from .const import OverlayConst, HTTPConst
+from .imaging import _pwrite
+
+
+CHUNK_SIZE = 1024 * 1024
+
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+class TransferError(Exception):
+    pass
+
+
+class IntegrityError(TransferError):
+    pass
+
+
+class MerkleTree(object):
+    """ Merkle tree over the hashes of fixed-size chunks
+
+    :param leaves: hash of each chunk
+    :type leaves: list of bytes
+    """
+
+    def __init__(self, leaves):
+        self.leaves = list(leaves)
+        self.levels = [self.leaves]
+        level = self.leaves
+        while len(level) > 1:
+            parents = list()
+            for index in range(0, len(level) - 1, 2):
+                parents.append(hashlib.sha256(
+                    _NODE_PREFIX + level[index] + level[index+1]).digest())
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+            level = parents
+
+    def __len__(self):
+        return len(self.leaves)
+
+    @staticmethod
+    def leaf_hash(data):
+        return hashlib.sha256(_LEAF_PREFIX + data).digest()
+
+    def root(self):
+        if not self.leaves:
+            return hashlib.sha256(b"").digest()
+        return self.levels[-1][0]
+
+    def hex_root(self):
+        return binascii.hexlify(self.root()).decode("ascii")
+
+    def verify_chunk(self, index, data):
+        return self.leaf_hash(data) == self.leaves[index]
+
+    def to_manifest(self, chunk_size, size):
+        return {OverlayConst.KEY_CHUNK_SIZE: chunk_size,
+                OverlayConst.KEY_SIZE: size,
+                OverlayConst.KEY_ROOT: self.hex_root(),
+                OverlayConst.KEY_HASHES: [binascii.hexlify(leaf).decode("ascii")
+                                          for leaf in self.leaves]}
+
+    @classmethod
+    def from_manifest(cls, manifest, expected_root=None):
+        """ Build the tree from a manifest after checking its root
+
+        :param expected_root: hex Merkle root pinned by the caller
+        :type expected_root: str
+        :raises: :class:`IntegrityError` when the root does not match
+        """
+        try:
+            leaves = [binascii.unhexlify(leaf)
+                      for leaf in manifest[OverlayConst.KEY_HASHES]]
+            root = manifest[OverlayConst.KEY_ROOT]
+        except (KeyError, TypeError, ValueError) as e:
+            raise IntegrityError("Invalid manifest: %s" % str(e))
+        tree = cls(leaves)
+        if tree.hex_root() != root:
+            raise IntegrityError("Chunk hashes do not match the manifest root")
+        if expected_root and expected_root != root:
+            raise IntegrityError("Manifest root %s is not the expected %s" % \
+                                 (root, expected_root))
+        return tree
+
+    @classmethod
+    def from_file(cls, path, chunk_size=CHUNK_SIZE):
+        """ Build the tree of a local overlay to publish its manifest
+        """
+        leaves = list()
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                leaves.append(cls.leaf_hash(data))
+        return cls(leaves)
+
+
+class ChunkVerifier(threading.Thread):
+    """ Worker thread verifying and writing received chunks.
+    Each worker has its own file descriptor, so the writes do not share a
+    file offset when pwrite is not available.
+    """
+
+    def __init__(self, transfer):
+        self.transfer = transfer
+        threading.Thread.__init__(self, target=self.run)
+        self.daemon = True
+
+    def run(self):
+        """ thread main method. An error stops the transfer, but the worker
+        keeps taking chunks so that nobody waits on the queue.
+        """
+        transfer = self.transfer
+        fd = None
+        try:
+            fd = os.open(transfer.dest_path, os.O_WRONLY)
+        except (IOError, OSError) as e:
+            transfer._fail(e)
+        try:
+            while True:
+                item = transfer.chunk_queue.get()
+                try:
+                    if item is None:
+                        break
+                    if fd is not None:
+                        index, data = item
+                        transfer.process_chunk(index, data, fd)
+                except Exception as e:
+                    transfer._fail(e)
+                finally:
+                    transfer.chunk_queue.task_done()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+
+class OverlayTransfer(object):
+    """ Download a VM overlay verifying its chunks as they arrive
+
+    :param overlay_URL: Downloadable URL of the VM overlay
+    :type overlay_URL: str
+    :param dest_path: path to save the overlay
+    :type dest_path: str
+    :param expected_root: hex Merkle root pinned by the caller
+    :type expected_root: str
+    :param n_workers: number of verifying threads
+    :type n_workers: int
+    :param max_retries: number of passes over the missing chunks without\
+        any progress before giving up
+    :type max_retries: int
+    :param max_ranges: maximum number of range requests in a pass. More\
+        runs of missing chunks are fetched in a single range.
+    :type max_ranges: int
+    :param progress: progress(verified bytes, overlay size) called after\
+        each verified chunk
+    """
+
+    def __init__(self, overlay_URL, dest_path, overlay_account=None,
+                 overlay_key=None, expected_root=None, n_workers=4,
+                 max_retries=3, timeout=10, queue_size=16, progress=None,
+                 max_ranges=16):
+        self.overlay_URL = overlay_URL
+        self.dest_path = dest_path
+        self.expected_root = expected_root
+        self.n_workers = n_workers
+        self.max_retries = max_retries
+        self.max_ranges = max_ranges
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.progress = progress
+        self.headers = dict()
+        if overlay_account is not None:
+            credential = "%s:%s" % (overlay_account, overlay_key or "")
+            self.headers["Authorization"] = "Basic %s" % \
+                base64.b64encode(credential.encode("utf-8")).decode("ascii")
+        self.tree = None
+        self.chunk_size = None
+        self.size = None
+        self.fd = None
+        self.chunk_queue = None
+        self.workers = list()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.corrupted = set()
+        self.verified = set()
+        self.range_supported = True
+        self.bytes_verified = 0
+        self.bytes_reused = 0
+        self.manifest = None
+        self.manifest_etag = None
+        self.error = None
+
+    def _get(self, URL, headers=None):
+        """ send GET request
+        :return: connection and its response
+        """
+        end_point = urlparse(URL)
+        if end_point.scheme == "https":
+            conn = httplib.HTTPSConnection(end_point.hostname, end_point.port,
+                                           timeout=self.timeout)
+        else:
+            conn = httplib.HTTPConnection(end_point.hostname, end_point.port,
+                                          timeout=self.timeout)
+        path = end_point.path
+        if end_point.query:
+            path = "%s?%s" % (path, end_point.query)
+        request_headers = dict(self.headers)
+        request_headers.update(headers or dict())
+        try:
+            conn.request("GET", path, None, request_headers)
+            response = conn.getresponse()
+        except:
+            conn.close()
+            raise
+        if response.status not in (httplib.OK, httplib.PARTIAL_CONTENT,
+                                   httplib.NOT_MODIFIED):
+            conn.close()
+            raise TransferError("Cannot get %s: %d %s" % \
+                                (URL, response.status, response.reason))
+        return conn, response
+
+    def fetch_manifest(self, etag=None):
+        """ Fetch the manifest and build its Merkle tree
+
+        :param etag: ETag of a manifest fetched before
+        :type etag: str
+        :return: Merkle tree, or None if the manifest is not modified since *etag*
+        :rtype: :class:`MerkleTree`
+        """
+        URL = self.overlay_URL + OverlayConst.MANIFEST_SUFFIX
+        headers = {HTTPConst.HEADER_IF_NONE_MATCH: etag} if etag else None
+        conn, response = self._get(URL, headers)
+        with closing(conn):
+            if response.status == httplib.NOT_MODIFIED:
+                return None
+            self.manifest_etag = response.getheader(HTTPConst.HEADER_ETAG, None)
+            try:
+                manifest = json.loads(response.read())
+            except ValueError as e:
+                raise IntegrityError("Invalid manifest at %s: %s" % (URL, str(e)))
+        self.tree = MerkleTree.from_manifest(manifest, self.expected_root)
+        self.manifest = manifest
+        self.chunk_size = int(manifest[OverlayConst.KEY_CHUNK_SIZE])
+        self.size = int(manifest[OverlayConst.KEY_SIZE])
+        n_chunks = (self.size + self.chunk_size - 1) // self.chunk_size
+        if n_chunks != len(self.tree):
+            raise IntegrityError("Manifest has %d hashes for %d chunks" % \
+                                 (len(self.tree), n_chunks))
+        return self.tree
+
+    def process_chunk(self, index, data, fd=None):
+        """ verify a chunk and write it at its offset
+        :return: True if the chunk is valid
+        """
+        if not self.tree.verify_chunk(index, data):
+            with self.lock:
+                self.corrupted.add(index)
+            return False
+        try:
+            _pwrite(fd or self.fd, data, index * self.chunk_size)
+        except (IOError, OSError) as e:
+            with self.lock:
+                self.corrupted.add(index)
+            self._fail(e)
+            return False
+        with self.lock:
+            self.corrupted.discard(index)
+            if index in self.verified:
+                return True
+            self.verified.add(index)
+            self.bytes_verified += len(data)
+            bytes_verified = self.bytes_verified
+        if self.progress is not None:
+            self.progress(bytes_verified, self.size)
+        return True
+
+    def _fail(self, error):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.stop_event.set()
+
+    def _put(self, item):
+        """ queue a chunk without blocking forever on stopped workers
+        """
+        while True:
+            if self.stop_event.is_set():
+                raise TransferError("Cannot write %s: %s" % \
+                                    (self.dest_path, str(self.error)))
+            try:
+                self.chunk_queue.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                if not any([worker.is_alive() for worker in self.workers]):
+                    self._fail(TransferError("Every verifying worker stopped"))
+
+    def _missing(self):
+        with self.lock:
+            return [index for index in range(len(self.tree))
+                    if index not in self.verified]
+
+    def _runs(self, missing):
+        """ group sorted chunk indexes into runs of consecutive chunks
+        :return: list of (first, last) chunk indexes
+        """
+        runs = list()
+        for index in missing:
+            if runs and runs[-1][1] == index - 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+        if len(runs) > self.max_ranges:
+            runs = [[missing[0], missing[-1]]]
+        return runs
+
+    def _stream(self, first=0, last=None):
+        """ receive chunks from *first* to *last* in a single request and
+        queue the ones not verified yet. The whole overlay is received when
+        the server does not support ranges.
+        :return: index of the first chunk not received
+        """
+        n_chunks = len(self.tree)
+        if last is None:
+            last = n_chunks - 1
+        headers = None
+        if self.range_supported and (first > 0 or last < n_chunks - 1):
+            end = ""
+            if last < n_chunks - 1:
+                end = "%d" % (min((last + 1) * self.chunk_size, self.size) - 1)
+            headers = {"Range": "bytes=%d-%s" % (first * self.chunk_size, end)}
+        try:
+            conn, response = self._get(self.overlay_URL, headers)
+        except (socket.error, httplib.HTTPException, TransferError):
+            return first
+        index = first
+        if response.status != httplib.PARTIAL_CONTENT:
+            if headers is not None:
+                self.range_supported = False
+            index, last = 0, n_chunks - 1
+        with closing(conn):
+            while index <= last:
+                length = min(self.chunk_size, self.size - index * self.chunk_size)
+                try:
+                    data = response.read(length)
+                except (socket.error, httplib.HTTPException):
+                    break
+                if len(data) != length:
+                    break
+                if index not in self.verified:
+                    self._put((index, data))
+                index += 1
+        return index
+
+    def _reuse(self, chunk_source):
+        """ write the chunks available locally
+        """
+        for index, leaf in enumerate(self.tree.leaves):
+            data = chunk_source(leaf)
+            if data is not None and self.process_chunk(index, data):
+                self.bytes_reused += len(data)
+        with self.lock:
+            self.corrupted.clear()
+
+    def run(self, chunk_source=None):
+        """ Download and verify the overlay
+
+        :param chunk_source: chunk_source(chunk hash) returning the chunk\
+            of the hash if it is available locally, or None
+        :return: Merkle tree of the overlay
+        :rtype: :class:`MerkleTree`
+        :raises: :class:`TransferError` when the overlay cannot be\
+            downloaded, or :class:`IntegrityError` when a chunk stays corrupted
+        """
+        if self.tree is None:
+            self.fetch_manifest()
+        self.fd = os.open(self.dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(self.fd, self.size)
+            if chunk_source is not None:
+                self._reuse(chunk_source)
+            missing = self._missing()
+            if missing:
+                self._fetch(missing)
+            if self.error is not None:
+                raise TransferError("Cannot write %s: %s" % \
+                                    (self.dest_path, str(self.error)))
+            missing = self._missing()
+            if missing:
+                raise IntegrityError("%d chunks of %s are corrupted or not "\
+                                     "received after %d retries, e.g. chunk %d" % \
+                                     (len(missing), self.overlay_URL,
+                                      self.max_retries, missing[0]))
+            os.fsync(self.fd)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+        return self.tree
+
+    def _fetch(self, missing):
+        """ stream the missing chunks to the verifying workers until every
+        chunk is verified, or passes stop making progress
+        """
+        self.chunk_queue = Queue.Queue(maxsize=self.queue_size)
+        self.workers = [ChunkVerifier(self) for _ in range(self.n_workers)]
+        for worker in self.workers:
+            worker.start()
+        try:
+            n_failures = 0
+            while missing and n_failures < self.max_retries:
+                n_verified = len(self.verified)
+                for first, last in self._runs(missing):
+                    self._stream(first, last)
+                    if not self.range_supported:
+                        # a pass over the whole overlay covers every run
+                        break
+                self._drain()
+                if self.stop_event.is_set():
+                    break
+                missing = self._missing()
+                if len(self.verified) == n_verified:
+                    n_failures += 1
+        except TransferError:
+            pass
+        finally:
+            alive = [worker for worker in self.workers if worker.is_alive()]
+            for _ in alive:
+                self.chunk_queue.put(None)
+            for worker in self.workers:
+                worker.join()
+
+    def _drain(self):
+        """ wait until the queued chunks are verified
+        """
+        queue = self.chunk_queue
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks:
+                if not any([worker.is_alive() for worker in self.workers]):
+                    self._fail(TransferError("Every verifying worker stopped"))
+                    return
+                queue.all_tasks_done.wait(0.1)
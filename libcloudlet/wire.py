@@ -0,0 +1,242 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""This module has a compact binary encoding of cloudlet info.
+
+The client asks for it with the ``Accept`` header and the server answers
+with ``Content-Type: application/x-cloudlet-info``. Otherwise JSON is used.
+All integers are in network byte order::
+
+    header      4s magic "CLIN", B version, B reserved, H presence bitmask
+    numerics    7 x d, one per field of NUMERIC_FIELDS (0 if absent)
+    lists       for APP_CACHE_FILES and APP_CACHE_URLS:
+                    I count, I length, UTF-8 items separated by NUL
+    extra       I length, JSON object of the remaining keys
+
+Bit *i* of the presence bitmask is set when the *i*-th field of
+NUMERIC_FIELDS followed by LIST_FIELDS is present, so a partial record
+such as a delta response keeps its absent fields absent. A field whose
+value cannot be encoded in its slot, e.g. None removing the field in a
+delta or the added and removed items of a list, is kept in *extra*.
+Version 1 has no presence bits for the lists, which are always present.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import json
+import struct
+from .const import ResourceInfoConst
+
+
+CONTENT_TYPE = "application/x-cloudlet-info"
+ACCEPT = "%s, application/json;q=0.5" % CONTENT_TYPE
+
+MAGIC = b"CLIN"
+VERSION = 2
+
+NUMERIC_FIELDS = (
+    ResourceInfoConst.TOTAL_CPU_NUMBER,
+    ResourceInfoConst.TOTAL_MEM_MB,
+    ResourceInfoConst.CLOCK_SPEED,
+    ResourceInfoConst.TOTAL_CPU_PERCENT,
+    ResourceInfoConst.TOTAL_MEM_FREE_MB,
+    ResourceInfoConst.RTT_BETWEEN_CLIENT,
+    ResourceInfoConst.APP_CACHE_TOTAL_SCORE,
+)
+LIST_FIELDS = (
+    ResourceInfoConst.APP_CACHE_FILES,
+    ResourceInfoConst.APP_CACHE_URLS,
+)
+
+_HEADER = struct.Struct(">4sBBH%dd" % len(NUMERIC_FIELDS))
+_COUNT = struct.Struct(">I")
+_LIST_HEADER = struct.Struct(">II")
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+class CloudletInfo(object):
+    """ Compact representation of application specific cloudlet info.
+
+    Fields of :class:`ResourceInfoConst` are kept in slots instead of a
+    dict, but it can be read like the dict parsed from JSON.
+    """
+
+    __slots__ = ("numerics", "presence", "lists", "extra")
+
+    def __init__(self, numerics=None, presence=0, lists=None, extra=None):
+        self.numerics = numerics or (0.0,) * len(NUMERIC_FIELDS)
+        self.presence = presence
+        self.lists = lists or (None,) * len(LIST_FIELDS)
+        self.extra = extra
+
+    def get(self, key, default=None):
+        if key in _NUMERIC_INDEX:
+            index = _NUMERIC_INDEX[key]
+            if self.presence & (1 << index):
+                return self.numerics[index]
+        elif key in _LIST_INDEX:
+            value = self.lists[_LIST_INDEX[key]]
+            if value is not None:
+                return value
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        keys = [key for index, key in enumerate(NUMERIC_FIELDS)
+                if self.presence & (1 << index)]
+        keys.extend([key for index, key in enumerate(LIST_FIELDS)
+                     if self.lists[index] is not None])
+        keys.extend(self.extra or ())
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, CloudletInfo):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+_MISSING = object()
+_NUMERIC_INDEX = dict([(key, index) for index, key in enumerate(NUMERIC_FIELDS)])
+_LIST_INDEX = dict([(key, index) for index, key in enumerate(LIST_FIELDS)])
+
+
+def encode(info):
+    """ Encode cloudlet info
+
+    :param info: cloudlet info parsed from JSON or :class:`CloudletInfo`
+    :type info: dict
+    :return: encoded data
+    :rtype: bytes
+    """
+    presence = 0
+    numerics = list()
+    encoded = set()
+    for index, key in enumerate(NUMERIC_FIELDS):
+        value = info.get(key, None)
+        if isinstance(value, (int, long, float)):
+            numerics.append(float(value))
+            presence |= 1 << index
+            encoded.add(key)
+        else:
+            numerics.append(0.0)
+    list_chunks = list()
+    for index, key in enumerate(LIST_FIELDS):
+        items = info.get(key, None)
+        if isinstance(items, (list, tuple)):
+            presence |= 1 << (len(NUMERIC_FIELDS) + index)
+            encoded.add(key)
+        else:
+            items = list()
+        joined = u"\0".join(items).encode("utf-8")
+        list_chunks.append(_LIST_HEADER.pack(len(items), len(joined)))
+        list_chunks.append(joined)
+    chunks = [_HEADER.pack(MAGIC, VERSION, 0, presence, *numerics)]
+    chunks.extend(list_chunks)
+    extra = dict([(k, v) for k, v in info.items() if k not in encoded])
+    extra = json.dumps(extra).encode("utf-8") if extra else b""
+    chunks.append(_COUNT.pack(len(extra)))
+    chunks.append(extra)
+    return b"".join(chunks)
+
+
+def decode(data):
+    """ Decode cloudlet info
+
+    :param data: encoded data
+    :type data: bytes
+    :return: decoded cloudlet info
+    :rtype: :class:`CloudletInfo`
+    :raises: :class:`WireFormatError` for malformed data
+    """
+    def read(offset, length):
+        if length > len(data) - offset:
+            raise WireFormatError("Expect %d bytes at %d, but %d left" % \
+                                  (length, offset, len(data) - offset))
+        return data[offset:offset+length]
+
+    try:
+        header = _HEADER.unpack_from(data, 0)
+        if header[0] != MAGIC or header[1] not in (1, VERSION):
+            raise WireFormatError("Unknown wire format %r %r" % header[:2])
+        presence = header[3]
+        if header[1] == 1:
+            for index in range(len(LIST_FIELDS)):
+                presence |= 1 << (len(NUMERIC_FIELDS) + index)
+        offset = _HEADER.size
+        lists = list()
+        for index in range(len(LIST_FIELDS)):
+            count, length = _LIST_HEADER.unpack_from(data, offset)
+            offset += _LIST_HEADER.size
+            joined = read(offset, length)
+            offset += length
+            if count:
+                # NUL separates the items
+                if count - 1 > length:
+                    raise WireFormatError("%d items in %d bytes" % (count, length))
+                items = joined.decode("utf-8").split(u"\0")
+                if len(items) != count:
+                    raise WireFormatError("Expect %d items, but %d" % (count, len(items)))
+            elif length:
+                raise WireFormatError("No item in %d bytes" % length)
+            else:
+                items = list()
+            if not presence & (1 << (len(NUMERIC_FIELDS) + index)):
+                items = None
+            lists.append(items)
+        length, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        extra = None
+        if length:
+            extra = read(offset, length).decode("utf-8")
+    except (struct.error, UnicodeDecodeError) as e:
+        raise WireFormatError("Malformed cloudlet info: %s" % str(e))
+    if extra is not None:
+        try:
+            extra = json.loads(extra)
+        except ValueError as e:
+            raise WireFormatError("Malformed extra keys: %s" % str(e))
+    return CloudletInfo(header[4:], presence, tuple(lists), extra)
@@ -0,0 +1,246 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import json
+import socket
+import threading
+import time
+import unittest
+import BaseHTTPServer
+import SocketServer
+from libcloudlet.base import ElijahCloudletDiscovery, Application, \
+    MobileClient, DiscoveryException, CloudletException
+from libcloudlet.const import AppInfoConst, ResourceInfoConst
+from libcloudlet.health import HealthRegistry
+from libcloudlet.latency import LatencyRegistry
+from libcloudlet.http_cache import ConditionalCache
+from libcloudlet.singleflight import SingleFlight, CallTimeout
+from libcloudlet.selection_cache import SelectionCache
+
+CLOUDLET_URL = "/api/v1/resource/"
+
+
+def unused_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ directory server listing the cloudlets at server.cloudlet_ports,
+    and a cloudlet answering detail queries
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        self.rfile.read(int(self.headers.getheader("Content-Length") or 0))
+        if self.path.startswith(CLOUDLET_URL):
+            body = {ResourceInfoConst.TOTAL_CPU_PERCENT: 10.0,
+                    ResourceInfoConst.CLOCK_SPEED: 2400}
+        else:
+            with server.lock:
+                server.n_directory_queries += 1
+            server.directory_gate.wait()
+            if server.broken_directory:
+                body = "not json"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            body = {"cloudlet": [{"ip_address": "127.0.0.1",
+                                  "rest_api_port": port,
+                                  "rest_api_url": URL}
+                                 for port in server.cloudlet_ports
+                                 for URL in server.cloudlet_URLs]}
+        body = json.dumps(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class DiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        server = StandInServer(("127.0.0.1", 0), StandInHandler)
+        server.lock = threading.Lock()
+        server.n_directory_queries = 0
+        server.broken_directory = False
+        server.cloudlet_URLs = [CLOUDLET_URL]
+        server.directory_gate = threading.Event()
+        server.directory_gate.set()
+        self.dead_port = unused_port()
+        server.cloudlet_ports = [server.server_address[1], self.dead_port]
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.server = server
+        self.app_info = Application(**{AppInfoConst.APP_ID: "moped"})
+
+    def tearDown(self):
+        self.server.directory_gate.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def discovery(self, **kwargs):
+        return ElijahCloudletDiscovery(
+            "http://127.0.0.1:%d" % self.server.server_address[1],
+            health_registry=HealthRegistry(), latency_registry=LatencyRegistry(),
+            response_cache=ConditionalCache(), **kwargs)
+
+    def discover(self, discovery, **kwargs):
+        return discovery.discover(app_info=self.app_info,
+                                  selection_algorithm=lambda c, app: c[0],
+                                  **kwargs)
+
+    def test_failed_cloudlets(self):
+        discovery = self.discovery()
+        cloudlet = self.discover(discovery)
+        self.assertEqual(cloudlet.REST_endpoint, "http://127.0.0.1:%d%s" % \
+                         (self.server.server_address[1], CLOUDLET_URL))
+        self.assertEqual([c.REST_endpoint for c in cloudlet.failed_cloudlets],
+                         ["http://127.0.0.1:%d%s" % (self.dead_port, CLOUDLET_URL)])
+        self.assertIsNotNone(cloudlet.failed_cloudlets[0].query_error)
+
+        # a failed discovery does not change the result of another one
+        self.server.cloudlet_ports = [self.dead_port, unused_port()]
+        with self.assertRaises(DiscoveryException) as context:
+            self.discover(discovery)
+        self.assertEqual(len(context.exception.failed_cloudlets), 2)
+        self.assertEqual(len(cloudlet.failed_cloudlets), 1)
+        self.assertFalse(hasattr(discovery, "failed_cloudlets"))
+
+    def run_discoveries(self, discovery, n_callers):
+        """ discover from concurrent callers while the directory server
+        holds the first query
+        :return: threads and the cloudlet or exception of each caller
+        """
+        self.server.directory_gate.clear()
+        outcomes = [None] * n_callers
+        def run(index):
+            try:
+                outcomes[index] = self.discover(discovery)
+            except Exception as e:
+                outcomes[index] = e
+        threads = [threading.Thread(target=run, args=(index,))
+                   for index in range(n_callers)]
+        for th in threads:
+            th.start()
+        while discovery.single_flight.n_shared < n_callers - 1:
+            threading.Event().wait(0.01)
+        return threads, outcomes
+
+    def test_shared_directory_query(self):
+        discovery = self.discovery(single_flight=SingleFlight())
+        threads, outcomes = self.run_discoveries(discovery, 4)
+        self.server.directory_gate.set()
+        for th in threads:
+            th.join(5)
+        self.assertEqual(self.server.n_directory_queries, 1)
+        self.assertEqual(len(set([c.REST_endpoint for c in outcomes])), 1)
+        # every caller has its own cloudlet object
+        self.assertEqual(len(set([id(c) for c in outcomes])), 4)
+
+    def test_shared_directory_error(self):
+        self.server.broken_directory = True
+        discovery = self.discovery(single_flight=SingleFlight())
+        threads, outcomes = self.run_discoveries(discovery, 3)
+        self.server.directory_gate.set()
+        for th in threads:
+            th.join(5)
+        self.assertEqual(self.server.n_directory_queries, 1)
+        self.assertIsInstance(outcomes[0], ValueError)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+
+    def test_flight_timeout(self):
+        discovery = self.discovery(single_flight=SingleFlight(),
+                                   flight_timeout=0.05)
+        threads, outcomes = self.run_discoveries(discovery, 2)
+        for th in threads:
+            th.join(0.5)
+        self.assertEqual(len([o for o in outcomes if isinstance(o, CallTimeout)]), 1)
+        self.server.directory_gate.set()
+        for th in threads:
+            th.join(5)
+        self.assertEqual(len([o for o in outcomes if isinstance(o, CallTimeout)]), 1)
+        self.assertEqual(self.server.n_directory_queries, 1)
+
+    def test_selection_cache(self):
+        self.server.cloudlet_ports = [self.server.server_address[1]]
+        self.server.cloudlet_URLs = [CLOUDLET_URL + "a", CLOUDLET_URL + "b",
+                                     CLOUDLET_URL + "c"]
+        app_info = Application(**{AppInfoConst.APP_ID: "moped",
+                                  AppInfoConst.REQUIRED_MIN_CPU_CLOCK: 2000})
+        cache = SelectionCache()
+        discovery = self.discovery(selection_cache=cache)
+        first = discovery.discover(app_info=app_info)
+        second = discovery.discover(app_info=app_info)
+        self.assertEqual(first.REST_endpoint, second.REST_endpoint)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # the detail records were observed by the query threads
+        self.assertEqual(len(cache.detail_versions), 3)
+
+    def test_subscription_refresh_error(self):
+        discovery = self.discovery()
+        client_info = MobileClient(GPS_latitude=40.44, GPS_longitude=-79.94)
+        changes = list()
+        subscription = discovery.subscribe(
+            client_info, self.app_info,
+            lambda subscription, cloudlet: changes.append(cloudlet), ttl=0.0)
+        manager = discovery.subscription_manager
+        self.assertEqual(manager.n_refreshes, 1)
+        selected = subscription.selected
+        self.assertEqual(changes, [selected])
+
+        # an error other than CloudletException keeps the stale candidates
+        self.server.broken_directory = True
+        time.sleep(0.01)
+        self.assertTrue(subscription.update() is selected)
+        self.assertEqual(manager.n_refreshes, 1)
+
+        # and the subscription is updated again once the error is gone
+        self.server.broken_directory = False
+        time.sleep(0.01)
+        self.assertEqual(subscription.update().REST_endpoint,
+                         selected.REST_endpoint)
+        self.assertEqual(manager.n_refreshes, 2)
+
+        # without any candidate, the error is raised as CloudletException
+        self.server.broken_directory = True
+        self.assertRaises(CloudletException, self.discovery().subscribe,
+                          client_info, self.app_info, lambda *args: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+import random
+import unittest
+from libcloudlet import history
+from libcloudlet.history import RingBuffer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_numpy = (history._numpy_module, history._numpy_checked)
+
+    def tearDown(self):
+        history._numpy_module, history._numpy_checked = self.saved_numpy
+
+    def use_numpy(self, enabled):
+        history._numpy_module = None
+        history._numpy_checked = not enabled
+
+    def statistics(self, buf, size):
+        values, times = buf.window(size)
+        return {"values": [float(v) for v in values],
+                "times": [float(t) for t in times],
+                "ewma": buf.ewma(0.3, size),
+                "trend": buf.trend(size),
+                "p50": buf.percentile(50, size),
+                "p90": buf.percentile(90, size),
+                "predict": buf.predict(5.0, 0.3, size)}
+
+    def filled_buffers(self):
+        rand = random.Random(0)
+        buffers = list()
+        # empty, partially filled, full, and wrapped around several times
+        for n_samples in (0, 5, 8, 13, 30):
+            buf = RingBuffer(8)
+            for index in range(n_samples):
+                buf.append(rand.uniform(0, 100), 1000.0 + index * 2)
+            buffers.append((n_samples, buf))
+        return buffers
+
+    def test_window(self):
+        for enabled in (False, True) if numpy else (False,):
+            self.use_numpy(enabled)
+            for n_samples, buf in self.filled_buffers():
+                self.assertEqual(len(buf), min(n_samples, 8))
+                for size in (None, 1, 3, 8, 10):
+                    n_window = min(size or len(buf), len(buf))
+                    times = self.statistics(buf, size)["times"]
+                    # the latest samples, oldest first
+                    self.assertEqual(times, [1000.0 + index * 2 for index in
+                                             range(n_samples - n_window,
+                                                   n_samples)])
+
+    def test_statistics(self):
+        self.use_numpy(False)
+        buf = RingBuffer(4)
+        for index, value in enumerate((9.0, 7.0, 1.0, 2.0, 3.0, 4.0)):
+            buf.append(value, 100.0 + index)
+        self.assertEqual(buf.latest(), 4.0)
+        self.assertEqual(list(buf.window()[0]), [1.0, 2.0, 3.0, 4.0])
+        self.assertAlmostEqual(buf.trend(), 1.0)
+        self.assertAlmostEqual(buf.percentile(50), 2.5)
+        self.assertAlmostEqual(buf.ewma(0.5), 3.125)
+        self.assertAlmostEqual(buf.predict(2.0, 0.5), 5.125)
+        self.assertEqual(RingBuffer(4).ewma(), None)
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_parity(self):
+        buffers = self.filled_buffers()
+        self.use_numpy(True)
+        self.assertTrue(isinstance(buffers[-1][1].window()[0], numpy.ndarray))
+        self.use_numpy(False)
+        self.assertFalse(isinstance(buffers[-1][1].window()[0], numpy.ndarray))
+        for n_samples, buf in buffers:
+            for size in (None, 1, 2, 3, 8, 10):
+                self.use_numpy(True)
+                expected = self.statistics(buf, size)
+                self.use_numpy(False)
+                statistics = self.statistics(buf, size)
+                self.assertEqual(statistics["values"], expected["values"])
+                self.assertEqual(statistics["times"], expected["times"])
+                for key in ("ewma", "trend", "p50", "p90", "predict"):
+                    if expected[key] is None:
+                        self.assertEqual(statistics[key], None)
+                    else:
+                        self.assertAlmostEqual(statistics[key], expected[key],
+                                               msg="%s of %d samples" % \
+                                               (key, n_samples))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+import json
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+from urlparse import urlparse
+from libcloudlet.base import _json_request, CloudletException
+from libcloudlet.const import HTTPConst, ResourceInfoConst
+from libcloudlet.http_cache import ConditionalCache, CachedResponse
+
+CACHE_KEY = "detail"
+CACHE_FILES = ResourceInfoConst.APP_CACHE_FILES
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ answers the queued responses of the server in order
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        self.rfile.read(int(self.headers.getheader("Content-Length") or 0))
+        with server.lock:
+            server.requests.append(dict(self.headers.items()))
+            status, headers, body = server.responses.pop(0)
+        body = json.dumps(body) if body is not None else ""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class ConditionalRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        server = StandInServer(("127.0.0.1", 0), StandInHandler)
+        server.lock = threading.Lock()
+        server.requests = list()
+        server.responses = list()
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.server = server
+        self.end_point = urlparse("http://127.0.0.1:%d/api/v1/resource/" % \
+                                  server.server_address[1])
+        self.response_cache = ConditionalCache()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, status, body=None, **headers):
+        self.server.responses.append((status, headers, body))
+
+    def request(self):
+        return _json_request(self.end_point, "GET", "", dict(), None,
+                             self.response_cache, CACHE_KEY)
+
+    def sent_validators(self, index):
+        headers = self.server.requests[index]
+        return (headers.get(HTTPConst.HEADER_IF_NONE_MATCH.lower(), None),
+                headers.get(HTTPConst.HEADER_IF_VERSION.lower(), None))
+
+    def cache_full_response(self):
+        self.respond(200, {"cpu": 10, CACHE_FILES: ["/a", "/b"]},
+                     **{HTTPConst.HEADER_ETAG: '"e1"',
+                        HTTPConst.HEADER_VERSION: "1"})
+        return self.request()
+
+    def test_etag(self):
+        parsed, digest = self.cache_full_response()
+        self.assertEqual(parsed, {"cpu": 10, CACHE_FILES: ["/a", "/b"]})
+        self.assertEqual(self.sent_validators(0), (None, None))
+        entry = self.response_cache.get(CACHE_KEY)
+        self.assertEqual((entry.parsed, entry.digest), (parsed, digest))
+        self.assertEqual((entry.etag, entry.version), ('"e1"', "1"))
+
+    def test_without_validators(self):
+        self.respond(200, {"cpu": 10})
+        self.assertEqual(self.request()[0], {"cpu": 10})
+        self.assertEqual(self.response_cache.get(CACHE_KEY), None)
+
+    def test_not_modified(self):
+        parsed, digest = self.cache_full_response()
+        self.respond(304)
+        self.assertEqual(self.request(), (parsed, digest))
+        self.assertEqual(self.sent_validators(1), ('"e1"', "1"))
+
+    def test_delta(self):
+        parsed, digest = self.cache_full_response()
+        self.respond(200, {"cpu": None, "mem": 512,
+                           CACHE_FILES: {HTTPConst.DELTA_ADDED: ["/c"],
+                                         HTTPConst.DELTA_REMOVED: ["/a"]}},
+                     **{HTTPConst.HEADER_DELTA_BASE: "1",
+                        HTTPConst.HEADER_VERSION: "2"})
+        updated, updated_digest = self.request()
+        self.assertEqual(updated, {"mem": 512, CACHE_FILES: ["/b", "/c"]})
+        self.assertNotEqual(updated_digest, digest)
+        entry = self.response_cache.get(CACHE_KEY)
+        self.assertEqual((entry.parsed, entry.version), (updated, "2"))
+        # the previous object is not modified
+        self.assertEqual(parsed, {"cpu": 10, CACHE_FILES: ["/a", "/b"]})
+
+    def test_delta_fallback(self):
+        self.cache_full_response()
+        self.respond(200, {"mem": 512}, **{HTTPConst.HEADER_DELTA_BASE: "0"})
+        self.respond(200, {"cpu": 20},
+                     **{HTTPConst.HEADER_ETAG: '"e3"',
+                        HTTPConst.HEADER_VERSION: "3"})
+        parsed, digest = self.request()
+        self.assertEqual(parsed, {"cpu": 20})
+        # fetched again without the validators, and cached
+        self.assertEqual(self.sent_validators(1), ('"e1"', "1"))
+        self.assertEqual(self.sent_validators(2), (None, None))
+        entry = self.response_cache.get(CACHE_KEY)
+        self.assertEqual((entry.parsed, entry.etag, entry.version),
+                         (parsed, '"e3"', "3"))
+
+    def test_not_modified_fallback(self):
+        # 304 to a request without validators
+        self.respond(304)
+        self.respond(200, {"cpu": 20}, **{HTTPConst.HEADER_ETAG: '"e2"'})
+        self.assertEqual(self.request()[0], {"cpu": 20})
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.response_cache.get(CACHE_KEY).etag, '"e2"')
+
+    def test_fallback_once(self):
+        self.response_cache.put(CACHE_KEY, CachedResponse({}, "", '"e1"', "1"))
+        self.respond(200, {"mem": 512}, **{HTTPConst.HEADER_DELTA_BASE: "0"})
+        self.respond(304)
+        self.assertRaises(CloudletException, self.request)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.response_cache.get(CACHE_KEY), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from libcloudlet import imaging
+from libcloudlet.base import VM, CreateBaseVMException
+from libcloudlet.imaging import BlockHashIndex, ImagingError, sparse_copy
+
+BLOCK = 4096
+
+
+def block_data(number, length=BLOCK):
+    return (b"%08d" % number) * (length // 8) + b"x" * (length % 8)
+
+
+class SparseCopyTest(unittest.TestCase):
+    """ copy of local sparse files by every method
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.saved = (imaging._reflink, imaging._copy_file_range)
+
+    def tearDown(self):
+        imaging._reflink, imaging._copy_file_range = self.saved
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def create_image(self, name, blocks, size):
+        """ write *blocks* of {block number: data} into a file of *size*
+        bytes, leaving holes elsewhere
+        """
+        path = self.path(name)
+        with open(path, "wb") as f:
+            f.truncate(size)
+            for number, data in sorted(blocks.items()):
+                f.seek(number * BLOCK)
+                f.write(data)
+        return path
+
+    def expected_index(self, blocks):
+        return dict([(number, hashlib.sha1(data).digest())
+                     for number, data in blocks.items()
+                     if data.strip(b"\0")])
+
+    def disable(self, reflink=False, copy_range=False):
+        if reflink:
+            imaging._reflink = lambda src_fd, dst_fd: False
+        if copy_range:
+            imaging._copy_file_range = lambda src_fd, dst_fd, start, end: False
+
+    def check_copy(self, blocks, size, expected_methods):
+        src_path = self.create_image("src", blocks, size)
+        dst_path = self.path("dst")
+        hash_index, stats = sparse_copy(src_path, dst_path)
+        self.assertIn(stats["method"], expected_methods)
+        self.assertEqual(stats["logical_size"], size)
+        self.assertEqual(os.path.getsize(dst_path), size)
+        with open(src_path, "rb") as src, open(dst_path, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertEqual(hash_index.image_size, size)
+        self.assertEqual(hash_index.hashes, self.expected_index(blocks))
+
+        index_path = dst_path + ".hashindex"
+        hash_index.save(index_path)
+        loaded = BlockHashIndex.load(index_path)
+        self.assertEqual(loaded.hashes, hash_index.hashes)
+        self.assertEqual(loaded.diff(hash_index), [])
+        return stats
+
+    def images(self):
+        """ data blocks between holes, an allocated zero block, and a file
+        ending in a hole or in a partial block
+        """
+        blocks = {0: block_data(0), 3: block_data(3), 4: b"\0" * BLOCK,
+                  300: block_data(300)}
+        yield blocks, 1024 * BLOCK
+        blocks = dict(blocks)
+        blocks[1023] = block_data(1023, 100)
+        yield blocks, 1023 * BLOCK + 100
+        yield dict(), 16 * BLOCK
+
+    def test_default(self):
+        for blocks, size in self.images():
+            self.check_copy(blocks, size,
+                            ("reflink", "copy_file_range", "buffered", None))
+
+    def test_copy_file_range(self):
+        self.disable(reflink=True)
+        for blocks, size in self.images():
+            self.check_copy(blocks, size, ("copy_file_range", "buffered", None))
+
+    def test_buffered(self):
+        self.disable(reflink=True, copy_range=True)
+        for blocks, size in self.images():
+            stats = self.check_copy(blocks, size, ("buffered", None))
+            self.assertEqual(stats["written_size"],
+                             sum([len(data) for data in blocks.values()
+                                  if data.strip(b"\0")]))
+
+    def test_without_index(self):
+        blocks, size = next(self.images())
+        src_path = self.create_image("src", blocks, size)
+        hash_index, stats = sparse_copy(src_path, self.path("dst"),
+                                        build_index=False)
+        self.assertIsNone(hash_index)
+
+    def test_diff(self):
+        blocks, size = next(self.images())
+        index_a, _ = sparse_copy(self.create_image("a", blocks, size),
+                                 self.path("a.copy"))
+        blocks[3] = block_data(33)
+        del blocks[300]
+        index_b, _ = sparse_copy(self.create_image("b", blocks, size),
+                                 self.path("b.copy"))
+        self.assertEqual(index_a.diff(index_b), [3, 300])
+
+    def test_copy_onto_itself(self):
+        blocks, size = next(self.images())
+        src_path = self.create_image("src", blocks, size)
+        self.assertRaises(ImagingError, sparse_copy, src_path, src_path)
+        self.assertEqual(os.path.getsize(src_path), size)
+
+
+class CreateBaseVMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.disk_image = os.path.join(self.temp_dir, "disk.img")
+        with open(self.disk_image, "wb") as f:
+            f.truncate(64 * BLOCK)
+            f.seek(5 * BLOCK)
+            f.write(block_data(5))
+        with open(self.disk_image, "rb") as f:
+            self.image = f.read()
+        self.vm = VM("vm-1", disk_image=self.disk_image)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_image_intact(self):
+        with open(self.disk_image, "rb") as f:
+            self.assertEqual(f.read(), self.image)
+
+    def test_create(self):
+        base_VM_id = self.vm.create_base_VM("base.img")
+        base_path = os.path.join(self.temp_dir, "base.img")
+        with open(base_path, "rb") as f:
+            self.assertEqual(f.read(), self.image)
+        hash_index = BlockHashIndex.load(base_path + ".hashindex")
+        self.assertEqual(base_VM_id, hash_index.hex_digest())
+        # the identifier depends on the content only
+        self.assertEqual(self.vm.create_base_VM("base2.img"), base_VM_id)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["base.img", "base.img.hashindex", "base2.img",
+                          "base2.img.hashindex", "disk.img"])
+
+    def test_same_path(self):
+        self.assertRaises(CreateBaseVMException, self.vm.create_base_VM,
+                          "disk.img")
+        self.assertRaises(CreateBaseVMException, self.vm.create_base_VM,
+                          "disk.img", base_VM_dir=self.temp_dir + "/.")
+        os.symlink(self.disk_image, os.path.join(self.temp_dir, "link.img"))
+        self.assertRaises(CreateBaseVMException, self.vm.create_base_VM,
+                          "link.img")
+        self.assert_image_intact()
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["disk.img", "link.img"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import time
+import threading
+import unittest
+from libcloudlet.base import Cloudlet
+from libcloudlet.jobs import Job, JobExecutor, BatchError, JobCancelled, \
+    JobTimeout, batch
+
+
+class JobsTest(unittest.TestCase):
+
+    def test_batch_concurrency(self):
+        lock = threading.Lock()
+        running = [0, 0]    # running now, most running at once
+        def run(job, item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return item * 2
+        batch_job = batch(run, range(20), max_concurrency=3)
+        self.assertEqual(batch_job.result(5), [item * 2 for item in range(20)])
+        self.assertEqual(running[1], 3)
+        self.assertEqual(batch_job.state, Job.STATE_DONE)
+
+    def test_batch_errors(self):
+        def run(job, item):
+            if item % 3 == 0:
+                raise ValueError("item %d" % item)
+            return item
+        batch_job = batch(run, range(7), max_concurrency=2)
+        with self.assertRaises(BatchError) as context:
+            batch_job.result(5)
+        failures = context.exception.failures
+        self.assertEqual([item for item, _ in failures], [0, 3, 6])
+        self.assertTrue(all(isinstance(e, ValueError) for _, e in failures))
+        self.assertEqual(batch_job.state, Job.STATE_FAILED)
+        # the other items still ran
+        self.assertEqual([job.result() for job in batch_job.jobs
+                          if job.error() is None], [1, 2, 4, 5])
+
+    def test_batch_progress(self):
+        gate = threading.Event()
+        def run(job, item):
+            if item > 0:
+                gate.wait()
+            return item
+        batch_job = batch(run, range(4), max_concurrency=4)
+        batch_job.jobs[0].wait(5)
+        time.sleep(0.05)
+        self.assertEqual(batch_job.progress, 0.25)
+        gate.set()
+        batch_job.result(5)
+        self.assertEqual(batch_job.progress, 1.0)
+        self.assertEqual(batch(run, []).result(1), [])
+
+    def test_progress(self):
+        job = Job("test")
+        job.set_progress(0.5, "half")
+        job.set_progress(0.3)
+        job.set_progress(2.0)
+        self.assertEqual((job.progress, job.message), (1.0, "half"))
+
+    def test_then(self):
+        executor = JobExecutor(2)
+        job = executor.submit(lambda job: 20).then(lambda job, value: value + 1,
+                                                   executor)
+        self.assertEqual(job.result(5), 21)
+
+        def fail(job):
+            raise ValueError("failed")
+        called = list()
+        job = executor.submit(fail).then(lambda job, value: called.append(value),
+                                         executor)
+        self.assertRaises(ValueError, job.result, 5)
+        self.assertEqual(called, list())
+
+    def test_cancel_and_timeout(self):
+        started = threading.Event()
+        gate = threading.Event()
+        def wait(job):
+            started.set()
+            return gate.wait()
+        executor = JobExecutor(1)
+        running = executor.submit(wait)
+        pending = executor.submit(lambda job: 1)
+        started.wait(5)
+        self.assertTrue(pending.cancel())
+        self.assertFalse(running.cancel())
+        self.assertRaises(JobTimeout, running.result, 0.05)
+        gate.set()
+        self.assertTrue(running.result(5))
+        self.assertRaises(JobCancelled, pending.result, 5)
+
+
+class StandInCloudlet(Cloudlet):
+
+    def provision(self, overlay_URL, overlay_account=None, overlay_key=None,
+                  start_VM=False, assign_IP=True, **kwargs):
+        kwargs["progress"](0.5, "downloading")
+        return overlay_URL
+
+
+class ProvisionAsyncTest(unittest.TestCase):
+
+    def test_progress(self):
+        cloudlet = StandInCloudlet("http://127.0.0.1:1/api/v1/resource/")
+        reported = list()
+        job = cloudlet.provision_async("http://overlay/",
+                                       executor=JobExecutor(1),
+                                       progress=lambda *args: reported.append(args))
+        self.assertEqual(job.result(5), "http://overlay/")
+        self.assertEqual(reported, [(0.5, "downloading")])
+        self.assertEqual(job.message, "downloading")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import socket
+import threading
+import unittest
+import BaseHTTPServer
+from libcloudlet.base import ElijahCloudletDiscovery, Application
+from libcloudlet.const import AppInfoConst
+from libcloudlet.const import LANDiscoveryConst as Const
+from libcloudlet.lan_discovery import LANDiscoveryClient, LANDiscoveryResponder
+
+
+def unused_port(sock_type=socket.SOCK_DGRAM):
+    sock = socket.socket(socket.AF_INET, sock_type)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class BrokenDirectoryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ directory server answering with a body that is not JSON
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = "not json"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LANDiscoveryTest(unittest.TestCase):
+    """ multicast discovery over the loopback interface
+    """
+
+    def setUp(self):
+        self.port = unused_port()
+        self.app_info = Application(**{AppInfoConst.APP_ID: "moped"})
+        self.responder = None
+        self.directory = None
+
+    def tearDown(self):
+        if self.responder is not None:
+            self.responder.terminate()
+        if self.directory is not None:
+            self.directory.shutdown()
+            self.directory.server_close()
+
+    def start_responder(self, **kwargs):
+        self.responder = LANDiscoveryResponder("127.0.0.1", 8021,
+                                               "/api/v1/resource/",
+                                               port=self.port,
+                                               interface="127.0.0.1", **kwargs)
+        self.responder.start()
+
+    def start_broken_directory(self):
+        self.directory = BaseHTTPServer.HTTPServer(("127.0.0.1", 0),
+                                                   BrokenDirectoryHandler)
+        server_thread = threading.Thread(target=self.directory.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        return "http://127.0.0.1:%d" % self.directory.server_address[1]
+
+    def client(self, timeout=1.0):
+        return LANDiscoveryClient(port=self.port, interface="127.0.0.1",
+                                  timeout=timeout)
+
+    def find_candidates(self, discovery, wait_time=5.0):
+        """ run _find_candidates in a thread failing the test if it hangs
+        """
+        outcome = dict()
+        def run():
+            try:
+                outcome["result"] = discovery._find_candidates(self.app_info)
+            except Exception as e:
+                outcome["error"] = e
+        query_thread = threading.Thread(target=run)
+        query_thread.daemon = True
+        query_thread.start()
+        query_thread.join(wait_time)
+        self.assertFalse(query_thread.is_alive(), "candidate search hangs")
+        return outcome
+
+    def test_query(self):
+        self.start_responder(location="lab")
+        records = self.client().query(self.app_info)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0][Const.KEY_IP_ADDRESS], "127.0.0.1")
+        self.assertEqual(records[0][Const.KEY_REST_API_PORT], 8021)
+        self.assertEqual(records[0][Const.KEY_REST_API_URL], "/api/v1/resource/")
+        self.assertEqual(records[0]["location"], "lab")
+
+    def test_query_without_responder(self):
+        self.assertEqual(self.client(timeout=0.2).query(self.app_info), [])
+
+    def test_listen_announcement(self):
+        self.start_responder(announce_interval=0.05)
+        records = self.client().listen(0.3)
+        self.assertEqual([r[Const.KEY_IP_ADDRESS] for r in records], ["127.0.0.1"])
+
+    def test_candidates_from_lan(self):
+        self.start_responder()
+        discovery = ElijahCloudletDiscovery(self.start_broken_directory(),
+                                            lan_discovery=self.client())
+        outcome = self.find_candidates(discovery)
+        self.assertEqual([c.REST_endpoint for c in outcome["result"]],
+                         ["http://127.0.0.1:8021/api/v1/resource/"])
+
+    def test_broken_directory_and_empty_lan(self):
+        discovery = ElijahCloudletDiscovery(self.start_broken_directory(),
+                                            lan_discovery=self.client(timeout=0.2))
+        outcome = self.find_candidates(discovery)
+        self.assertIsInstance(outcome.get("error"), ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+import random
+import threading
+import time
+import unittest
+from libcloudlet.latency import P2Quantile, hedged_call
+
+
+def sample_rank(sorted_samples, value):
+    """ fraction of the samples below *value*
+    """
+    import bisect
+    return bisect.bisect_left(sorted_samples, value) / float(len(sorted_samples))
+
+
+class P2QuantileTest(unittest.TestCase):
+
+    def check_accuracy(self, samples, quantile, tolerance):
+        estimator = P2Quantile(quantile)
+        for value in samples:
+            estimator.add(value)
+        sorted_samples = sorted(samples)
+        exact = sorted_samples[int(quantile * (len(samples) - 1))]
+        estimate = estimator.value()
+        # compare ranks, which do not depend on the scale of the distribution
+        self.assertTrue(abs(sample_rank(sorted_samples, estimate) - quantile)
+                        <= tolerance, "quantile %f: %f, exact %f" % \
+                        (quantile, estimate, exact))
+
+    def test_accuracy(self):
+        rand = random.Random(0)
+        distributions = (
+            lambda: rand.uniform(0, 1),
+            lambda: rand.expovariate(10.0),
+            lambda: rand.lognormvariate(-3, 1),
+            lambda: rand.choice([0.01, 0.02]) + rand.expovariate(1.0) ** 3,
+        )
+        for draw in distributions:
+            samples = [draw() for _ in range(10000)]
+            self.check_accuracy(samples, 0.5, 0.02)
+            self.check_accuracy(samples, 0.95, 0.01)
+            self.check_accuracy(samples, 0.99, 0.005)
+
+    def test_sorted_input(self):
+        samples = [float(i) for i in range(1000)]
+        self.check_accuracy(samples, 0.99, 0.005)
+        self.check_accuracy(list(reversed(samples)), 0.99, 0.005)
+
+    def test_few_samples(self):
+        estimator = P2Quantile(0.5)
+        self.assertEqual(estimator.value(), None)
+        for value in (5, 1, 4, 2, 3):
+            estimator.add(value)
+        self.assertEqual(estimator.value(), 3)
+
+    def test_state(self):
+        rand = random.Random(1)
+        estimator = P2Quantile(0.99)
+        for _ in range(1000):
+            estimator.add(rand.expovariate(1.0))
+        restored = P2Quantile(0.99)
+        restored.set_state(estimator.get_state())
+        for _ in range(1000):
+            value = rand.expovariate(1.0)
+            estimator.add(value)
+            restored.add(value)
+        self.assertEqual(restored.count, estimator.count)
+        self.assertEqual(restored.positions, estimator.positions)
+        self.assertAlmostEqual(restored.value(), estimator.value())
+
+
+class HedgedCallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+
+    def call(self, results):
+        """ function returning (or raising) the results in order, each\
+            a tuple of (delay, value)
+        """
+        call_times = list()
+        self.call_times = call_times
+        def func():
+            with self.lock:
+                index = len(call_times)
+                call_times.append(time.time())
+            delay, value = results[index]
+            time.sleep(delay)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return func
+
+    def test_without_hedge(self):
+        func = self.call([(0.0, "first")])
+        self.assertEqual(hedged_call(func), "first")
+        self.assertEqual(hedged_call(self.call([(0.0, "second")]), None),
+                         "second")
+
+    def test_fast_call(self):
+        self.assertEqual(hedged_call(self.call([(0.0, "first")]), 0.5),
+                         "first")
+        time.sleep(0.6)
+        self.assertEqual(len(self.call_times), 1)
+
+    def test_hedge(self):
+        time_start = time.time()
+        func = self.call([(2.0, "first"), (0.0, "second")])
+        self.assertEqual(hedged_call(func, 0.2), "second")
+        elapsed = time.time() - time_start
+        self.assertEqual(len(self.call_times), 2)
+        self.assertTrue(self.call_times[1] - self.call_times[0] >= 0.2)
+        self.assertTrue(elapsed < 1.0)
+
+    def test_first_success(self):
+        # the first call returns while the hedged call is running
+        func = self.call([(0.4, "first"), (2.0, "second")])
+        time_start = time.time()
+        self.assertEqual(hedged_call(func, 0.2), "first")
+        self.assertTrue(time.time() - time_start < 1.0)
+
+    def test_hedge_after_error(self):
+        # a failed call is hidden by the successful one
+        func = self.call([(0.4, ValueError("first")), (0.4, "second")])
+        self.assertEqual(hedged_call(func, 0.2), "second")
+        func = self.call([(0.4, "third"), (0.0, ValueError("fourth"))])
+        self.assertEqual(hedged_call(func, 0.2), "third")
+
+    def test_error(self):
+        error = ValueError("first")
+        func = self.call([(0.0, error)])
+        try:
+            hedged_call(func, 0.2)
+            self.fail("error is not raised")
+        except ValueError as e:
+            self.assertTrue(e is error)
+        # a call failing before the hedge delay is not hedged
+        time.sleep(0.3)
+        self.assertEqual(len(self.call_times), 1)
+
+    def test_every_call_fails(self):
+        func = self.call([(0.4, ValueError("first")),
+                          (0.4, KeyError("second"))])
+        self.assertRaises(KeyError, hedged_call, func, 0.2)
+        self.assertEqual(len(self.call_times), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from libcloudlet.const import OverlayConst
+from libcloudlet import overlay_cache
+from libcloudlet.overlay_cache import OverlayCache
+
+URL = "http://127.0.0.1:1/overlay/moped.zip"
+
+
+class OverlayCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def create_cache(self, overlays, max_bytes):
+        """ cache holding *overlays* of {root: data}, the first one being
+        the least recently used
+        """
+        object_dir = os.path.join(self.temp_dir, overlay_cache.OBJECT_DIR)
+        os.makedirs(object_dir)
+        objects = dict()
+        for last_used, (root, data) in enumerate(overlays):
+            with open(os.path.join(object_dir, root), "wb") as f:
+                f.write(data)
+            objects[root] = {OverlayConst.KEY_SIZE: len(data),
+                             OverlayConst.KEY_CHUNK_SIZE: 64 * 1024,
+                             overlay_cache.KEY_LAST_USED: last_used + 1}
+        with open(os.path.join(self.temp_dir, overlay_cache.INDEX_FILE), "wb") as f:
+            f.write(json.dumps({overlay_cache.KEY_OBJECTS: objects,
+                                overlay_cache.KEY_URLS: dict()}))
+        return OverlayCache(self.temp_dir, max_bytes=max_bytes)
+
+    def test_pinned_overlay_is_not_evicted(self):
+        cache = self.create_cache([("a", b"a" * 8), ("b", b"b" * 8)], 10)
+        path, root = cache.acquire(URL, expected_root="a")
+        self.assertEqual(root, "a")
+        cache.acquire(URL, expected_root="b")
+
+        # "a" is the least recently used overlay over the bound
+        cache.release("b")
+        self.assertTrue(os.path.exists(path))
+        overlay_data = cache.open("a")
+        self.assertEqual(overlay_data[:], b"a" * 8)
+
+        cache.release("a")
+        self.assertIsNone(cache.lookup("a"))
+        self.assertFalse(os.path.exists(path))
+        # the map is still readable after the eviction
+        self.assertEqual(overlay_data[:], b"a" * 8)
+        overlay_data.close()
+        self.assertRaises(KeyError, cache.open, "a")
+        self.assertIsNotNone(cache.lookup("b"))
+
+    def test_zero_length_overlay(self):
+        cache = self.create_cache([("empty", b"")], 10)
+        path, root = cache.acquire(URL, expected_root="empty")
+        overlay_data = cache.open(root)
+        overlay_data.seek(0, os.SEEK_END)
+        self.assertEqual(overlay_data.tell(), 0)
+        overlay_data.close()
+        cache.release(root)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+import random
+import unittest
+from libcloudlet.base import Application, Cloudlet
+from libcloudlet.const import AppInfoConst, ResourceInfoConst
+from libcloudlet.placement import PlacementEngine
+
+
+def make_cloudlet(index, cpu_num, mem_mb, app_scores, clock_speed=2400,
+                  cpu_percent=0.0):
+    cloudlet = Cloudlet("http://10.0.%d.%d:8021/api/v1/resource/" % \
+                        (index / 256, index % 256))
+    cloudlet.meta_info.update({
+        ResourceInfoConst.TOTAL_CPU_NUMBER: cpu_num,
+        ResourceInfoConst.TOTAL_CPU_PERCENT: cpu_percent,
+        ResourceInfoConst.TOTAL_MEM_FREE_MB: mem_mb,
+    })
+    for app_id, score in app_scores.items():
+        setattr(cloudlet, app_id, {
+            ResourceInfoConst.CLOCK_SPEED: clock_speed,
+            ResourceInfoConst.APP_CACHE_TOTAL_SCORE: score,
+        })
+    return cloudlet
+
+
+def make_app(app_id, cpu_num, mem_mb, clock_speed=None):
+    app_info = {AppInfoConst.APP_ID: app_id,
+                AppInfoConst.REQUIRED_CPU_NUMBER: cpu_num,
+                AppInfoConst.REQUIRED_MEM_MB: mem_mb}
+    if clock_speed is not None:
+        app_info[AppInfoConst.REQUIRED_MIN_CPU_CLOCK] = clock_speed
+    return Application(**app_info)
+
+
+class PlacementEngineTest(unittest.TestCase):
+
+    def assertWithinCapacity(self, engine, app_list, placement):
+        used = dict()
+        for app_info, cloudlet in zip(app_list, placement):
+            if cloudlet is None:
+                continue
+            cpu, mem = engine.demand(app_info)
+            used_cpu, used_mem = used.get(cloudlet, (0.0, 0.0))
+            used[cloudlet] = (used_cpu + cpu, used_mem + mem)
+        for cloudlet, (used_cpu, used_mem) in used.items():
+            cpu, mem = engine.capacity(cloudlet)
+            self.assertTrue(used_cpu <= cpu and used_mem <= mem)
+
+    def test_capacity(self):
+        engine = PlacementEngine()
+        cloudlet = make_cloudlet(0, 4, 8192, {"moped": 0.0}, cpu_percent=50.0)
+        self.assertEqual(engine.capacity(cloudlet), (2.0, 8192.0))
+        app_list = [make_app("moped", 1, 1024) for _ in range(3)]
+        placement = engine.place(app_list, [cloudlet])
+        self.assertEqual(placement, [cloudlet, cloudlet, None])
+        self.assertEqual(engine.total_utility, 2.0)
+
+    def test_utility(self):
+        engine = PlacementEngine()
+        cloudlet_list = [make_cloudlet(0, 2, 8192, {"moped": 0.0}),
+                         make_cloudlet(1, 2, 8192, {"moped": 0.5}),
+                         make_cloudlet(2, 2, 8192, {"face": 0.9})]
+        app_list = [make_app("moped", 1, 1024) for _ in range(4)]
+        placement = engine.place(app_list, cloudlet_list)
+        # the cached cloudlet first, the other one when it is full, and
+        # never the cloudlet without a detail record of the application
+        self.assertEqual(sorted([cloudlet_list.index(c) for c in placement]),
+                         [0, 0, 1, 1])
+        self.assertAlmostEqual(engine.total_utility, 5.0)
+
+    def test_clock_speed(self):
+        engine = PlacementEngine()
+        cloudlet_list = [make_cloudlet(0, 8, 8192, {"moped": 0.9}, clock_speed=1600),
+                         make_cloudlet(1, 8, 8192, {"moped": 0.0}, clock_speed=3200)]
+        app_list = [make_app("moped", 1, 1024, clock_speed=2000),
+                    make_app("moped", 1, 1024, clock_speed=4000),
+                    make_app("moped", 1, 1024)]
+        placement = engine.place(app_list, cloudlet_list)
+        self.assertEqual(placement, [cloudlet_list[1], None, cloudlet_list[0]])
+
+    def test_place_remaining_capacity(self):
+        # the large application takes the preferred cloudlet, and the
+        # small ones still go to whatever capacity is left
+        engine = PlacementEngine()
+        cloudlet_list = [make_cloudlet(0, 4, 4096, {"moped": 0.9}),
+                         make_cloudlet(1, 1, 1024, {"moped": 0.0})]
+        app_list = [make_app("moped", 1, 1024),
+                    make_app("moped", 3, 2048),
+                    make_app("moped", 1, 1024)]
+        placement = engine.place(app_list, cloudlet_list)
+        self.assertEqual(placement.count(None), 0)
+        self.assertEqual(placement[1], cloudlet_list[0])
+        self.assertWithinCapacity(engine, app_list, placement)
+
+    def test_fragmentation(self):
+        rand = random.Random(0)
+        app_ids = ["app-%d" % i for i in range(10)]
+        cloudlet_list = list()
+        for index in range(100):
+            app_scores = dict()
+            for app_id in app_ids:
+                app_scores[app_id] = rand.random() ** 4
+            cloudlet_list.append(make_cloudlet(
+                index, rand.choice([8, 16, 32]),
+                rand.choice([16384, 32768, 65536]), app_scores,
+                clock_speed=rand.choice([1600, 2400, 3200]),
+                cpu_percent=rand.uniform(0, 50)))
+        app_list = list()
+        for index in range(1000):
+            app_list.append(make_app(rand.choice(app_ids),
+                                     rand.choice([1, 1, 1, 2]),
+                                     rand.choice([512, 1024, 2048, 4096]),
+                                     clock_speed=rand.choice([1000, 2000])))
+
+        # placing each application at its most useful cloudlet strands
+        # memory of CPU-bound cloudlets and the other way around
+        engine = PlacementEngine(max_choices=1)
+        placement = engine.place(app_list, cloudlet_list)
+        self.assertWithinCapacity(engine, app_list, placement)
+        n_unplaced = placement.count(None)
+        greedy_utility = engine.total_utility
+
+        engine = PlacementEngine()
+        placement = engine.place(app_list, cloudlet_list)
+        self.assertWithinCapacity(engine, app_list, placement)
+        self.assertTrue(n_unplaced > 0)
+        self.assertEqual(placement.count(None), 0)
+        self.assertTrue(engine.total_utility > greedy_utility)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from libcloudlet.base import ElijahCloudletDiscovery
+from libcloudlet.http_cache import CachedResponse
+from libcloudlet.registry import RegistrySnapshot
+
+
+class RegistrySnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "registry")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def discovery(self):
+        return ElijahCloudletDiscovery("http://127.0.0.1:1",
+                                       snapshot_path=self.path)
+
+    def test_removed_response_is_not_carried_over(self):
+        discovery = self.discovery()
+        cache = discovery.response_cache
+        cache.put("http://a/", CachedResponse({"n": 1}, "digest-a", "etag-a"))
+        cache.put("http://b/", CachedResponse({"n": 2}, "digest-b"))
+        discovery.save_snapshot()
+
+        # a new process starts from the snapshot only
+        discovery = self.discovery()
+        cache = discovery.response_cache
+        self.assertEqual(cache.get("http://a/").parsed, {"n": 1})
+        cache.remove("http://a/")
+        self.assertIsNone(cache.get("http://a/"))
+        discovery.save_snapshot()
+
+        snapshot = RegistrySnapshot(self.path)
+        self.assertIsNone(snapshot.get_response("http://a/"))
+        self.assertEqual(snapshot.get_response("http://b/").parsed, {"n": 2})
+        snapshot.close()
+
+    def test_new_snapshot_is_looked_up(self):
+        discovery = self.discovery()
+        self.assertIsNone(discovery.snapshot)
+        discovery.response_cache.put("http://a/",
+                                     CachedResponse({"n": 1}, "digest-a"))
+        discovery.save_snapshot()
+        self.assertEqual(discovery.snapshot.n_responses, 1)
+        self.assertIs(discovery.response_cache.snapshot, discovery.snapshot)
+        self.assertIs(discovery.latency_registry.snapshot, discovery.snapshot)
+
+        discovery.response_cache.remove("http://a/")
+        discovery.save_snapshot()
+        self.assertEqual(discovery.snapshot.n_responses, 0)
+        self.assertEqual(discovery.response_cache.removed_keys(), [])
+        self.assertIsNone(discovery.response_cache.get("http://a/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
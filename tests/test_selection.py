@@ -0,0 +1,160 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+import random
+import time
+import unittest
+from libcloudlet.base import Application, Cloudlet, ElijahCloudletSelection
+from libcloudlet.const import AppInfoConst, ResourceInfoConst
+from libcloudlet.selection import LoadSpreadingSelection
+
+APP_ID = "moped"
+
+
+def make_cloudlet(index, cache_score=0.0, cpu_percent=0.0, cpu_num=4,
+                  clock_speed=2400):
+    cloudlet = Cloudlet("http://10.0.0.%d:8021/api/v1/resource/" % index)
+    cloudlet.meta_info.update({
+        ResourceInfoConst.TOTAL_CPU_NUMBER: cpu_num,
+        ResourceInfoConst.TOTAL_CPU_PERCENT: cpu_percent,
+    })
+    setattr(cloudlet, APP_ID, {
+        ResourceInfoConst.CLOCK_SPEED: clock_speed,
+        ResourceInfoConst.APP_CACHE_TOTAL_SCORE: cache_score,
+    })
+    cloudlet.detail_digests[APP_ID] = "digest-%d" % index
+    return cloudlet
+
+
+class LoadSpreadingSelectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app_info = Application(**{AppInfoConst.APP_ID: APP_ID,
+                                       AppInfoConst.REQUIRED_MIN_CPU_CLOCK: 2000,
+                                       AppInfoConst.REQUIRED_CPU_NUMBER: 1})
+
+    def test_assignment_ttl(self):
+        selection = LoadSpreadingSelection(assignment_ttl=10.0)
+        cloudlet = make_cloudlet(0, cpu_percent=50.0)
+        now = time.time()
+        selection.observe_report(cloudlet, self.app_info, now - 1.0)
+        selection.record_assignment(cloudlet, 0.25)
+        selection.record_assignment(cloudlet, 0.25)
+        endpoint = cloudlet.REST_endpoint
+        self.assertAlmostEqual(selection.recent_load(endpoint, now), 0.5)
+        self.assertAlmostEqual(selection.load(cloudlet, self.app_info), 1.0)
+        # forgotten after the ttl
+        self.assertEqual(selection.recent_load(endpoint, now + 11.0), 0.0)
+        self.assertEqual(selection.recent_load("http://10.0.0.9/", now), 0.0)
+
+    def test_load_report(self):
+        selection = LoadSpreadingSelection(assignment_ttl=10.0)
+        cloudlet = make_cloudlet(0, cpu_percent=50.0)
+        endpoint = cloudlet.REST_endpoint
+        now = time.time()
+        report_time = selection.observe_report(cloudlet, self.app_info, now - 2.0)
+        selection.record_assignment(cloudlet, 0.25)
+
+        # the same report seen again does not count the assignment
+        self.assertEqual(selection.observe_report(cloudlet, self.app_info),
+                         report_time)
+        self.assertAlmostEqual(selection.load(cloudlet, self.app_info), 0.75)
+
+        # a new report made after the assignment already counts it
+        cloudlet.meta_info[ResourceInfoConst.TOTAL_CPU_PERCENT] = 75.0
+        cloudlet.detail_digests[APP_ID] = "digest-new"
+        report_time = time.time() + 1.0
+        self.assertEqual(selection.observe_report(cloudlet, self.app_info,
+                                                  report_time), report_time)
+        self.assertEqual(selection.recent_load(endpoint, report_time), 0.0)
+        self.assertAlmostEqual(selection.load(cloudlet, self.app_info), 0.75)
+
+    def test_sampling_weights(self):
+        selection = LoadSpreadingSelection(d=1, score_floor=0.1,
+                                           rand=random.Random(0))
+        cloudlet_list = [make_cloudlet(0, 0.0), make_cloudlet(1, 1.0),
+                         make_cloudlet(2, 3.0)]
+        counts = dict([(c.REST_endpoint, 0) for c in cloudlet_list])
+        n_samples = 20000
+        for _ in range(n_samples):
+            sampled = selection._sample(cloudlet_list, self.app_info)
+            self.assertEqual(len(sampled), 1)
+            counts[sampled[0].REST_endpoint] += 1
+        # proportional to the cache score plus the floor
+        weights = [0.1, 1.1, 3.1]
+        for cloudlet, weight in zip(cloudlet_list, weights):
+            self.assertAlmostEqual(counts[cloudlet.REST_endpoint] / float(n_samples),
+                                   weight / sum(weights), delta=0.01)
+
+    def test_sampling_without_replacement(self):
+        selection = LoadSpreadingSelection(d=3, rand=random.Random(0))
+        cloudlet_list = [make_cloudlet(index, 1.0) for index in range(3)]
+        for _ in range(100):
+            sampled = selection._sample(cloudlet_list, self.app_info)
+            self.assertEqual(sorted([c.REST_endpoint for c in sampled]),
+                             sorted([c.REST_endpoint for c in cloudlet_list]))
+        selection.d = 5
+        self.assertEqual(len(selection._sample(cloudlet_list, self.app_info)), 3)
+
+    def test_select_cloudlet(self):
+        selection = LoadSpreadingSelection(d=2, rand=random.Random(0))
+        cloudlet_list = [make_cloudlet(0, cpu_percent=10.0),
+                         make_cloudlet(1, cpu_percent=10.0),
+                         make_cloudlet(2, cpu_percent=0.0, clock_speed=1600)]
+        selected = [selection.select_cloudlet(cloudlet_list, self.app_info)
+                    for _ in range(6)]
+        # never the slow cloudlet, and the assignments alternate between
+        # the others though their reported load does not change
+        endpoints = [c.REST_endpoint for c in selected]
+        self.assertEqual(endpoints.count(cloudlet_list[0].REST_endpoint), 3)
+        self.assertEqual(endpoints.count(cloudlet_list[1].REST_endpoint), 3)
+        self.assertEqual(selection.select_cloudlet(cloudlet_list[2:], self.app_info),
+                         None)
+
+
+
+class ElijahCloudletSelectionTest(unittest.TestCase):
+
+    def test_clock_speed(self):
+        cloudlet_list = [make_cloudlet(0, 0.5, clock_speed=1600),
+                         make_cloudlet(1, 0.2, clock_speed=3200),
+                         make_cloudlet(2, 0.9)]
+        # a cloudlet without a detail record of the application never passes
+        delattr(cloudlet_list[2], APP_ID)
+        app_info = Application(**{AppInfoConst.APP_ID: APP_ID,
+                                  AppInfoConst.REQUIRED_MIN_CPU_CLOCK: 2000})
+        self.assertEqual(ElijahCloudletSelection.filter_cloudlets(cloudlet_list, app_info),
+                         [cloudlet_list[1]])
+        self.assertTrue(ElijahCloudletSelection.select_cloudlet(
+            cloudlet_list, app_info) is cloudlet_list[1])
+
+    def test_without_clock_requirement(self):
+        cloudlet_list = [make_cloudlet(0, 0.2, clock_speed=1600),
+                         make_cloudlet(1, 0.5, clock_speed=3200)]
+        app_info = Application(**{AppInfoConst.APP_ID: APP_ID})
+        # every cloudlet runs the application, the one with more cache wins
+        self.assertEqual(ElijahCloudletSelection.filter_cloudlets(cloudlet_list, app_info),
+                         cloudlet_list)
+        self.assertTrue(ElijahCloudletSelection.select_cloudlet(
+            cloudlet_list, app_info) is cloudlet_list[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import unittest
+from libcloudlet.base import Application, Cloudlet, MobileClient
+from libcloudlet.const import AppInfoConst, ResourceInfoConst
+from libcloudlet.selection_cache import SelectionCache
+
+APP_ID = "moped"
+
+
+class SelectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app_info = Application(**{AppInfoConst.APP_ID: APP_ID,
+                                       AppInfoConst.REQUIRED_CACHE_FILES: ["/a"]})
+        self.n_selections = 0
+
+    def cloudlets(self, n_cloudlets, version=0, first=0):
+        cloudlet_list = list()
+        for index in range(first, first + n_cloudlets):
+            cloudlet = Cloudlet("http://10.0.0.%d:8021/api/v1/resource/" % index)
+            self.set_load(cloudlet, index * 10, version)
+            cloudlet_list.append(cloudlet)
+        return cloudlet_list
+
+    def set_load(self, cloudlet, load, version=0):
+        cloudlet._set_info(self.app_info,
+                           {ResourceInfoConst.TOTAL_CPU_PERCENT: load},
+                           "%s-%d-%d" % (cloudlet.REST_endpoint, load, version))
+
+    def least_loaded(self, cloudlet_list, app_info):
+        self.n_selections += 1
+        return min(cloudlet_list, key=lambda c: getattr(c, APP_ID)[
+            ResourceInfoConst.TOTAL_CPU_PERCENT])
+
+    def select(self, cache, cloudlet_list, client_info=None):
+        return cache.select(cloudlet_list, self.app_info, self.least_loaded,
+                            client_info)
+
+    def test_memoize_few_candidates(self):
+        cache = SelectionCache()
+        cloudlet_list = self.cloudlets(3)
+        for _ in range(5):
+            selected = self.select(cache, cloudlet_list)
+            self.assertIs(selected, cloudlet_list[0])
+        self.assertEqual(self.n_selections, 1)
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+        # a new list of the same cloudlets gets its own cloudlet object
+        other_list = self.cloudlets(3)
+        self.assertIs(self.select(cache, other_list), other_list[0])
+        self.assertEqual(self.n_selections, 1)
+
+    def test_single_candidate(self):
+        cache = SelectionCache()
+        cloudlet_list = self.cloudlets(1)
+        self.select(cache, cloudlet_list)
+        self.select(cache, cloudlet_list)
+        self.assertEqual(self.n_selections, 2)
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_observe_changed_record(self):
+        cache = SelectionCache()
+        cloudlet_list = self.cloudlets(3)
+        self.select(cache, cloudlet_list)
+
+        # observing the same record keeps the decision
+        cache.observe(cloudlet_list[0], APP_ID)
+        self.select(cache, cloudlet_list)
+        self.assertEqual(self.n_selections, 1)
+
+        # a changed record drops the decisions using the cloudlet
+        self.set_load(cloudlet_list[0], 90, version=1)
+        cache.observe(cloudlet_list[0], APP_ID)
+        self.assertIs(self.select(cache, cloudlet_list), cloudlet_list[1])
+        self.assertEqual(self.n_selections, 2)
+
+        # a cloudlet of another candidate set does not
+        other = self.cloudlets(5)[4]
+        self.set_load(other, 0, version=2)
+        cache.observe(other, APP_ID)
+        self.select(cache, cloudlet_list)
+        self.assertEqual(self.n_selections, 2)
+
+    def test_invalidate(self):
+        cache = SelectionCache()
+        cloudlet_list = self.cloudlets(3)
+        self.select(cache, cloudlet_list)
+        cache.invalidate(cloudlet_list[2].REST_endpoint)
+        self.select(cache, cloudlet_list)
+        self.assertEqual(self.n_selections, 2)
+        cache.invalidate()
+        self.select(cache, cloudlet_list)
+        self.assertEqual(self.n_selections, 3)
+
+    def test_location_cell(self):
+        cache = SelectionCache(cell_size=0.01)
+        cloudlet_list = self.cloudlets(3)
+        near = MobileClient(GPS_latitude="40.4401", GPS_longitude="-79.9961")
+        same_cell = MobileClient(GPS_latitude="40.4409", GPS_longitude="-79.9969")
+        far = MobileClient(GPS_latitude="40.4501", GPS_longitude="-79.9961")
+        for client_info in (near, same_cell, far):
+            self.select(cache, cloudlet_list, client_info)
+        self.assertEqual(self.n_selections, 2)
+        self.assertEqual(cache.location_cell(MobileClient(ip_address="10.1.1.1")),
+                         "10.1.1.1")
+        self.assertIsNone(cache.location_cell(None, self.app_info))
+
+    def test_bounded(self):
+        cache = SelectionCache(max_entries=4)
+        for first in range(0, 10, 2):
+            self.select(cache, self.cloudlets(2, first=first))
+        self.assertLessEqual(len(cache.entries), 4)
+        self.assertLessEqual(len(cache.detail_versions), 4)
+        self.assertEqual(len(cache.entries), 2)
+        keys = set()
+        for dep_keys in cache.dependents.values():
+            keys.update(dep_keys)
+        self.assertTrue(keys <= set(cache.entries.keys()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import threading
+import unittest
+from libcloudlet.singleflight import SingleFlight, CallCancelled, CallTimeout
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.n_calls = 0
+
+    def tearDown(self):
+        self.gate.set()
+
+    def call(self, outcome):
+        """ upstream call blocking until the gate opens
+        """
+        def func():
+            self.n_calls += 1
+            self.started.set()
+            self.gate.wait()
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        return func
+
+    def run_callers(self, n_callers, func, timeout=None):
+        """ run a leader and *n_callers* - 1 waiters of the same key
+        :return: result or exception of each caller, leader first
+        """
+        outcomes = [None] * n_callers
+        def run(index, timeout):
+            try:
+                outcomes[index] = self.single_flight.do("key", func, timeout)
+            except BaseException as e:
+                outcomes[index] = e
+        threads = [threading.Thread(target=run, args=(0, None))]
+        threads[0].start()
+        self.started.wait(5)
+        for index in range(1, n_callers):
+            threads.append(threading.Thread(target=run, args=(index, timeout)))
+            threads[-1].start()
+        while self.single_flight.n_shared < n_callers - 1:
+            threading.Event().wait(0.01)
+        return threads, outcomes
+
+    def join(self, threads):
+        self.gate.set()
+        for th in threads:
+            th.join(5)
+            self.assertFalse(th.is_alive())
+
+    def test_shared_result(self):
+        threads, outcomes = self.run_callers(5, self.call("result"))
+        self.join(threads)
+        self.assertEqual(outcomes, ["result"] * 5)
+        self.assertEqual(self.n_calls, 1)
+        self.assertEqual(self.single_flight.in_flight(), 0)
+
+        # a later caller sends a new call
+        self.assertEqual(self.single_flight.do("key", self.call("again")), "again")
+        self.assertEqual(self.n_calls, 2)
+
+    def test_shared_error(self):
+        error = ValueError("upstream failed")
+        threads, outcomes = self.run_callers(4, self.call(error))
+        self.join(threads)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+        self.assertEqual(self.n_calls, 1)
+
+    def test_waiter_timeout(self):
+        threads, outcomes = self.run_callers(3, self.call("result"), timeout=0.05)
+        for th in threads[1:]:
+            th.join(5)
+        self.assertIsInstance(outcomes[1], CallTimeout)
+        self.assertIsInstance(outcomes[2], CallTimeout)
+        # the call goes on for the leader
+        self.join(threads)
+        self.assertEqual(outcomes[0], "result")
+
+    def test_interrupted_call(self):
+        threads, outcomes = self.run_callers(3, self.call(Interrupted()))
+        self.join(threads)
+        self.assertIsInstance(outcomes[0], Interrupted)
+        self.assertIsInstance(outcomes[1], CallCancelled)
+        self.assertIsInstance(outcomes[2], CallCancelled)
+        self.assertEqual(self.single_flight.in_flight(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
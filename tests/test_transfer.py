@@ -0,0 +1,187 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+from libcloudlet import transfer
+from libcloudlet.transfer import MerkleTree, OverlayTransfer, IntegrityError
+
+CHUNK = 64 * 1024
+N_CHUNKS = 20
+
+
+class OverlayHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ overlay server injecting faults set at the server
+    """
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if self.path.endswith(".merkle"):
+            self.reply(200, server.manifest)
+            return
+        byte_range = self.headers.get("Range", None)
+        server.requests.append(byte_range)
+        body = server.overlay
+        if server.n_corrupted_streams > 0:
+            server.n_corrupted_streams -= 1
+            body = bytearray(body)
+            for index in server.corrupted:
+                body[index * CHUNK] ^= 0xff
+            body = bytes(body)
+        start = 0
+        if byte_range and server.support_range:
+            start, end = byte_range.split("=")[1].split("-")
+            start = int(start)
+            end = int(end) if end else len(body) - 1
+            body = body[start:end+1]
+        length = len(body)
+        if server.n_disconnects > 0:
+            server.n_disconnects -= 1
+            body = body[:server.disconnect_at - start]
+        status = 206 if byte_range and server.support_range else 200
+        self.reply(status, body, length)
+
+    def reply(self, status, body, length=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length or len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class OverlayServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class OverlayTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.overlay = os.urandom(CHUNK * (N_CHUNKS - 1) + 1234)
+        self.tree = MerkleTree([MerkleTree.leaf_hash(self.overlay[i:i+CHUNK])
+                                for i in range(0, len(self.overlay), CHUNK)])
+        server = OverlayServer(("127.0.0.1", 0), OverlayHandler)
+        server.overlay = self.overlay
+        server.manifest = json.dumps(self.tree.to_manifest(CHUNK, len(self.overlay)))
+        server.requests = list()
+        server.support_range = True
+        server.corrupted = set()
+        server.n_corrupted_streams = 0
+        server.n_disconnects = 0
+        server.disconnect_at = 0
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.server = server
+        self.URL = "http://127.0.0.1:%d/overlay" % server.server_address[1]
+        self.dest_path = os.path.join(self.temp_dir, "overlay")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def run_transfer(self, chunk_source=None, **kwargs):
+        overlay_transfer = OverlayTransfer(self.URL, self.dest_path,
+                                           expected_root=self.tree.hex_root(),
+                                           timeout=5, **kwargs)
+        overlay_transfer.run(chunk_source)
+        with open(self.dest_path, "rb") as f:
+            self.assertEqual(f.read(), self.overlay)
+        self.assertEqual(overlay_transfer.bytes_verified, len(self.overlay))
+        return overlay_transfer
+
+    def test_stream(self):
+        self.run_transfer()
+        self.assertEqual(self.server.requests, [None])
+
+    def test_corrupted_chunks(self):
+        self.server.corrupted = set([3, 4, 9])
+        self.server.n_corrupted_streams = 1
+        self.run_transfer()
+        self.assertEqual(self.server.requests,
+                         [None, "bytes=%d-%d" % (3 * CHUNK, 5 * CHUNK - 1),
+                          "bytes=%d-%d" % (9 * CHUNK, 10 * CHUNK - 1)])
+
+    def test_resume_after_disconnect(self):
+        self.server.n_disconnects = 2
+        self.server.disconnect_at = 5 * CHUNK + 10
+        self.run_transfer()
+        self.assertEqual(self.server.requests,
+                         [None, "bytes=%d-" % (5 * CHUNK),
+                          "bytes=%d-" % (5 * CHUNK)])
+
+    def test_range_not_supported(self):
+        self.server.support_range = False
+        self.server.corrupted = set([3, 9])
+        self.server.n_corrupted_streams = 1
+        self.run_transfer()
+        # a single pass over the whole overlay instead of one per chunk
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_reuse(self):
+        reused = dict([(self.tree.leaves[index],
+                        self.overlay[index*CHUNK:(index+1)*CHUNK])
+                       for index in range(N_CHUNKS) if index not in (2, 7, 8)])
+        overlay_transfer = self.run_transfer(reused.get)
+        self.assertEqual(overlay_transfer.bytes_reused,
+                         len(self.overlay) - 3 * CHUNK)
+        self.assertEqual(self.server.requests,
+                         ["bytes=%d-%d" % (2 * CHUNK, 3 * CHUNK - 1),
+                          "bytes=%d-%d" % (7 * CHUNK, 9 * CHUNK - 1)])
+
+    def test_reuse_without_range(self):
+        self.server.support_range = False
+        reused = dict([(self.tree.leaves[index],
+                        self.overlay[index*CHUNK:(index+1)*CHUNK])
+                       for index in range(N_CHUNKS) if index != 4])
+        overlay_transfer = self.run_transfer(reused.get)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(overlay_transfer.bytes_reused,
+                         len(self.overlay) - CHUNK)
+
+    def test_corrupted_forever(self):
+        self.server.corrupted = set([6])
+        self.server.n_corrupted_streams = 100
+        self.assertRaises(IntegrityError, self.run_transfer, max_retries=2)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_stopped_workers(self):
+        def fail(index, data, fd=None):
+            raise IOError("disk is gone")
+        overlay_transfer = OverlayTransfer(self.URL, self.dest_path,
+                                           timeout=5, queue_size=1)
+        overlay_transfer.process_chunk = fail
+        self.assertRaises(transfer.TransferError, overlay_transfer.run)
+
+
+if __name__ == "__main__":
+    unittest.main()
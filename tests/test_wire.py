@@ -0,0 +1,103 @@
+#
+# Cloudlet Infrastructure for Mobile Computing
+#
+#   Author: Kiryong Ha <krha@cmu.edu>
+#
+#   Copyright (C) 2011-2016 Carnegie Mellon University
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import struct
+import unittest
+from libcloudlet import wire
+from libcloudlet.const import ResourceInfoConst as Const
+from libcloudlet.const import HTTPConst
+from libcloudlet.http_cache import apply_delta
+
+FULL_INFO = {
+    Const.TOTAL_CPU_NUMBER: 8,
+    Const.TOTAL_MEM_MB: 16384,
+    Const.CLOCK_SPEED: 3000.0,
+    Const.TOTAL_CPU_PERCENT: 42.5,
+    Const.TOTAL_MEM_FREE_MB: 1024,
+    Const.RTT_BETWEEN_CLIENT: 12.5,
+    Const.APP_CACHE_TOTAL_SCORE: 0.75,
+    Const.APP_CACHE_FILES: [u"/data/a", u"/data/\u00e9t\u00e9"],
+    Const.APP_CACHE_URLS: [u"http://a/"],
+    "location": u"lab",
+}
+
+
+class WireFormatTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        info = wire.decode(wire.encode(FULL_INFO))
+        self.assertIsInstance(info, wire.CloudletInfo)
+        self.assertEqual(info.to_dict(), FULL_INFO)
+        self.assertEqual(sorted(info.keys()), sorted(FULL_INFO.keys()))
+        # encoding the decoded info gives the same data
+        self.assertEqual(wire.encode(info), wire.encode(FULL_INFO))
+
+    def test_empty_lists(self):
+        record = {Const.APP_CACHE_FILES: [], Const.APP_CACHE_URLS: [u""]}
+        self.assertEqual(wire.decode(wire.encode(record)).to_dict(), record)
+
+    def test_partial_record(self):
+        info = wire.decode(wire.encode({Const.TOTAL_CPU_PERCENT: 50}))
+        self.assertEqual(info.keys(), [Const.TOTAL_CPU_PERCENT])
+        self.assertNotIn(Const.APP_CACHE_FILES, info)
+        self.assertIsNone(info.get(Const.APP_CACHE_URLS))
+        self.assertRaises(KeyError, lambda: info[Const.TOTAL_MEM_MB])
+
+    def test_delta(self):
+        delta = {Const.TOTAL_CPU_PERCENT: 50, Const.RTT_BETWEEN_CLIENT: None,
+                 Const.APP_CACHE_URLS: {HTTPConst.DELTA_ADDED: [u"http://b/"],
+                                        HTTPConst.DELTA_REMOVED: [u"http://a/"]}}
+        decoded = wire.decode(wire.encode(delta))
+        self.assertEqual(decoded.to_dict(), delta)
+
+        updated = apply_delta(FULL_INFO, decoded)
+        expected = dict(FULL_INFO)
+        expected[Const.TOTAL_CPU_PERCENT] = 50
+        del expected[Const.RTT_BETWEEN_CLIENT]
+        expected[Const.APP_CACHE_URLS] = [u"http://b/"]
+        self.assertEqual(updated, expected)
+
+    def test_version_1(self):
+        # lists are always present in version 1
+        data = bytearray(wire.encode({Const.TOTAL_CPU_PERCENT: 50}))
+        data[4] = 1
+        info = wire.decode(bytes(data))
+        self.assertEqual(info.to_dict(), {Const.TOTAL_CPU_PERCENT: 50,
+                                          Const.APP_CACHE_FILES: [],
+                                          Const.APP_CACHE_URLS: []})
+
+    def test_malformed(self):
+        data = wire.encode(FULL_INFO)
+        list_offset = wire._HEADER.size
+        for malformed in (
+                b"XXXX" + data[4:],
+                data[:10],
+                data[:-1],
+                # list longer than the remaining data
+                data[:list_offset] + struct.pack(">II", 2, 1 << 30) +
+                data[list_offset+8:],
+                # more items than bytes
+                data[:list_offset] + struct.pack(">II", 1000, 16) +
+                data[list_offset+8:],
+                data[:-len(b'"lab"}')] + b'"lab"]'):
+            self.assertRaises(wire.WireFormatError, wire.decode, malformed)
+
+
+if __name__ == "__main__":
+    unittest.main()